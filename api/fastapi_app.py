@@ -1,17 +1,142 @@
+import asyncio
+import hashlib
+import json
 import os
 import shutil
 import uuid
-from fastapi import FastAPI, File, UploadFile, Form, Request
-from fastapi.responses import FileResponse, JSONResponse
+from typing import List
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, UploadFile, Form, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 
-from app.tts import tts
+from app.tts import get_tts_engine
 # from app.lip_sync import lip_sync
-from app.musetalk_sync import musetalk_sync
-from app.av_merge import merge
-from app.config import OUTPUT_DIR, MUSETALK_DIR, MUSETALK_VERSION, MUSETALK_INFERENCE
+from app.job_queue import DeadlineError, Job, JobQueue, QueueFullError
+from app.job_cost import estimate_job
+from app.job_store import JobHandle, get_job_store
+from app.worker import Worker
+from app.cpu_slots import get_cpu_slots
+from app.render import RENDER_STAGES, make_item, render_stage_config
+from app.quality import upgrade_job
+from app.realtime import (RealtimeSession, SessionLimitError, acquire_session_slot, active_sessions,
+                          prepare_session_avatar, release_session_slot)
+from app.streaming import PLAYLIST_NAME, render_stream
+from app.musetalk_batch import get_musetalk_batcher
+from app.musetalk_engine import (close_engine_loading, engine_available, get_musetalk_engine, musetalk_engine_stats,
+                                 warmup_engines)
+from app.avatar_cache import avatar_image_path, file_sha256, get_avatar_cache, register_avatar
+from app.result_cache import get_result_cache, request_fingerprint
+from app.metrics import register_callback, render_metrics
+from app.config import OUTPUT_DIR, MUSETALK_DIR, MUSETALK_VERSION, MUSETALK_INFERENCE, MUSETALK_ENGINE, TTS_ENGINE, JOB_QUEUE, STREAMING, JOB_STORE, QUALITY, REALTIME
 
-app = FastAPI()
+# 渲染任务在后台按阶段流水线执行，/generate 不再阻塞事件循环
+# preview 任务完成后自动以同一 task_id 排队完整渲染
+job_queue = JobQueue(RENDER_STAGES, stage_config=render_stage_config(), followup=upgrade_job)
+# 流式任务按句分段渲染并逐段发布 HLS，分段间的流水线在任务内部完成
+stream_queue = JobQueue([('stream', render_stream)], max_depth=STREAMING['max_depth'],
+                        stage_config={'stream': {'workers': STREAMING['workers']}})
+
+
+def _find_job(task_id):
+    job = job_queue.get(task_id) or stream_queue.get(task_id)
+    if job is None:
+        # 多节点部署时任务可能由其它 API 节点接收、在任一工作节点上执行
+        store = get_job_store()
+        if store is not None and store.get(task_id) is not None:
+            job = JobHandle(store, task_id)
+    return job
+
+
+def _submit(job, kind, aliases=(), deadline=None):
+    """
+    提交到共享任务库（多节点）或本进程的任务队列（单机）
+
+    Returns:
+        float or None: 预计开始时间（时间戳），无法估算耗时时为 None
+    """
+    store = get_job_store()
+    if store is not None:
+        estimate = estimate_job(job)
+        estimated_start = store.enqueue(job.task_id, kind, job.params, aliases=aliases,
+                                        info={'estimate': estimate} if estimate else None, deadline=deadline)
+        return estimated_start if estimate else None
+    target = stream_queue if kind == 'stream' else job_queue
+    target.submit(job, aliases=aliases, deadline=deadline)
+    return job.info.get('estimated_start')
+
+
+def _engine_warning(musetalk_version, use_float16):
+    """常驻引擎方式下请求的版本 / 精度组合未在启动时加载时返回告警文本（同时打印），否则返回 None"""
+    if MUSETALK_ENGINE['mode'] != 'engine' or engine_available(musetalk_version, use_float16):
+        return None
+    warning = (f"MuseTalk {musetalk_version}（use_float16={use_float16}）引擎未在启动时加载，"
+               f"见 MUSETALK_ENGINE['preload_engines']")
+    print(f"[API] WARNING: {warning}")
+    return warning
+
+
+def _queue_samples(key):
+    return [({'queue': name}, q.stats()[key]) for name, q in (('render', job_queue), ('stream', stream_queue))]
+
+
+def _cache_samples():
+    samples = []
+    tts_cache = get_tts_engine().cache
+    if tts_cache is not None:
+        stats = tts_cache.stats()
+        samples += [({'cache': 'tts', 'result': 'hit'}, stats['hits']),
+                    ({'cache': 'tts', 'result': 'miss'}, stats['misses'])]
+    stats = get_avatar_cache().stats()
+    samples += [({'cache': 'avatar', 'result': 'hit'}, stats['memory_hits'] + stats['disk_hits']),
+                ({'cache': 'avatar', 'result': 'miss'}, stats['misses'])]
+    result_cache = get_result_cache()
+    if result_cache is not None:
+        stats = result_cache.stats()
+        samples += [({'cache': 'result', 'result': 'hit'}, stats['hits']),
+                    ({'cache': 'result', 'result': 'coalesced'}, stats['coalesced']),
+                    ({'cache': 'result', 'result': 'miss'}, stats['misses'])]
+    return samples
+
+
+register_callback('avatar_queue_depth', '等待进入第一个阶段的任务数', 'gauge', lambda: _queue_samples('queued'))
+register_callback('avatar_jobs_running', '正在执行的任务数', 'gauge', lambda: _queue_samples('running'))
+register_callback('avatar_cache_lookups_total', '各缓存的命中 / 未命中次数', 'counter', _cache_samples)
+register_callback('avatar_stage_busy_seconds_total', '各阶段工作线程的累计忙碌时间', 'counter', lambda: [
+    ({'stage': name}, stage['busy_time']) for name, stage in job_queue.stats()['stages'].items()])
+
+
+@asynccontextmanager
+async def lifespan(app):
+    engine = get_tts_engine()
+    if TTS_ENGINE['preload_on_startup']:
+        # 启动时预加载 Bark，避免首个请求承担模型加载耗时
+        print("[API] Preloading TTS engine")
+        await run_in_threadpool(engine.load)
+        print(f"[API] TTS engine ready: {engine.stats()}")
+    if MUSETALK_ENGINE['mode'] == 'engine' and MUSETALK_ENGINE['preload_on_startup']:
+        # 请求可能用到的每个版本 / 精度组合都在此加载，预热失败的组合回退到子进程方式
+        print(f"[API] Warming up MuseTalk engines: {MUSETALK_ENGINE['preload_engines']}")
+        ready = await run_in_threadpool(warmup_engines)
+        print(f"[API] MuseTalk engines ready: {[(e.version, e.use_float16, e.backend) for e in ready]}")
+    # MuseTalk 加载需要切换工作目录，请求与任务线程开始工作后不再加载
+    close_engine_loading()
+    job_queue.start()
+    stream_queue.start()
+    store = get_job_store()
+    worker = None
+    if store is not None and JOB_STORE['embedded_workers'] > 0:
+        worker = Worker(store).start(JOB_STORE['embedded_workers'])
+    yield
+    if worker is not None:
+        worker.stop()
+    stream_queue.shutdown()
+    job_queue.shutdown()
+    engine.shutdown(wait=False)
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -26,84 +151,478 @@ app.add_middleware(
 async def generate(
     request: Request,
     text: str = Form(...),
-    image: UploadFile = File(...),
+    image: UploadFile = File(None),
+    avatar_id: str = Form(None),  # 已注册的形象 ID，可代替上传图片
     musetalk_version: str = Form(MUSETALK_VERSION),  # 默认使用配置中的版本
     bbox_shift: int = Form(MUSETALK_INFERENCE['bbox_shift']),
     use_float16: bool = Form(MUSETALK_INFERENCE['use_float16']),
-    fps: int = Form(MUSETALK_INFERENCE['fps'])
+    fps: int = Form(MUSETALK_INFERENCE['fps']),
+    stream: bool = Form(False),  # 按句分段渲染，通过 HLS 边生成边播放
+    quality: str = Form(QUALITY['default']),  # preview：先快速出低清预览，再在后台替换为完整画质
+    deadline: float = Form(None)  # 最晚完成时间（提交后的秒数），预计赶不上时直接拒绝
 ):
     print("[API] /generate called")
     print(f"[API] Request headers: {request.headers}")
     print(f"[API] text field: {text}")
-    print(
-        f"[API] image filename: {image.filename}, content_type: {image.content_type}")
+    if image is not None:
+        print(
+            f"[API] image filename: {image.filename}, content_type: {image.content_type}")
+    print(f"[API] avatar_id: {avatar_id}")
     print(f"[API] musetalk_version: {musetalk_version}")
     print(f"[API] bbox_shift: {bbox_shift}")
     print(f"[API] use_float16: {use_float16}")
     print(f"[API] fps: {fps}")
+    print(f"[API] stream: {stream}")
+    print(f"[API] quality: {quality}")
+    print(f"[API] deadline: {deadline}")
 
     # 验证版本参数
     if musetalk_version not in ["v1.0", "v1.5"]:
         return JSONResponse({"error": "无效的 MuseTalk 版本，必须是 v1.0 或 v1.5"}, status_code=400)
+    if quality not in QUALITY['tiers']:
+        return JSONResponse({"error": f"无效的质量档位，必须是 {', '.join(QUALITY['tiers'])} 之一"}, status_code=400)
+    if stream and quality != 'full':
+        return JSONResponse({"error": "流式渲染不支持预览档位"}, status_code=400)
+    if image is None and avatar_id is None:
+        return JSONResponse({"error": "必须上传图片或提供 avatar_id"}, status_code=400)
+    if avatar_id is not None:
+        avatar_path = avatar_image_path(avatar_id)
+        if avatar_path is None:
+            return JSONResponse({"error": "形象不存在"}, status_code=404)
+    # 未预加载的组合仍可渲染，但走子进程方式，耗时明显更长
+    engine_warning = _engine_warning(musetalk_version, use_float16)
+
+    # 请求指纹：相同输入直接返回已有任务，进行中的相同请求合并到同一任务
+    if avatar_id is not None:
+        # 读取整个形象文件计算哈希，放到线程池执行
+        image_sha = await run_in_threadpool(file_sha256, avatar_path)
+        image_bytes = None
+    else:
+        image_bytes = await image.read()
+        image_sha = hashlib.sha256(image_bytes).hexdigest()
+    tts_engine = get_tts_engine()
+    fingerprint = request_fingerprint(
+        text, image_sha, musetalk_version=musetalk_version, bbox_shift=bbox_shift, fps=fps,
+        use_float16=use_float16, stream=stream, quality=quality, voice_preset=tts_engine.voice_preset,
+        tts_model=tts_engine.model_version)
 
     # 创建唯一任务目录
     task_id = str(uuid.uuid4())
     task_dir = os.path.join(OUTPUT_DIR, task_id)
+    image_path = avatar_path if avatar_id is not None else os.path.join(task_dir, "input.jpg")
+    text_path = os.path.join(task_dir, "input.txt")
+    params = {
+        'items': [make_item(task_dir, text_path, image_path, bbox_shift, task_id)],
+        'musetalk_version': musetalk_version,
+        'use_float16': use_float16,
+        'fps': fps,
+        'quality': quality,
+    }
+    if stream:
+        params['stream_dir'] = os.path.join(task_dir, "stream")
+    job = Job(task_id, params)
+    store = get_job_store()
+
+    result_cache = get_result_cache()
+    # 多节点时进行中的任务可能在其它节点上，合并判断以任务库中的状态为准
+    cached_job = JobHandle(store, task_id) if store is not None else job
+    claimed = result_cache.claim(fingerprint, cached_job) if result_cache is not None else None
+    if claimed is not None:
+        existing_id, kind = claimed
+        print(f"[API] Request {kind}: returning task {existing_id}")
+        response = {
+            "task_id": existing_id,
+            "status_url": f"/status/{existing_id}",
+            "events_url": f"/events/{existing_id}",
+            "video_url": f"/download/{existing_id}",
+            "cache": kind,
+        }
+        if stream:
+            response["playlist_url"] = f"/stream/{existing_id}/{PLAYLIST_NAME}"
+        return JSONResponse(response, status_code=200 if kind == 'hit' else 202)
+
     os.makedirs(task_dir, exist_ok=True)
     print(f"[API] Created task_dir: {task_dir}")
 
-    # 保存图片
-    image_path = os.path.join(task_dir, "input.jpg")
-    with open(image_path, "wb") as f:
-        shutil.copyfileobj(image.file, f)
-    print(f"[API] Saved image to: {image_path}")
+    # 保存图片；使用已注册形象时直接引用其图片
+    if avatar_id is not None:
+        print(f"[API] Using registered avatar image: {image_path}")
+    else:
+        with open(image_path, "wb") as f:
+            f.write(image_bytes)
+        print(f"[API] Saved image to: {image_path}")
 
     # 保存文本
-    text_path = os.path.join(task_dir, "input.txt")
     with open(text_path, "w", encoding="utf-8") as f:
         f.write(text)
     print(f"[API] Saved text to: {text_path}")
 
-    # 路径定义
-    tts_out = os.path.join(task_dir, "tts.wav")
-    video_out = os.path.join(task_dir, "musetalk_output.mp4")
-    final_out = os.path.join(task_dir, "final.mp4")
-
-    # 步骤1：TTS
-    print("[API] Step 1: TTS start")
-    tts(text_path, tts_out)
-    print(f"[API] Step 1: TTS done, output: {tts_out}")
-
-    # 步骤2：MuseTalk
-    print(f"[API] Step 2: MuseTalk {musetalk_version} start")
-    musetalk_sync(
-        image_path,
-        tts_out,
-        video_out,
-        musetalk_dir=MUSETALK_DIR,
-        version=musetalk_version,
-        bbox_shift=bbox_shift,
-        use_float16=use_float16,
-        fps=fps
-    )
-    print(f"[API] Step 2: MuseTalk done, output: {video_out}")
-
-    # 步骤3：合成
-    print("[API] Step 3: AV merge start")
-    merge(video_out, tts_out, final_out)
-    print(f"[API] Step 3: AV merge done, output: {final_out}")
-
-    # 返回视频下载链接
-    print(f"[API] Task {task_id} finished, video_url: /download/{task_id}")
-    return JSONResponse({
+    # 提交到后台任务队列，立即返回 task_id
+    try:
+        # 共享任务库的写入（BEGIN IMMEDIATE，可能等待锁）与耗时估算的文件读取都放到线程池，不阻塞事件循环
+        estimated_start = await run_in_threadpool(_submit, job, 'stream' if stream else 'render', deadline=deadline)
+    except QueueFullError as e:
+        if result_cache is not None:
+            result_cache.release(fingerprint, cached_job)
+        shutil.rmtree(task_dir, ignore_errors=True)
+        print(f"[API] Queue full, rejected task {task_id}")
+        return JSONResponse({"error": str(e), "retry_after": e.retry_after}, status_code=429,
+                            headers={"Retry-After": str(e.retry_after)})
+    except DeadlineError as e:
+        if result_cache is not None:
+            result_cache.release(fingerprint, cached_job)
+        shutil.rmtree(task_dir, ignore_errors=True)
+        print(f"[API] Deadline cannot be met, rejected task {task_id}")
+        return JSONResponse({"error": str(e), "estimated_seconds": e.estimated_seconds}, status_code=503)
+
+    print(f"[API] Task {task_id} queued")
+    response = {
         "task_id": task_id,
-        "video_url": f"/download/{task_id}"
+        "status_url": f"/status/{task_id}",
+        "events_url": f"/events/{task_id}",
+        "video_url": f"/download/{task_id}",
+        "cache": "miss",
+        "estimated_start": estimated_start,
+    }
+    if stream:
+        response["playlist_url"] = f"/stream/{task_id}/{PLAYLIST_NAME}"
+    if engine_warning is not None:
+        response["warning"] = f"{engine_warning}，本任务以子进程方式渲染"
+    return JSONResponse(response, status_code=202)
+
+
+@app.post("/generate_batch")
+async def generate_batch(
+    texts: List[str] = Form(...),
+    images: List[UploadFile] = File(None),  # 一张图片供所有条目共用，或与 texts 一一对应
+    avatar_id: str = Form(None),
+    musetalk_version: str = Form(MUSETALK_VERSION),
+    bbox_shift: int = Form(MUSETALK_INFERENCE['bbox_shift']),
+    use_float16: bool = Form(MUSETALK_INFERENCE['use_float16']),
+    fps: int = Form(MUSETALK_INFERENCE['fps'])
+):
+    """批量生成：所有条目在一次 MuseTalk 会话中渲染，结果分别写入各自的任务目录"""
+    print(f"[API] /generate_batch called, {len(texts)} items")
+    if musetalk_version not in ["v1.0", "v1.5"]:
+        return JSONResponse({"error": "无效的 MuseTalk 版本，必须是 v1.0 或 v1.5"}, status_code=400)
+    images = images or []
+    if avatar_id is None and len(images) not in (1, len(texts)):
+        return JSONResponse({"error": "images 数量必须为 1 或与 texts 相同，或提供 avatar_id"}, status_code=400)
+    if avatar_id is not None:
+        avatar_path = avatar_image_path(avatar_id)
+        if avatar_path is None:
+            return JSONResponse({"error": "形象不存在"}, status_code=404)
+
+    engine_warning = _engine_warning(musetalk_version, use_float16)
+
+    batch_id = str(uuid.uuid4())
+    items = []
+    for i, text in enumerate(texts):
+        task_id = str(uuid.uuid4())
+        task_dir = os.path.join(OUTPUT_DIR, task_id)
+        os.makedirs(task_dir, exist_ok=True)
+        if avatar_id is not None:
+            image_path = avatar_path
+        else:
+            image = images[i] if len(images) > 1 else images[0]
+            image_path = os.path.join(task_dir, "input.jpg")
+            image.file.seek(0)
+            with open(image_path, "wb") as f:
+                shutil.copyfileobj(image.file, f)
+        text_path = os.path.join(task_dir, "input.txt")
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        items.append(make_item(task_dir, text_path, image_path, bbox_shift, task_id))
+
+    job = Job(batch_id, {
+        'items': items,
+        'musetalk_version': musetalk_version,
+        'use_float16': use_float16,
+        'fps': fps,
     })
+    try:
+        estimated_start = await run_in_threadpool(_submit, job, 'render',
+                                                  aliases=[item['task_id'] for item in items])
+    except QueueFullError as e:
+        for item in items:
+            shutil.rmtree(os.path.join(OUTPUT_DIR, item['task_id']), ignore_errors=True)
+        print(f"[API] Queue full, rejected batch {batch_id}")
+        return JSONResponse({"error": str(e), "retry_after": e.retry_after}, status_code=429,
+                            headers={"Retry-After": str(e.retry_after)})
+
+    print(f"[API] Batch {batch_id} queued")
+    response = {
+        "batch_id": batch_id,
+        "status_url": f"/status/{batch_id}",
+        "events_url": f"/events/{batch_id}",
+        "estimated_start": estimated_start,
+        "tasks": [{
+            "task_id": item['task_id'],
+            "video_url": f"/download/{item['task_id']}"
+        } for item in items]
+    }
+    if engine_warning is not None:
+        response["warning"] = f"{engine_warning}，本批任务以子进程方式渲染"
+    return JSONResponse(response, status_code=202)
+
+
+@app.get("/status/{task_id}")
+def status(task_id: str):
+    job = _find_job(task_id)
+    if job is not None:
+        return JSONResponse({**job.to_dict(), 'spans': list(job.spans)})
+    # 不在内存中（如服务重启前完成的任务），按产物判断
+    if os.path.exists(os.path.join(OUTPUT_DIR, task_id, "final.mp4")):
+        return JSONResponse({"task_id": task_id, "status": "done", "progress": 1.0})
+    return JSONResponse({"error": "任务不存在"}, status_code=404)
+
+
+@app.get("/events/{task_id}")
+async def events(task_id: str):
+    """以 server-sent events 推送任务进度，任务结束后关闭连接"""
+    job = _find_job(task_id)
+    if job is None:
+        return JSONResponse({"error": "任务不存在"}, status_code=404)
+
+    async def store_event_stream():
+        # 任务库中没有逐条事件，按间隔轮询，状态变化时推送
+        last = None
+        while True:
+            event = await run_in_threadpool(job.to_dict)
+            if event != last:
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+                last = event
+            if event['status'] in ('done', 'failed'):
+                break
+            await asyncio.sleep(JOB_QUEUE['sse_interval'])
+
+    async def event_stream():
+        sent = 0
+        while True:
+            pending = job.events[sent:]
+            for event in pending:
+                yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+            sent += len(pending)
+            if pending and pending[-1]['status'] in ('done', 'failed'):
+                break
+            await asyncio.sleep(JOB_QUEUE['sse_interval'])
+
+    stream = store_event_stream() if isinstance(job, JobHandle) else event_stream()
+    return StreamingResponse(stream, media_type="text/event-stream")
+
+
+@app.get("/queue/stats")
+def queue_stats():
+    result_cache = get_result_cache()
+    store = get_job_store()
+    cpu_slots = get_cpu_slots()
+    return JSONResponse({**job_queue.stats(), "musetalk_batch": get_musetalk_batcher().stats(),
+                         "stream": stream_queue.stats(),
+                         "realtime_sessions": active_sessions(),
+                         "result_cache": result_cache.stats() if result_cache is not None else None,
+                         "job_store": store.stats() if store is not None else None,
+                         "cpu_slots": cpu_slots.stats() if cpu_slots is not None else None})
+
+
+@app.post("/avatars")
+async def create_avatar(
+    image: UploadFile = File(...),
+    musetalk_version: str = Form(MUSETALK_VERSION),
+    bbox_shift: int = Form(MUSETALK_INFERENCE['bbox_shift']),
+    use_float16: bool = Form(MUSETALK_INFERENCE['use_float16'])
+):
+    """注册形象并预先完成人脸检测和 VAE 编码，之后 /generate 可通过 avatar_id 引用"""
+    if musetalk_version not in ["v1.0", "v1.5"]:
+        return JSONResponse({"error": "无效的 MuseTalk 版本，必须是 v1.0 或 v1.5"}, status_code=400)
+
+    avatar_id = register_avatar(await image.read())
+    image_path = avatar_image_path(avatar_id)
+    print(f"[API] Registered avatar {avatar_id}: {image_path}")
+
+    prepared = False
+    engine_warning = _engine_warning(musetalk_version, use_float16)
+    if engine_warning is not None:
+        return JSONResponse({"avatar_id": avatar_id, "prepared": prepared,
+                             "warning": f"{engine_warning}，形象已注册但未预处理"})
+    if MUSETALK_ENGINE['mode'] == 'engine':
+        engine = get_musetalk_engine(musetalk_version, MUSETALK_DIR, use_float16)
+        try:
+            await run_in_threadpool(engine.load)
+        except Exception as e:
+            print(f"[API] MuseTalk engine unavailable, avatar registered without preparation: {e}")
+        else:
+            try:
+                await run_in_threadpool(engine.get_avatar, image_path, bbox_shift)
+                # 实时会话按 REALTIME['quality'] 档位使用形象，一并预处理
+                await run_in_threadpool(prepare_session_avatar, engine, image_path, bbox_shift)
+            except RuntimeError as e:
+                return JSONResponse({"error": str(e)}, status_code=400)
+            prepared = True
+    return JSONResponse({"avatar_id": avatar_id, "prepared": prepared})
 
 
 @app.get("/download/{task_id}")
 def download(task_id: str):
     final_path = os.path.join(OUTPUT_DIR, task_id, "final.mp4")
     if not os.path.exists(final_path):
+        job = _find_job(task_id)
+        if job is not None and not job.finished:
+            return JSONResponse({"error": "视频尚未生成", "status": job.status}, status_code=409)
         return JSONResponse({"error": "视频不存在"}, status_code=404)
     return FileResponse(final_path, media_type="video/mp4", filename="result.mp4")
+
+
+@app.get("/stream/{task_id}/{filename}")
+def stream_file(task_id: str, filename: str):
+    """流式任务的 HLS 播放列表与 TS 分段，渲染过程中播放列表持续增长"""
+    is_playlist = filename == PLAYLIST_NAME
+    if not is_playlist and not (filename.startswith("seg_") and filename.endswith(".ts")
+                                and filename[4:-3].isdigit()):
+        return JSONResponse({"error": "无效的文件名"}, status_code=400)
+    if not task_id.replace("-", "").isalnum():
+        return JSONResponse({"error": "任务不存在"}, status_code=404)
+    path = os.path.join(OUTPUT_DIR, task_id, "stream", filename)
+    if not os.path.exists(path):
+        job = _find_job(task_id)
+        if is_playlist and job is not None and not job.finished:
+            return JSONResponse({"error": "播放列表尚未生成", "status": job.status}, status_code=409)
+        return JSONResponse({"error": "文件不存在"}, status_code=404)
+    if is_playlist:
+        # 播放列表随分段追加而变化，禁止缓存
+        return FileResponse(path, media_type="application/vnd.apple.mpegurl",
+                            headers={"Cache-Control": "no-cache"})
+    return FileResponse(path, media_type="video/mp2t")
+
+
+async def _send_realtime_events(websocket, events):
+    """把会话事件按顺序发给客户端：每条先发 JSON 头，带数据的事件紧跟一条二进制消息"""
+    while True:
+        event = await events.get()
+        if event is None:
+            return
+        data = event.pop('data', None)
+        if data is not None:
+            event['bytes'] = len(data)
+        await websocket.send_json(event)
+        if data is not None:
+            await websocket.send_bytes(data)
+
+
+@app.websocket("/realtime/{avatar_id}")
+async def realtime(
+    websocket: WebSocket,
+    avatar_id: str,
+    musetalk_version: str = MUSETALK_VERSION,
+    bbox_shift: int = MUSETALK_INFERENCE['bbox_shift'],
+    use_float16: bool = MUSETALK_INFERENCE['use_float16'],
+    fps: int = MUSETALK_INFERENCE['fps'],
+    quality: str = REALTIME['quality']
+):
+    """
+    实时会话：绑定已注册形象，客户端增量发送文本，每句合成后立即返回音频，口型生成后返回视频
+
+    客户端消息（JSON）：{"type": "text", "text": "..."}、{"type": "flush"}（提交未结束的句子）、
+    {"type": "close"}（处理完已提交的句子后关闭）。服务端消息见 README「实时会话」。
+    """
+    await websocket.accept()
+    error = None
+    if musetalk_version not in ["v1.0", "v1.5"]:
+        error = "无效的 MuseTalk 版本，必须是 v1.0 或 v1.5"
+    elif quality not in QUALITY['tiers']:
+        error = f"无效的质量档位，必须是 {', '.join(QUALITY['tiers'])} 之一"
+    elif not engine_available(musetalk_version, use_float16):
+        # 实时会话只能使用常驻引擎
+        error = _engine_warning(musetalk_version, use_float16) or f"MuseTalk {musetalk_version} 引擎不可用"
+    image_path = avatar_image_path(avatar_id)
+    if error is None and image_path is None:
+        error = "形象不存在"
+    if error is not None:
+        await websocket.send_json({"type": "error", "error": error})
+        await websocket.close(code=1008)
+        return
+    try:
+        acquire_session_slot()
+    except SessionLimitError as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1013)
+        return
+
+    session_id = str(uuid.uuid4())
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    session = None
+    sender = None
+    try:
+        try:
+            session = RealtimeSession(
+                image_path, os.path.join(OUTPUT_DIR, "sessions", session_id),
+                lambda event: loop.call_soon_threadsafe(events.put_nowait, event),
+                musetalk_version=musetalk_version, bbox_shift=bbox_shift, use_float16=use_float16, fps=fps,
+                quality=quality)
+            await run_in_threadpool(session.open)
+        except Exception as e:
+            print(f"[API] Realtime session {session_id} failed to start: {e}")
+            await websocket.send_json({"type": "error", "error": str(e)})
+            await websocket.close(code=1011)
+            return
+        print(f"[API] Realtime session {session_id} opened for avatar {avatar_id}")
+        await websocket.send_json({"type": "ready", "session_id": session_id, "fps": session.fps,
+                                   "quality": quality, "warmup_time": session.warmup_time})
+        sender = asyncio.create_task(_send_realtime_events(websocket, events))
+        while True:
+            try:
+                message = await asyncio.wait_for(websocket.receive_json(), REALTIME['idle_timeout'])
+            except asyncio.TimeoutError:
+                print(f"[API] Realtime session {session_id} idle, closing")
+                break
+            except (ValueError, KeyError, TypeError):
+                # 二进制帧或无法解析的文本：回复错误，会话继续
+                events.put_nowait({"type": "error", "error": "消息必须是 JSON 文本"})
+                continue
+            if not isinstance(message, dict):
+                events.put_nowait({"type": "error", "error": "消息必须是 JSON 对象"})
+                continue
+            kind = message.get('type')
+            if kind == 'text':
+                session.feed(message.get('text', ''))
+            elif kind == 'flush':
+                session.flush()
+            elif kind == 'close':
+                session.flush()
+                break
+            else:
+                events.put_nowait({"type": "error", "error": f"未知的消息类型: {kind}"})
+        stats = await run_in_threadpool(session.close)
+        events.put_nowait({"type": "closed", "stats": stats})
+        events.put_nowait(None)
+        await sender
+        await websocket.close()
+        print(f"[API] Realtime session {session_id} closed: {stats}")
+    except WebSocketDisconnect:
+        print(f"[API] Realtime session {session_id} disconnected")
+    finally:
+        if sender is not None and not sender.done():
+            sender.cancel()
+        if session is not None:
+            # 客户端已断开时跳过尚未开始的句子；正常关闭时重复调用无副作用
+            await run_in_threadpool(session.close, False)
+        release_session_slot()
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus 文本格式的指标：各阶段耗时直方图、队列深度、并发任务数、缓存命中数"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/tts/stats")
+def tts_stats():
+    return JSONResponse(get_tts_engine().stats())
+
+
+@app.get("/musetalk/stats")
+def musetalk_stats():
+    return JSONResponse({
+        "engines": musetalk_engine_stats(),
+        "avatar_cache": get_avatar_cache().stats(),
+    })
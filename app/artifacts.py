@@ -0,0 +1,222 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from app.avatar_cache import file_sha256
+
+
+class AudioArtifact:
+    """
+    在阶段之间传递的音频：数组 + 采样率，各种表示只计算一次并缓存
+
+    TTS 阶段直接把 Bark 输出的数组交给口型阶段：Whisper / Wav2Lip 需要的 16kHz 重采样、
+    静音分析用的原始采样率数组和 WAV 字节都在首次使用时生成并缓存在对象上，不再写文件后读回。
+    只有 ffmpeg 复用音轨、子进程推理或调用方需要文件时才由 to_file() 写出（每个路径只写一次）。
+
+    重采样结果与 librosa.load(写出的 WAV, sr=...) 逐样本一致：先经过与文件相同的 16 位 PCM 量化，
+    再用 librosa.resample 的默认算法，保证与 Wav2Lip / MuseTalk 读文件的推理结果相同。
+
+    Args:
+        samples (np.ndarray, optional): 音频数组（多声道时取均值）；为 None 时首次使用才从 path 读取
+        sample_rate (int, optional): 采样率，与 samples 一起给出
+        path (str, optional): 对应的 WAV 路径：已存在时为数据来源，否则为 to_file() 的默认写出位置
+    """
+
+    def __init__(self, samples=None, sample_rate=None, path=None):
+        if samples is None and path is None:
+            raise ValueError("需要音频数组或文件路径")
+        self.path = path
+        self._sample_rate = sample_rate
+        self._samples = {}  # 采样率 -> float32 单声道数组
+        self._wav_bytes = None
+        self._from_file = samples is None
+        self._written = samples is None  # 由文件构造时文件即数据本身，无需写出
+        self._lock = threading.Lock()
+        if samples is not None:
+            self._samples[sample_rate] = _mono(samples)
+
+    @classmethod
+    def from_file(cls, path):
+        """以已有的 WAV 文件构造，首次使用时才读取"""
+        return cls(path=path)
+
+    def _load(self):
+        if self._sample_rate is None:
+            import soundfile as sf
+            samples, self._sample_rate = sf.read(self.path, dtype='float32')
+            self._samples[self._sample_rate] = _mono(samples)
+
+    @property
+    def sample_rate(self):
+        """原始采样率"""
+        with self._lock:
+            self._load()
+            return self._sample_rate
+
+    @property
+    def duration(self):
+        return len(self.samples()) / self.sample_rate
+
+    def samples(self, sample_rate=None):
+        """指定采样率（默认原始采样率）的单声道 float32 数组；重采样结果缓存，同一采样率只计算一次"""
+        with self._lock:
+            self._load()
+            sample_rate = sample_rate or self._sample_rate
+            if sample_rate not in self._samples:
+                import librosa
+                self._samples[sample_rate] = librosa.resample(
+                    self._pcm_samples(), orig_sr=self._sample_rate, target_sr=sample_rate).astype(np.float32)
+            return self._samples[sample_rate]
+
+    def _pcm_samples(self):
+        """与写出的 WAV 文件内容相同的数组（16 位 PCM 量化后），调用方需持有锁"""
+        if self._from_file:
+            return self._samples[self._sample_rate]
+        import soundfile as sf
+        samples, _ = sf.read(io.BytesIO(self._encode()), dtype='float32')
+        return _mono(samples)
+
+    def _encode(self):
+        """WAV 编码（调用方需持有锁）"""
+        if self._wav_bytes is None:
+            if self._written and os.path.exists(self.path):
+                with open(self.path, 'rb') as f:
+                    self._wav_bytes = f.read()
+            else:
+                import soundfile as sf
+                self._load()
+                buf = io.BytesIO()
+                sf.write(buf, self._samples[self._sample_rate], self._sample_rate, format='WAV')
+                self._wav_bytes = buf.getvalue()
+        return self._wav_bytes
+
+    def wav_bytes(self):
+        """原始采样率的 WAV 编码（供 WebSocket 等直接发送），只编码一次"""
+        with self._lock:
+            return self._encode()
+
+    def to_file(self, path=None):
+        """
+        确保音频存在于文件中并返回路径；同一路径只写一次
+
+        未指定 path 且构造时也没有路径时写入临时目录。
+        """
+        with self._lock:
+            if path is None or path == self.path:
+                if self._written:
+                    return self.path
+                if self.path is None:
+                    fd, self.path = tempfile.mkstemp(prefix='avatar_audio_', suffix='.wav')
+                    os.close(fd)
+                path = self.path
+        data = self.wav_bytes()
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if path == self.path:
+                self._written = True
+        return path
+
+    def representations(self):
+        """已缓存的表示，用于统计与测试"""
+        with self._lock:
+            return {
+                'sample_rates': sorted(self._samples),
+                'wav_bytes': self._wav_bytes is not None,
+                'written': self._written,
+            }
+
+
+class ImageArtifact:
+    """
+    在阶段之间传递的参考图：文件路径和 / 或解码后的 BGR 数组，解码结果与内容哈希各只计算一次
+
+    质量档位缩小后的图片只保存在内存中，只有需要文件的后端（MuseTalk 人脸检测、子进程推理）
+    才由 to_file() 写出。
+
+    Args:
+        path (str, optional): 图片路径：已存在时为数据来源，否则为 to_file() 的写出位置
+        image (np.ndarray, optional): 解码后的 BGR 图像
+        key (str, optional): 形象缓存键，由原图派生的图片（如按档位缩小）以原图哈希 + 变换给出，
+            不同进程、不同请求中得到相同的键
+    """
+
+    def __init__(self, path=None, image=None, key=None):
+        if path is None and image is None:
+            raise ValueError("需要图片数组或文件路径")
+        self.path = path
+        self._image = image
+        self._sha256 = key
+        self._written = image is None
+        self._lock = threading.Lock()
+
+    def array(self):
+        """BGR 图像数组（cv2 格式），首次使用时解码"""
+        with self._lock:
+            if self._image is None:
+                import cv2
+                self._image = cv2.imread(self.path)
+                if self._image is None:
+                    raise RuntimeError(f"无法读取图片: {self.path}")
+            return self._image
+
+    def sha256(self):
+        """
+        内容哈希，用于形象缓存的键：构造时给出 key 时为该键；有文件时为文件哈希（与已注册形象一致），
+        否则为像素与尺寸的哈希
+        """
+        with self._lock:
+            if self._sha256 is None:
+                if self._written:
+                    self._sha256 = file_sha256(self.path)
+                else:
+                    h = hashlib.sha256(str(self._image.shape).encode())
+                    h.update(np.ascontiguousarray(self._image).tobytes())
+                    self._sha256 = h.hexdigest()
+            return self._sha256
+
+    def to_file(self):
+        """确保图片存在于文件中并返回路径（只写一次）"""
+        with self._lock:
+            if self._written:
+                return self.path
+            import cv2
+            if self.path is None:
+                fd, self.path = tempfile.mkstemp(prefix='avatar_image_', suffix='.png')
+                os.close(fd)
+            tmp_path = f"{self.path}.tmp{os.path.splitext(self.path)[1]}"
+            cv2.imwrite(tmp_path, self._image)
+            os.replace(tmp_path, self.path)
+            self._written = True
+            return self.path
+
+
+def _mono(samples):
+    samples = np.asarray(samples, dtype=np.float32)
+    return samples.mean(axis=1) if samples.ndim > 1 else samples
+
+
+def audio_artifact(audio):
+    """路径或 AudioArtifact 统一为 AudioArtifact"""
+    return audio if isinstance(audio, AudioArtifact) else AudioArtifact.from_file(audio)
+
+
+def image_artifact(image):
+    """路径或 ImageArtifact 统一为 ImageArtifact"""
+    return image if isinstance(image, ImageArtifact) else ImageArtifact(path=image)
+
+
+def audio_file(audio):
+    """需要文件的后端（ffmpeg、子进程）使用：路径原样返回，AudioArtifact 按需写出"""
+    return audio.to_file() if isinstance(audio, AudioArtifact) else audio
+
+
+def image_file(image):
+    """需要文件的后端使用：路径原样返回，ImageArtifact 按需写出"""
+    return image.to_file() if isinstance(image, ImageArtifact) else image
@@ -0,0 +1,110 @@
+import numpy as np
+
+
+def crossfade_concat(chunks, sample_rate, crossfade_ms=40):
+    """
+    拼接多段音频，相邻片段之间做短交叉淡化，避免拼接处的爆音
+
+    Args:
+        chunks (list[np.ndarray]): 单声道音频片段
+        sample_rate (int): 采样率
+        crossfade_ms (int): 交叉淡化时长（毫秒）
+
+    Returns:
+        np.ndarray: 拼接后的音频
+    """
+    chunks = [np.asarray(c, dtype=np.float32) for c in chunks if len(c)]
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+
+    fade = int(sample_rate * crossfade_ms / 1000)
+    output = chunks[0]
+    for chunk in chunks[1:]:
+        n = min(fade, len(output), len(chunk))
+        if n == 0:
+            output = np.concatenate([output, chunk])
+            continue
+        ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+        overlap = output[-n:] * (1.0 - ramp) + chunk[:n] * ramp
+        output = np.concatenate([output[:-n], overlap, chunk[n:]])
+    return output
+
+
+def voiced_frames(audio, sample_rate, fps, threshold_db=-40.0, min_silence_ms=200, pad_ms=80):
+    """
+    按视频帧划分音频，判断每一帧是否有语音
+
+    以整段音频的峰值 RMS 为参考，低于 threshold_db 的帧视为静音；语音区域前后各扩展 pad_ms，
+    让嘴型提前张开、延后闭合；短于 min_silence_ms 的停顿仍按语音处理。
+
+    Args:
+        audio (np.ndarray): 音频（多声道时取均值）
+        sample_rate (int): 采样率
+        fps (int): 视频帧率
+        threshold_db (float): 相对峰值的静音阈值（dB）
+        min_silence_ms (int): 最短静音时长（毫秒）
+        pad_ms (int): 语音区域向两侧扩展的时长（毫秒）
+
+    Returns:
+        np.ndarray: 每帧一个布尔值，True 表示有语音
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    num_frames = int(np.ceil(len(audio) * fps / sample_rate))
+    if num_frames == 0:
+        return np.zeros(0, dtype=bool)
+
+    bounds = np.round(np.arange(num_frames + 1) * sample_rate / fps).astype(int)
+    rms = np.array([np.sqrt(np.mean(np.square(audio[s:e]))) if e > s else 0.0
+                    for s, e in zip(bounds[:-1], bounds[1:])])
+    peak = rms.max()
+    if peak == 0:
+        return np.zeros(num_frames, dtype=bool)
+    voiced = 20 * np.log10(rms / peak + 1e-12) > threshold_db
+
+    pad = int(round(pad_ms * fps / 1000))
+    if pad:
+        voiced = np.convolve(voiced.astype(int), np.ones(2 * pad + 1, dtype=int), mode='same') > 0
+
+    min_len = int(np.ceil(min_silence_ms * fps / 1000))
+    start = None
+    for i in range(num_frames + 1):
+        silent = i < num_frames and not voiced[i]
+        if silent and start is None:
+            start = i
+        elif not silent and start is not None:
+            if i - start < min_len:
+                voiced[start:i] = True
+            start = None
+    return voiced
+
+
+def silence_weights(voiced, transition_frames=3):
+    """
+    每帧使用闭口帧的权重：静音帧为 1，与静音相邻的 transition_frames 个语音帧线性过渡，其余为 0
+
+    Args:
+        voiced (np.ndarray): voiced_frames 的结果
+        transition_frames (int): 过渡帧数
+
+    Returns:
+        np.ndarray: 取值 [0, 1] 的权重
+    """
+    voiced = np.asarray(voiced, dtype=bool)
+    n = len(voiced)
+    # 每帧到最近静音帧的距离（正反两遍扫描）
+    distance = np.full(n, n + transition_frames + 1, dtype=float)
+    last = None
+    for i in range(n):
+        if not voiced[i]:
+            last = i
+        if last is not None:
+            distance[i] = i - last
+    last = None
+    for i in range(n - 1, -1, -1):
+        if not voiced[i]:
+            last = i
+        if last is not None:
+            distance[i] = min(distance[i], last - i)
+    return np.clip(1.0 - distance / (transition_frames + 1), 0.0, 1.0)
@@ -8,10 +8,102 @@ def merge(video_path, audio_path, output_path):
         'ffmpeg', '-y',
         '-i', video_path,
         '-i', audio_path,
+        '-map', '0:v:0',
+        '-map', '1:a:0',
         '-c:v', 'copy',
         '-c:a', 'aac',
         '-strict', 'experimental',
         '-shortest',
+        '-movflags', '+faststart',
+        output_path
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def is_faststart(path):
+    """读取 MP4 顶层 box 头，判断 moov 是否位于 mdat 之前（可边下载边播放）"""
+    import os
+    import struct
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        offset = 0
+        while offset + 8 <= size:
+            f.seek(offset)
+            box_size, box_type = struct.unpack('>I4s', f.read(8))
+            if box_type == b'moov':
+                return True
+            if box_type == b'mdat':
+                return False
+            if box_size == 1:
+                box_size = struct.unpack('>Q', f.read(8))[0]
+            elif box_size == 0:
+                break
+            if box_size < 8:
+                break
+            offset += box_size
+    return False
+
+
+def finalize(video_path, output_path):
+    """
+    把已含音轨的口型视频发布为最终视频
+
+    MuseTalk / Wav2Lip 的输出已经复用了 TTS 音频，不再重新编码音频。已是 faststart 的文件
+    直接原子改名（不写任何数据），否则只做一次流复制把 moov 移到文件头，再删除中间文件。
+    """
+    import subprocess
+    import os
+    assert os.path.exists(video_path), f"视频未找到: {video_path}"
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    if is_faststart(video_path):
+        os.replace(video_path, output_path)
+        return
+    cmd = [
+        'ffmpeg', '-y',
+        '-i', video_path,
+        '-map', '0',
+        '-c', 'copy',
+        '-movflags', '+faststart',
+        output_path
+    ]
+    subprocess.run(cmd, check=True)
+    os.remove(video_path)
+
+
+def mux_segment(video_path, output_path, ts_offset=0.0):
+    """
+    把一个已含音轨的分段视频转封装为 MPEG-TS，用于 HLS 播放列表（流复制，不重新编码）
+
+    ts_offset 为该分段在整段视频中的起始时间，保证各分段时间戳连续。
+    """
+    import subprocess
+    import os
+    assert os.path.exists(video_path), f"视频未找到: {video_path}"
+    cmd = [
+        'ffmpeg', '-y',
+        '-i', video_path,
+        '-map', '0:v:0',
+        '-map', '0:a:0',
+        '-c', 'copy',
+        '-bsf:v', 'h264_mp4toannexb',
+        '-output_ts_offset', f"{ts_offset:.3f}",
+        '-f', 'mpegts',
+        output_path
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def concat_playlist(playlist_path, output_path):
+    """把 HLS 播放列表中的分段拼接为一个 MP4（不重新编码）"""
+    import subprocess
+    import os
+    assert os.path.exists(playlist_path), f"播放列表未找到: {playlist_path}"
+    cmd = [
+        'ffmpeg', '-y',
+        '-i', playlist_path,
+        '-c', 'copy',
+        '-bsf:a', 'aac_adtstoasc',
+        '-movflags', '+faststart',
         output_path
     ]
     subprocess.run(cmd, check=True)
@@ -0,0 +1,179 @@
+import hashlib
+import os
+import pickle
+import threading
+import uuid
+from collections import OrderedDict
+
+from app.config import AVATAR_CACHE
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class AvatarCache:
+    """
+    数字人形象预处理结果缓存（内存 + 磁盘两级，均为 LRU）
+
+    MuseTalk 对同一张参考图、同一 bbox_shift 的人脸检测、bbox 计算和 VAE 编码结果完全相同，
+    缓存后每次请求只需提取音频特征和逐帧推理，即“准备一次，多次说话”。
+
+    Args:
+        cache_dir (str, optional): 磁盘缓存目录
+        memory_entries (int, optional): 内存中最多保留的条目数
+        max_disk_bytes (int, optional): 磁盘缓存总大小上限
+    """
+
+    def __init__(self, cache_dir=None, memory_entries=None, max_disk_bytes=None):
+        self.cache_dir = cache_dir or AVATAR_CACHE['cache_dir']
+        self.memory_entries = memory_entries if memory_entries is not None else AVATAR_CACHE['memory_entries']
+        self.max_disk_bytes = max_disk_bytes if max_disk_bytes is not None else AVATAR_CACHE['max_disk_bytes']
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()  # key -> 文件大小，按访问时间从旧到新
+        self._disk_bytes = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                st = os.stat(os.path.join(self.cache_dir, name))
+                files.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    @staticmethod
+    def make_key(image_sha256, bbox_shift, version, use_float16=False):
+        payload = f"{image_sha256}:{bbox_shift}:{version}:{'fp16' if use_float16 else 'fp32'}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _remember(self, key, avatar):
+        self._memory[key] = avatar
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """先查内存再查磁盘，未命中返回 None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+            on_disk = key in self._disk
+        if not on_disk:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                avatar = pickle.load(f)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self.disk_hits += 1
+            self._remember(key, avatar)
+        return avatar
+
+    def put(self, key, avatar):
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(avatar, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._remember(key, avatar)
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            evicted = []
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                old_key, old_size = self._disk.popitem(last=False)
+                self._disk_bytes -= old_size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def get_or_create(self, key, create):
+        """命中则直接返回，否则调用 create() 生成并写入缓存"""
+        avatar = self.get(key)
+        if avatar is None:
+            avatar = create()
+            self.put(key, avatar)
+        return avatar
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_avatar_cache():
+    """获取进程级共享的形象缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AvatarCache()
+        return _cache
+
+
+def register_avatar(image_bytes, registry_dir=None):
+    """
+    注册数字人形象图片，返回 avatar_id（图片内容哈希）
+
+    相同图片重复注册得到相同的 avatar_id，不会重复保存。
+    """
+    registry_dir = registry_dir or AVATAR_CACHE['registry_dir']
+    avatar_id = hashlib.sha256(image_bytes).hexdigest()[:32]
+    avatar_dir = os.path.join(registry_dir, avatar_id)
+    image_path = os.path.join(avatar_dir, 'image.jpg')
+    if not os.path.exists(image_path):
+        os.makedirs(avatar_dir, exist_ok=True)
+        tmp_path = f"{image_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, image_path)
+    return avatar_id
+
+
+def avatar_image_path(avatar_id, registry_dir=None):
+    """根据 avatar_id 查找已注册的形象图片，不存在返回 None"""
+    registry_dir = registry_dir or AVATAR_CACHE['registry_dir']
+    if not avatar_id.isalnum():
+        return None
+    image_path = os.path.join(registry_dir, avatar_id, 'image.jpg')
+    return image_path if os.path.exists(image_path) else None
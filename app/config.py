@@ -2,6 +2,16 @@ import os
 
 # 默认模型路径
 WAV2LIP_MODEL_PATH = os.path.join('models', 'wav2lip.pth')
+WAV2LIP_DIR = os.path.join('scripts', 'Wav2Lip')  # Wav2Lip 官方代码（inference.py 所在目录）
+
+# Wav2Lip 常驻推理引擎（静态形象）：模型只加载一次，人脸检测结果按图片缓存
+WAV2LIP_ENGINE = {
+    'mode': 'engine',  # 'engine' 进程内常驻引擎，'subprocess' 每次请求运行官方 inference.py
+    'device': 'auto',  # 'auto' / 'cpu' / 'cuda'
+    'batch_size': 256,  # 每批推理的帧数（官方脚本默认 128），静态形象的人脸输入各批复用
+    'pads': [0, 10, 0, 0],  # 人脸框扩展（上、下、左、右），与 inference.py 默认值一致
+    'img_size': 96,  # 模型输入尺寸
+}
 
 # MuseTalk 配置
 MUSETALK_DIR = os.path.join('external', 'MuseTalk')
@@ -30,8 +40,200 @@ MUSETALK_INFERENCE = {
     'use_float16': True,  # 是否使用半精度推理以节省显存
 }
 
+# MuseTalk 常驻推理引擎配置（进程内加载模型，子进程方式作为回退）
+MUSETALK_ENGINE = {
+    'mode': 'engine',  # 'engine' 进程内常驻引擎，'subprocess' 每次请求启动官方推理脚本
+    'preload_on_startup': True,  # API / 工作节点启动时加载并预热引擎；关闭后服务中的 MuseTalk 请求回退到子进程方式
+    # 启动时加载的引擎配置（API 的 musetalk_version / use_float16 组合，backend 缺省为 MUSETALK_BACKEND['backend']）。
+    # 运行期间不再加载其它组合：/generate 请求未加载的组合时告警并以子进程方式渲染，/avatars 与 /realtime 给出错误
+    'preload_engines': [{'version': MUSETALK_VERSION, 'use_float16': MUSETALK_INFERENCE['use_float16']}],
+    'device': 'auto',  # 'auto' / 'cpu' / 'cuda'
+    'batch_size': 8,
+    'vae_type': 'sd-vae',
+    'whisper_dir': 'models/whisper',  # 相对 MuseTalk 目录，与 MUSETALK_CONFIG 的 model_dir 一致
+    'extra_margin': 10,  # v1.5 下巴区域额外边距
+    'parsing_mode': 'jaw',  # v1.5 人脸解析融合模式
+    'left_cheek_width': 90,
+    'right_cheek_width': 90,
+    'audio_padding_length_left': 2,
+    'audio_padding_length_right': 2,
+    'subprocess_concurrency': 2,  # 子进程方式下同时运行的 MuseTalk 推理数
+    'keep_failed_workspace': False,  # 子进程方式失败时保留本次调用的工作区（输入、推理配置、部分结果）以便排查
+}
+
+# MuseTalk UNet / VAE 解码的推理后端。use_float16 只对 GPU 有效，纯 CPU 部署建议使用 int8 或 onnx
+MUSETALK_BACKEND = {
+    'backend': 'torch',  # 'torch' 原始 PyTorch；'int8' PyTorch 动态 int8 量化；'onnx' ONNX Runtime（int8 / CPU 后端）
+    'intra_op_threads': 0,  # 算子内线程数，0 表示当前进程可用的 CPU 数（启用 CPU_SLOTS 时为口型槽位的核心数）
+    'inter_op_threads': 1,  # 算子间线程数
+    'onnx_dir': os.path.join('cache', 'onnx'),  # 导出与量化后的 ONNX 模型
+    'quantize': True,  # onnx 后端是否做动态 int8 量化
+    'quantize_ops': ['MatMul'],  # 量化的算子类型，加入 'Conv' 会量化卷积（ConvInteger，视 CPU 不一定更快）
+    'min_psnr': 30.0,  # scripts/bench_musetalk_backend.py 判定画质合格的最低 PSNR（dB，对比 fp32）
+}
+
+# 模型权重共享：多个工作进程以只读内存映射加载同一份权重文件，页缓存中只保留一份（见 app.model_store）
+MODEL_STORE = {
+    'enabled': False,  # 仅对 CPU 推理生效，GPU 上不使用
+    'dir': os.path.join('cache', 'model_store'),  # 转换后的权重与模型骨架，首次加载时写入，之后各进程直接由此只读映射构造
+}
+
+# 静音帧跳过推理：TTS 音频中的停顿直接使用闭口帧，不经过 UNet / VAE
+SILENCE_SKIP = {
+    'enabled': True,
+    'threshold_db': -40.0,  # 相对峰值 RMS 的静音阈值
+    'min_silence_ms': 200,  # 更短的停顿仍按语音渲染
+    'pad_ms': 80,  # 语音区域前后扩展，嘴型提前张开、延后闭合
+    'transition_frames': 3,  # 语音与闭口帧之间的过渡帧数
+}
+
+# 常驻引擎写视频的方式：'pipe' 把原始帧通过管道送入一个 ffmpeg 编码进程，
+# 'png' 为官方脚本的逐帧 PNG + ffmpeg 读回（用于对比）
+FRAME_SINK = {
+    'mode': 'pipe',
+    'ffmpeg': 'ffmpeg',
+    'codec': 'libx264',
+    'preset': 'veryfast',  # x264 预设，越慢压缩率越高
+    'crf': 18,
+    'threads': 0,  # 编码线程数，0 表示由 ffmpeg 自动选择
+    'pix_fmt': 'bgr24',  # 输入帧的像素格式，MuseTalk 的帧来自 OpenCV，为 BGR
+}
+
+# 渲染质量档位：preview 先快速出一版核对文本与节奏，随后自动排队 full 重渲染并替换同一任务的视频
+QUALITY = {
+    'default': 'full',
+    'auto_upgrade': True,  # preview 完成后自动排队同一 task_id 的 full 渲染
+    'tiers': {
+        'preview': {
+            'fps': 12,  # 上限，帧数约为 25fps 的一半，推理量随之减半
+            # 可选 'image_scale'：按比例缩小参考图，只降低输出视频的分辨率（贴回与编码更快）。
+            # MuseTalk 的人脸裁剪始终缩放到 256×256，UNet / VAE 的计算量不变，且人脸检测准确率下降，
+            # 因此预览档位不缩小
+            'preset': 'ultrafast',  # x264 预设
+            'crf': 30,
+        },
+        'full': {},  # 使用请求参数与 FRAME_SINK 的默认值
+    },
+}
+
+# MuseTalk 批量渲染：把多个待处理任务合并到一次推理调用中，分摊模型加载开销
+MUSETALK_BATCH = {
+    'enabled': MUSETALK_ENGINE['mode'] == 'subprocess',  # 常驻引擎已无加载开销，仅子进程方式默认开启
+    'max_batch_size': 8,  # 单次调用最多合并的任务数
+    'max_wait': 1.0,  # 第一个任务最多等待多久（秒）以凑批
+}
+
 # 默认输入输出目录
 INPUT_DIR = 'input'
 OUTPUT_DIR = 'output'
 
 # 其他可扩展配置
+
+# TTS 引擎配置（常驻内存的 Bark）
+TTS_ENGINE = {
+    'max_workers': 2,  # 合成线程池大小，限制同时进行的 Bark 推理数量
+    'use_gpu': False,  # README 推荐 CPU-only 环境
+    'use_small': False,  # 是否使用 Bark 小模型（更快，质量略低）
+    'preload_on_startup': True,  # API 启动 / 流水线初始化时预加载模型
+    'voice_preset': 'v2/zh_speaker_1',  # 所有片段共用的 history prompt，保证音色一致
+}
+
+# 长文本分段合成配置
+TTS_SEGMENT = {
+    'max_cost': 150,  # 单段最大朗读长度（一个汉字计 3），Bark 单次约能生成 13 秒
+    'crossfade_ms': 40,  # 片段拼接处的交叉淡化时长
+}
+
+# TTS 音频缓存（按规范化文本 + 音色 + 模型版本寻址）
+TTS_CACHE = {
+    'enabled': True,
+    'cache_dir': os.path.join('cache', 'tts'),
+    'max_bytes': 2 * 1024 ** 3,  # 超过上限时按 LRU 淘汰
+}
+
+# 整个请求的结果缓存：相同输入（文本、图片内容、版本、bbox_shift、fps、精度等）直接返回已有任务
+RESULT_CACHE = {
+    'enabled': True,
+    'index_dir': os.path.join('cache', 'results'),  # 请求指纹 -> task_id
+}
+
+# 数字人形象预处理缓存（人脸检测 / bbox / VAE latent）
+AVATAR_CACHE = {
+    'cache_dir': os.path.join('cache', 'avatars'),
+    'memory_entries': 16,  # 内存中最多保留的预处理结果数
+    'max_disk_bytes': 5 * 1024 ** 3,  # 磁盘缓存上限，超过后按 LRU 淘汰
+    'registry_dir': 'avatars',  # 通过 API 注册的形象图片目录，按 avatar_id 存放
+}
+
+# /generate 异步任务队列
+JOB_QUEUE = {
+    'max_depth': 16,  # 排队任务上限，超出返回 429
+    'retry_after': 30,  # 无历史耗时数据时建议客户端的重试间隔（秒）
+    'history': 1000,  # 内存中保留的已结束任务数
+    'sse_interval': 0.5,  # 进度推送轮询间隔（秒）
+}
+
+# 任务耗时估算与排队顺序（见 app.job_cost）：按预计耗时短作业优先，等待越久越靠前
+COST_MODEL = {
+    'shortest_first': True,  # False 时按提交顺序执行
+    'aging': 1.0,  # 每等待 1 秒抵消 aging 秒的预计耗时，长任务不会一直被插队；0 为纯短作业优先
+    # 各语言的朗读速度（字符/秒），按 Bark 实际合成的音频时长持续修正
+    'chars_per_second': {'zh': 4.5, 'ja': 7.0, 'ko': 5.0, 'en': 14.0},
+    'render_rtf': 4.0,  # 整个任务的渲染耗时 / 音频时长，按已完成任务的实测值修正
+    'overhead': 5.0,  # 与时长无关的固定耗时（秒），如模型预热、合成与发布
+    'smoothing': 0.2,  # 实测值的指数平滑系数
+}
+
+# 渲染流水线各阶段的工作线程数与输入队列容量（0 表示不限）
+# 不同任务的 TTS、口型和合成阶段可同时执行，按阶段而不是按请求配置并发度
+PIPELINE_STAGES = {
+    'tts': {'workers': 1},  # 第一个阶段的队列容量由 JOB_QUEUE['max_depth'] 决定
+    'lipsync': {'workers': 1, 'queue_size': 2},  # 启用 MUSETALK_BATCH 时至少为 max_batch_size，否则凑不成批
+    'mux': {'workers': 1, 'queue_size': 4},
+}
+
+# CPU 槽位：把可用核心切分给各阶段的工作线程并绑定，PyTorch / OpenMP / ffmpeg 线程数按槽位设置，
+# 避免多个任务同时渲染时各自开满全部核心的线程互相争抢（见 app.cpu_slots）
+CPU_SLOTS = {
+    'enabled': False,
+    'slot_cores': {  # 阶段名 -> 每个工作线程独占的物理核心数，未列出的阶段不绑定
+        'bark': 8,  # TTS 引擎的合成线程（共 TTS_ENGINE['max_workers'] 个）；流水线 tts 阶段只分发，不绑定
+        'lipsync': 8,  # 启用 MUSETALK_BATCH 时由凑批器的推理线程使用，口型阶段的工作线程只等待批次，不绑定
+        'mux': 1,
+        'stream': 8,  # 流式任务（各分段的子流水线继承该槽位）
+        'worker': 8,  # 共享任务库的工作节点线程（整个任务在一个线程中顺序执行）
+    },
+    'reserved_cores': 1,  # 保留给 API 事件循环与系统的物理核心数
+}
+
+# 渐进式输出（HLS）：按句分段渲染，每段完成后立即追加到播放列表
+STREAMING = {
+    'max_depth': 8,  # 排队的流式任务上限
+    'workers': 1,  # 同时渲染的流式任务数
+    'first_segment_max_cost': 30,  # 首段更短，尽快出第一帧（一个汉字计 3）
+    'segment_max_cost': 90,  # 其余分段的最大朗读长度
+    'target_duration': 15,  # HLS 目标分段时长（秒），需不小于任一分段时长
+}
+
+# 实时会话（WebSocket）：绑定已注册形象，逐句合成语音并生成口型，边输入边返回音视频分段
+REALTIME = {
+    'max_sessions': 2,  # 同时进行的会话数，各会话共用常驻的 TTS 与 MuseTalk 引擎
+    'quality': 'preview',  # 分段的画质档位（见 QUALITY），preview 以更低帧率和快速编码换取延迟
+    'segment_max_cost': 60,  # 未遇到句末标点时，缓冲文本超过该长度即按停顿切出一段
+    'idle_timeout': 300,  # 客户端无消息超过该时间（秒）后关闭会话
+    'keep_files': False,  # 是否保留会话目录中的分段文件
+}
+
+# 多节点部署：任务写入共享任务库，任一 API 节点接收请求，任一工作节点以租约方式领取。
+# 各节点需共享 OUTPUT_DIR 与 AVATAR_CACHE['registry_dir']（如挂载同一 NFS 目录）
+JOB_STORE = {
+    'backend': 'local',  # 'local' 进程内 JobQueue（单机）；'sqlite' 共享任务库
+    'path': os.path.join('cache', 'jobs.sqlite3'),
+    'max_queued': 64,  # 任务库中排队任务上限，超出返回 429
+    'retry_after': 30,  # 无历史耗时数据时建议客户端的重试间隔（秒）
+    'lease_seconds': 60,  # 租约时长，工作节点失联超过该时间后任务重新排队
+    'heartbeat_interval': 10,  # 工作节点续约间隔（秒），需明显小于 lease_seconds
+    'max_attempts': 3,  # 单个任务最多被领取的次数
+    'poll_interval': 1.0,  # 空闲工作节点轮询任务库的间隔（秒）
+    'embedded_workers': 1,  # API 进程内启动的工作线程数，纯前端节点设为 0
+}
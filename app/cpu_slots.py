@@ -0,0 +1,237 @@
+import os
+import threading
+
+from app.config import CPU_SLOTS
+
+_SYSFS_CPU = '/sys/devices/system/cpu'
+_local = threading.local()
+
+
+def available_cpus():
+    """当前进程可用的逻辑 CPU 编号"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _read_int(path):
+    with open(path) as f:
+        return int(f.read().strip())
+
+
+def cpu_cores(cpus=None, sysfs_root=_SYSFS_CPU):
+    """
+    按物理核心分组的逻辑 CPU：同一核心的超线程放在一起，按 (socket, core) 排序
+
+    读取不到拓扑信息（非 Linux、容器屏蔽 sysfs）时每个逻辑 CPU 视为一个核心。
+
+    Returns:
+        list[list[int]]: 各物理核心的逻辑 CPU 编号
+    """
+    return [core for _, core in _core_groups(cpus, sysfs_root)]
+
+
+def _core_groups(cpus, sysfs_root):
+    """[(socket 编号, 该物理核心的逻辑 CPU)]，按 (socket, core) 排序"""
+    cpus = cpus if cpus is not None else available_cpus()
+    groups = {}
+    for cpu in cpus:
+        topology = os.path.join(sysfs_root, f"cpu{cpu}", "topology")
+        try:
+            key = (_read_int(os.path.join(topology, 'physical_package_id')),
+                   _read_int(os.path.join(topology, 'core_id')))
+        except (OSError, ValueError):
+            key = (0, cpu)
+        groups.setdefault(key, []).append(cpu)
+    return [(key[0], sorted(groups[key])) for key in sorted(groups)]
+
+
+class CpuSlot:
+    """
+    一个工作线程独占的 CPU 槽位
+
+    Args:
+        stage (str): 使用该槽位的阶段
+        cpus (list[int]): 绑定的逻辑 CPU（含超线程）
+        threads (int): 计算线程数，等于物理核心数
+        shared (bool): 核心已分配完、与其它槽位重叠时为 True
+    """
+
+    def __init__(self, stage, cpus, threads, shared=False):
+        self.stage = stage
+        self.cpus = cpus
+        self.threads = threads
+        self.shared = shared
+
+    def to_dict(self):
+        return {'stage': self.stage, 'cpus': self.cpus, 'threads': self.threads, 'shared': self.shared}
+
+
+class CpuSlotAllocator:
+    """
+    把可用 CPU 按物理核心切分为槽位，逐个分配给各阶段的工作线程
+
+    每个工作线程按 slot_cores 中该阶段的核心数取得一段连续的物理核心（尽量不跨 socket），
+    绑定后 PyTorch、OpenMP 和 ffmpeg 的线程数都按槽位大小设置，多个任务同时渲染时
+    各自只在自己的核心上运行，不再每个都开满全部核心的线程互相争抢。
+    核心分配完后继续从头分配并标记为共享，同时打印提示。
+
+    Args:
+        slot_cores (dict, optional): 阶段名 -> 每个工作线程的物理核心数，未列出的阶段不绑定
+        cpus (list[int], optional): 可用逻辑 CPU，默认为当前进程的 CPU 亲和性
+        reserved_cores (int, optional): 保留给 API 事件循环和系统的物理核心数（不分配）
+    """
+
+    def __init__(self, slot_cores=None, cpus=None, reserved_cores=None, sysfs_root=_SYSFS_CPU):
+        self.slot_cores = slot_cores if slot_cores is not None else CPU_SLOTS['slot_cores']
+        reserved = reserved_cores if reserved_cores is not None else CPU_SLOTS['reserved_cores']
+        groups = _core_groups(cpus, sysfs_root)
+        # 至少保留一个可分配的核心
+        self.reserved = min(reserved, len(groups) - 1)
+        groups = groups[self.reserved:]
+        self.cores = [core for _, core in groups]
+        self._packages = [package for package, _ in groups]
+        self.slots = []
+        self._cursor = 0
+        self._lock = threading.Lock()
+
+    def allocate(self, stage):
+        """为 stage 的一个工作线程分配槽位，该阶段不绑定时返回 None"""
+        size = self.slot_cores.get(stage)
+        if not size:
+            return None
+        size = min(size, len(self.cores))
+        with self._lock:
+            self._cursor = self._socket_aligned(self._cursor, size)
+            shared = self._cursor + size > len(self.cores)
+            if shared:
+                print(f"[CPU] 核心已分配完，{stage} 的槽位与已有槽位共享（共 {len(self.cores)} 个可用核心）")
+                self._cursor = 0
+            cores = self.cores[self._cursor:self._cursor + size]
+            self._cursor += size
+            slot = CpuSlot(stage, sorted(cpu for core in cores for cpu in core), len(cores), shared)
+            self.slots.append(slot)
+        return slot
+
+    def _socket_aligned(self, cursor, size):
+        """槽位会跨 socket 时，若下一个 socket 放得下则从下一个 socket 开始"""
+        end = cursor + size
+        if end > len(self.cores) or cursor >= len(self.cores) or self._packages[cursor] == self._packages[end - 1]:
+            return cursor
+        boundary = next(i for i in range(cursor, end) if self._packages[i] != self._packages[cursor])
+        return boundary if boundary + size <= len(self.cores) else cursor
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cores': len(self.cores),
+                'reserved_cores': self.reserved,
+                'allocated_cores': sum(slot.threads for slot in self.slots),
+                'oversubscribed': any(slot.shared for slot in self.slots),
+                'slots': [slot.to_dict() for slot in self.slots],
+            }
+
+
+def pin_current_thread(slot):
+    """把当前线程绑定到槽位，并把本线程的 PyTorch 线程数设为槽位的核心数"""
+    if hasattr(os, 'sched_setaffinity'):
+        # Linux 上 pid 0 指当前线程；之后由该线程创建的线程和子进程继承这一亲和性
+        os.sched_setaffinity(0, slot.cpus)
+    _local.slot = slot
+    try:
+        import torch
+    except ImportError:
+        return
+    # OpenMP 的线程数按线程记录，需在每个工作线程中分别设置
+    torch.set_num_threads(slot.threads)
+
+
+def current_slot():
+    """当前线程绑定的槽位，未绑定时为 None"""
+    return getattr(_local, 'slot', None)
+
+
+def slot_threads(default=0):
+    """当前线程槽位的计算线程数，未绑定时返回 default"""
+    slot = current_slot()
+    return slot.threads if slot is not None else default
+
+
+def slot_env():
+    """
+    子进程（MuseTalk / Wav2Lip 推理脚本）的环境变量：按槽位限制 OpenMP / MKL / OpenBLAS 线程数
+
+    未绑定时返回 None（子进程继承当前环境）。
+    """
+    slot = current_slot()
+    if slot is None:
+        return None
+    threads = str(slot.threads)
+    return {**os.environ, 'OMP_NUM_THREADS': threads, 'MKL_NUM_THREADS': threads, 'OPENBLAS_NUM_THREADS': threads}
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_cpu_slots():
+    """获取进程级共享的槽位分配器；CPU_SLOTS['enabled'] 为 False 时返回 None"""
+    global _allocator
+    if not CPU_SLOTS['enabled']:
+        return None
+    with _allocator_lock:
+        if _allocator is None:
+            _allocator = CpuSlotAllocator()
+        return _allocator
+
+
+def set_cpu_slots(allocator):
+    """替换进程级分配器（压测按不同槽位大小重复运行时使用），返回原分配器"""
+    global _allocator
+    with _allocator_lock:
+        old, _allocator = _allocator, allocator
+    return old
+
+
+def pin_worker(stage, index=0):
+    """
+    工作线程启动时调用：从共享分配器取得 stage 的槽位并绑定，供 StageScheduler 的 init_worker 使用
+
+    Returns:
+        CpuSlot or None: 未启用或该阶段不绑定时为 None
+    """
+    allocator = get_cpu_slots()
+    slot = allocator.allocate(stage) if allocator is not None else None
+    if slot is None:
+        return None
+    try:
+        pin_current_thread(slot)
+    except OSError as e:
+        # 槽位中的 CPU 不可用（如容器的 cpuset 变化），不绑定继续运行
+        print(f"[CPU] {stage}#{index} 绑定 CPU {slot.cpus} 失败: {e}")
+        return None
+    print(f"[CPU] {stage}#{index} 绑定 CPU {slot.cpus}，{slot.threads} 线程")
+    return slot
+
+
+def stage_pinner(stage_config):
+    """
+    StageScheduler 的 init_worker：按阶段配置绑定工作线程，'pin' 为 False 的阶段不绑定
+    （如启用 MuseTalk 凑批时的口型阶段，其工作线程只等待批次，推理在凑批器的线程中进行）
+    """
+    def init_worker(stage, index=0):
+        if not stage_config.get(stage, {}).get('pin', True):
+            return None
+        return pin_worker(stage, index)
+    return init_worker
+
+
+def stage_threads(stage):
+    """
+    启用 CPU 槽位时 stage 每个工作线程的计算线程数（槽位的物理核心数），未启用或该阶段不绑定时返回 None
+
+    供加载时就要确定线程数的组件（如 ONNX Runtime 会话）使用，加载线程本身通常没有绑定槽位。
+    """
+    allocator = get_cpu_slots()
+    size = allocator.slot_cores.get(stage) if allocator is not None else None
+    return min(size, len(allocator.cores)) if size else None
@@ -0,0 +1,155 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+from app.config import FRAME_SINK
+from app.cpu_slots import slot_threads
+
+
+def _encode_args(options):
+    args = ['-c:v', options['codec'], '-preset', options['preset'], '-crf', str(options['crf']),
+            '-pix_fmt', 'yuv420p']
+    # 未指定时按当前线程的 CPU 槽位限制编码线程数（未绑定时由 ffmpeg 自动选择）
+    threads = options['threads'] or slot_threads()
+    if threads:
+        args += ['-threads', str(threads)]
+    return args
+
+
+def _output_args(audio_input, output_path):
+    args = ['-map', '0:v:0']
+    if audio_input is not None:
+        args += ['-map', '1:a:0', '-c:a', 'aac', '-shortest']
+    return args + ['-movflags', '+faststart', output_path]
+
+
+class PipeFrameSink:
+    """
+    把原始帧通过管道写入一个 ffmpeg 编码进程
+
+    第一帧到达时按其尺寸启动 ffmpeg，之后每帧直接写入其标准输入，不经过磁盘；
+    close() 时结束输入并等待编码（含音频复用和 faststart）完成。
+
+    Args:
+        output_path (str): 输出视频路径
+        fps (int): 帧率
+        audio_path (str, optional): 同时复用的音频
+        **options: 覆盖 FRAME_SINK 中的 ffmpeg / codec / preset / crf / threads / pix_fmt
+    """
+
+    def __init__(self, output_path, fps, audio_path=None, **options):
+        self.output_path = output_path
+        self.fps = fps
+        self.audio_path = audio_path
+        self.options = {**FRAME_SINK, **options}
+        self.frames = 0
+        self.temp_bytes = 0  # 不使用临时文件
+        self._process = None
+
+    def command(self, width, height):
+        cmd = [self.options['ffmpeg'], '-y', '-v', 'warning',
+               '-f', 'rawvideo', '-pix_fmt', self.options['pix_fmt'], '-s', f"{width}x{height}",
+               '-r', str(self.fps), '-i', '-']
+        if self.audio_path is not None:
+            cmd += ['-i', self.audio_path]
+        return cmd + _encode_args(self.options) + _output_args(self.audio_path, self.output_path)
+
+    def write(self, frame):
+        if self._process is None:
+            height, width = frame.shape[:2]
+            self._process = subprocess.Popen(self.command(width, height), stdin=subprocess.PIPE)
+        try:
+            self._process.stdin.write(frame.tobytes())
+        except BrokenPipeError:
+            # ffmpeg 已退出，错误码在 close() 中报告
+            self.close()
+            raise
+        self.frames += 1
+
+    def close(self):
+        if self._process is None:
+            raise RuntimeError("没有写入任何帧")
+        if not self._process.stdin.closed:
+            self._process.stdin.close()
+        code = self._process.wait()
+        if code != 0:
+            raise RuntimeError(f"ffmpeg 编码失败，退出码 {code}: {self.output_path}")
+
+    def abort(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+class PNGFrameSink:
+    """
+    官方脚本的写法：逐帧写 PNG 到临时目录，结束时由 ffmpeg 读回编码
+
+    接口与 PipeFrameSink 相同，保留用于对比测试和排查编码问题。
+    """
+
+    def __init__(self, output_path, fps, audio_path=None, **options):
+        self.output_path = output_path
+        self.fps = fps
+        self.audio_path = audio_path
+        self.options = {**FRAME_SINK, **options}
+        self.frames = 0
+        self.temp_bytes = 0  # 编码前临时目录的大小，即 PNG 序列占用的峰值磁盘
+        self.frame_dir = tempfile.mkdtemp(prefix="musetalk_frames_",
+                                          dir=os.path.dirname(os.path.abspath(output_path)))
+
+    def write(self, frame):
+        import cv2
+        path = os.path.join(self.frame_dir, f"{str(self.frames).zfill(8)}.png")
+        cv2.imwrite(path, frame)
+        self.temp_bytes += os.path.getsize(path)
+        self.frames += 1
+
+    def close(self):
+        try:
+            cmd = [self.options['ffmpeg'], '-y', '-v', 'warning', '-r', str(self.fps), '-f', 'image2',
+                   '-i', os.path.join(self.frame_dir, '%08d.png')]
+            if self.audio_path is not None:
+                cmd += ['-i', self.audio_path]
+            cmd += _encode_args(self.options) + _output_args(self.audio_path, self.output_path)
+            subprocess.run(cmd, check=True)
+        finally:
+            shutil.rmtree(self.frame_dir, ignore_errors=True)
+
+    def abort(self):
+        shutil.rmtree(self.frame_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+FRAME_SINKS = {
+    'pipe': PipeFrameSink,
+    'png': PNGFrameSink,
+}
+
+
+def make_frame_sink(output_path, fps, audio_path=None, mode=None, **options):
+    """按 FRAME_SINK['mode'] 创建帧输出"""
+    mode = mode or FRAME_SINK['mode']
+    if mode not in FRAME_SINKS:
+        raise ValueError(f"不支持的帧输出方式: {mode}，支持: {list(FRAME_SINKS)}")
+    return FRAME_SINKS[mode](output_path, fps, audio_path, **options)
@@ -0,0 +1,39 @@
+import os
+
+
+def write_bytes():
+    """
+    本进程（含已回收的子进程，如 ffmpeg、MuseTalk 推理脚本）经 write() 写出的字节数
+
+    取自 /proc/self/io 的 wchar，不可用时返回 None。
+    """
+    try:
+        with open(f"/proc/{os.getpid()}/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class WriteMeter:
+    """
+    统计一段代码期间写出的字节数
+
+    计数是进程级的，只在同一时间只有一个请求的场景（如 pipeline.py 命令行）中能归因到单个请求。
+    """
+
+    def __init__(self):
+        self.start_bytes = None
+        self.result = None
+
+    def __enter__(self):
+        self.start_bytes = write_bytes()
+        return self
+
+    def __exit__(self, *exc):
+        end_bytes = write_bytes()
+        if end_bytes is not None and self.start_bytes is not None:
+            self.result = end_bytes - self.start_bytes
+        return False
@@ -0,0 +1,203 @@
+import re
+import threading
+import time
+
+from app.config import COST_MODEL, QUALITY
+
+_KANA_RE = re.compile(r'[぀-ヿ]')
+_HANGUL_RE = re.compile(r'[가-힯]')
+_HAN_RE = re.compile(r'[㐀-䶿一-鿿]')
+_LATIN_RE = re.compile(r'[A-Za-z]')
+
+
+def detect_language(text):
+    """按文字判断朗读语言：含假名为 ja，含谚文为 ko，汉字不少于拉丁字母的 1/3 为 zh，否则为 en"""
+    if _KANA_RE.search(text):
+        return 'ja'
+    if _HANGUL_RE.search(text):
+        return 'ko'
+    han = len(_HAN_RE.findall(text))
+    if han and han * 3 >= len(_LATIN_RE.findall(text)):
+        return 'zh'
+    return 'en'
+
+
+class CostEstimator:
+    """
+    按文本长度和语言估算渲染耗时，并用实测值持续修正
+
+    预计耗时 = overhead + 音频时长 × render_rtf，音频时长 = 字符数 / 该语言的朗读速度。
+    TTS 完成后以 Bark 实际合成的时长修正该语言的朗读速度，任务完成后以实际耗时修正 render_rtf
+    （均为指数平滑），之后提交的任务估算随之变准。
+
+    Args:
+        chars_per_second (dict, optional): 语言 -> 朗读速度（字符/秒）
+        render_rtf (float, optional): 渲染耗时 / 音频时长
+        overhead (float, optional): 与时长无关的固定耗时（秒）
+        smoothing (float, optional): 指数平滑系数
+    """
+
+    def __init__(self, chars_per_second=None, render_rtf=None, overhead=None, smoothing=None):
+        self.chars_per_second = dict(chars_per_second or COST_MODEL['chars_per_second'])
+        self.render_rtf = render_rtf if render_rtf is not None else COST_MODEL['render_rtf']
+        self.overhead = overhead if overhead is not None else COST_MODEL['overhead']
+        self.smoothing = smoothing if smoothing is not None else COST_MODEL['smoothing']
+        self.speech_samples = 0
+        self.render_samples = 0
+        self._lock = threading.Lock()
+
+    def speech_seconds(self, chars, language):
+        with self._lock:
+            rate = self.chars_per_second.get(language) or self.chars_per_second['en']
+        return chars / rate
+
+    def render_seconds(self, speech_seconds):
+        with self._lock:
+            return self.overhead + speech_seconds * self.render_rtf
+
+    def estimate(self, texts):
+        """
+        估算一组文本（一个任务的各条目）的渲染耗时
+
+        Returns:
+            dict: language、chars、speech_seconds、render_seconds，measured 为 False 表示音频时长仍是估算值
+        """
+        text = ' '.join(texts)
+        language = detect_language(text)
+        chars = len(re.sub(r'\s+', '', text))
+        speech = self.speech_seconds(chars, language)
+        return {
+            'language': language,
+            'chars': chars,
+            'speech_seconds': speech,
+            'render_seconds': self.render_seconds(speech),
+            'measured': False,
+        }
+
+    def _smooth(self, old, new):
+        return (1 - self.smoothing) * old + self.smoothing * new
+
+    def observe_speech(self, chars, language, duration):
+        """Bark 实际合成的音频时长：修正该语言的朗读速度"""
+        if chars <= 0 or duration <= 0:
+            return
+        with self._lock:
+            old = self.chars_per_second.get(language) or self.chars_per_second['en']
+            self.chars_per_second[language] = self._smooth(old, chars / duration)
+            self.speech_samples += 1
+
+    def observe_render(self, speech_seconds, elapsed):
+        """任务的实际渲染耗时：修正 render_rtf"""
+        if speech_seconds <= 0:
+            return
+        with self._lock:
+            rtf = max(0.0, elapsed - self.overhead) / speech_seconds
+            self.render_rtf = self._smooth(self.render_rtf, rtf)
+            self.render_samples += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'chars_per_second': dict(self.chars_per_second),
+                'render_rtf': self.render_rtf,
+                'overhead': self.overhead,
+                'speech_samples': self.speech_samples,
+                'render_samples': self.render_samples,
+            }
+
+
+def job_texts(job):
+    """任务各条目的文本（读取 text_path），读取失败的条目跳过"""
+    texts = []
+    items = job.params.get('items', []) if isinstance(job.params, dict) else []
+    for item in items:
+        try:
+            with open(item['text_path'], 'r', encoding='utf-8') as f:
+                texts.append(f.read().strip())
+        except (KeyError, OSError):
+            continue
+    return texts
+
+
+def estimate_job(job, estimator=None):
+    """按任务文本估算耗时（不修改任务），没有文本时返回 None"""
+    texts = job_texts(job)
+    if not texts:
+        return None
+    return (estimator or get_cost_estimator()).estimate(texts)
+
+
+def refine_estimate(job, speech_seconds, observe=True, estimator=None):
+    """
+    TTS 完成后以实测音频时长更新 job.info['estimate']；observe 为 True 时同时修正朗读速度
+
+    Returns:
+        dict or None: 更新后的估算，任务没有估算时为 None
+    """
+    estimate = job.info.get('estimate')
+    if not estimate:
+        return None
+    estimator = estimator or get_cost_estimator()
+    if observe:
+        estimator.observe_speech(estimate['chars'], estimate['language'], speech_seconds)
+    estimate = {**estimate, 'speech_seconds': speech_seconds,
+                'render_seconds': estimator.render_seconds(speech_seconds), 'measured': True}
+    job.set_info(estimate=estimate)
+    return estimate
+
+
+def observe_job(job, estimator=None):
+    """
+    任务完成时以实际耗时修正 render_rtf
+
+    只统计自行合成 TTS 的完整画质任务：preview 与复用音频的升级渲染耗时不代表完整任务。
+    """
+    estimate = job.info.get('estimate')
+    params = job.params
+    if (not estimate or not estimate.get('measured') or job.started_at is None or params.get('reuse_tts')
+            or (params.get('quality') or QUALITY['default']) != 'full'):
+        return
+    (estimator or get_cost_estimator()).observe_render(estimate['speech_seconds'], time.time() - job.started_at)
+
+
+def job_cost(job):
+    """任务的预计渲染耗时（秒），没有估算时为 0"""
+    return (job.info.get('estimate') or {}).get('render_seconds', 0.0)
+
+
+def remaining_seconds(job):
+    """进行中任务的预计剩余耗时"""
+    cost = job_cost(job)
+    if job.started_at is None:
+        return cost
+    return max(0.0, cost - (time.time() - job.started_at))
+
+
+def priority_key(cost, submitted_at, aging=None):
+    """
+    短作业优先 + 老化的排序键，越小越先执行
+
+    预计耗时折算为推迟的到达时间：aging 为 1 时，预计多耗时 60 秒的任务相当于晚提交 60 秒，
+    等待足够久的长任务终会排到新提交的短任务前面。键与当前时间无关，可直接用于堆和 SQL 排序。
+    aging 为 0 时只按预计耗时排序。
+    """
+    aging = aging if aging is not None else COST_MODEL['aging']
+    return submitted_at + cost / aging if aging > 0 else cost
+
+
+def job_priority(job):
+    """StageScheduler 首个阶段的排队优先级（见 Stage 的 priority）"""
+    return priority_key(job_cost(job), job.created_at)
+
+
+_estimator = None
+_estimator_lock = threading.Lock()
+
+
+def get_cost_estimator():
+    """获取进程级共享的耗时估算器"""
+    global _estimator
+    with _estimator_lock:
+        if _estimator is None:
+            _estimator = CostEstimator()
+        return _estimator
@@ -0,0 +1,273 @@
+import queue
+import threading
+import time
+
+from app.config import COST_MODEL, CPU_SLOTS, JOB_QUEUE, PIPELINE_STAGES
+from app.cpu_slots import stage_pinner
+from app.job_cost import estimate_job, get_cost_estimator, job_cost, job_priority, remaining_seconds
+from app.scheduler import Stage, StageScheduler
+
+
+class QueueFullError(Exception):
+    """任务队列已满"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"任务队列已满，请 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+class DeadlineError(Exception):
+    """按当前排队情况预计无法在客户端给出的截止时间前完成"""
+
+    def __init__(self, estimated_seconds, deadline):
+        super().__init__(f"预计 {estimated_seconds:.0f} 秒后完成，超过截止时间 {deadline:.0f} 秒")
+        self.estimated_seconds = estimated_seconds
+        self.deadline = deadline
+
+
+class LeaseLostError(Exception):
+    """任务的租约已被回收，其它节点正在执行同一任务，本节点不再继续写输出"""
+
+
+class Job:
+    """
+    一个渲染任务及其进度
+
+    Args:
+        task_id (str): 任务 ID
+        params (dict): 渲染参数，由各阶段处理函数解释
+    """
+
+    def __init__(self, task_id, params):
+        self.task_id = task_id
+        self.params = params
+        self.status = 'queued'  # queued / running / done / failed
+        self.stage = None
+        self.progress = 0.0
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.info = {}  # 阶段附加信息，如流式任务的首段延迟
+        self.spans = []  # 各阶段及子步骤的耗时记录，见 app.metrics.span
+        self.artifacts = {}  # 阶段之间在内存中传递的音频 / 图片（路径 -> app.artifacts 对象），不持久化
+        self.lost = False  # 多节点下租约已被回收（见 app.worker.LeasedJob）
+        self.events = []
+        self._lock = threading.Lock()
+        self._add_event()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def _add_event(self):
+        self.events.append(self.to_dict())
+
+    def update(self, status=None, stage=None, progress=None, error=None, result=None):
+        with self._lock:
+            if status is not None:
+                self.status = status
+                if status == 'running' and self.started_at is None:
+                    self.started_at = time.time()
+                if status in ('done', 'failed'):
+                    self.finished_at = time.time()
+            if stage is not None:
+                self.stage = stage
+            if progress is not None:
+                self.progress = progress
+            if error is not None:
+                self.error = error
+            if result is not None:
+                self.result = result
+            self._add_event()
+
+    def set_info(self, **info):
+        with self._lock:
+            self.info.update(info)
+            self._add_event()
+
+    def check_lease(self):
+        """各阶段开始前调用：租约已被回收时抛出 LeaseLostError，避免与新领取的节点写同一输出目录"""
+        if self.lost:
+            raise LeaseLostError(f"任务 {self.task_id} 的租约已被回收，停止渲染")
+
+    def release_artifacts(self):
+        """任务结束后释放内存中的音频 / 图片（需要的后续任务已持有各自的引用）"""
+        self.artifacts = {}
+
+    def set_stage(self, stage, progress):
+        """任务处理函数在进入每个阶段时调用"""
+        print(f"[JOB] {self.task_id} stage={stage} progress={progress:.0%}")
+        self.update(stage=stage, progress=progress)
+
+    def to_dict(self):
+        return {
+            'task_id': self.task_id,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'error': self.error,
+            'result': self.result,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'info': dict(self.info),
+        }
+
+
+class JobQueue:
+    """
+    有界任务队列，任务按阶段流水线执行
+
+    提交立即返回，任务依次流经各阶段（如 tts -> lipsync -> mux），每个阶段有独立的
+    工作线程数和有界队列（见 PIPELINE_STAGES），不同任务的不同阶段可以同时执行。
+    等待进入第一个阶段的任务数达到上限时拒绝提交，并给出建议的重试时间。
+
+    提交时按文本估算任务耗时（见 app.job_cost），排队任务按预计耗时短作业优先并随等待时间老化
+    （COST_MODEL['shortest_first']），短任务不再排在先提交的长任务之后；同时给出预计开始时间，
+    预计完成时间超过客户端的截止时间时拒绝提交。
+
+    Args:
+        stages (list[tuple]): (阶段名, 处理函数) 列表，处理函数参数为 Job，
+            最后一个阶段的返回值记录为任务结果
+        max_depth (int, optional): 排队任务上限
+        stage_config (dict, optional): 各阶段的 workers / queue_size，默认取 PIPELINE_STAGES
+        followup (callable, optional): 任务完成后调用，返回需要接着排队的任务（如预览后的
+            完整渲染）或 None
+        estimator (CostEstimator, optional): 耗时估算器，默认为进程级共享的估算器
+    """
+
+    def __init__(self, stages, max_depth=None, stage_config=None, followup=None, estimator=None):
+        self.max_depth = max_depth if max_depth is not None else JOB_QUEUE['max_depth']
+        stage_config = stage_config if stage_config is not None else PIPELINE_STAGES
+        scheduler_stages = []
+        for index, (name, fn) in enumerate(stages):
+            config = stage_config.get(name, {})
+            # 第一个阶段的队列即任务排队队列，容量为 max_depth
+            queue_size = self.max_depth if index == 0 else config.get('queue_size', 0)
+            priority = job_priority if index == 0 and COST_MODEL['shortest_first'] else None
+            scheduler_stages.append(Stage(name, fn, config.get('workers', 1), queue_size, priority))
+        # 启用 CPU 槽位时各阶段工作线程绑定到各自的核心
+        self.scheduler = StageScheduler(scheduler_stages, on_start=self._on_start,
+                                        on_done=self._on_done, on_error=self._on_error,
+                                        init_worker=stage_pinner(stage_config) if CPU_SLOTS['enabled'] else None)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._running = set()
+        self._durations = []
+        self.followup = followup
+        self.estimator = estimator or get_cost_estimator()
+
+    def start(self):
+        """启动各阶段工作线程（重复调用无副作用）"""
+        self.scheduler.start()
+
+    def shutdown(self):
+        self.scheduler.shutdown()
+
+    def retry_after(self):
+        """根据排队数和历史平均耗时估算建议的重试间隔（秒）"""
+        with self._lock:
+            durations = list(self._durations)
+        if not durations:
+            return JOB_QUEUE['retry_after']
+        avg = sum(durations) / len(durations)
+        first = self.scheduler.stages[0]
+        return max(1, int(avg * (first.queue.qsize() + 1) / max(first.workers, 1)))
+
+    def estimated_wait(self, job):
+        """
+        预计开始前的等待时间（秒）：排在 job 之前的排队任务与进行中任务的剩余预计耗时之和，
+        除以最少的阶段工作线程数（流水线的瓶颈）
+        """
+        first = self.scheduler.stages[0]
+        queued = first.pending()
+        if first.priority is not None:
+            key = first.priority(job)
+            queued = [j for j in queued if first.priority(j) <= key]
+        with self._lock:
+            running = list(self._running)
+        work = sum(job_cost(j) for j in queued) + sum(remaining_seconds(j) for j in running)
+        return work / max(1, min(stage.workers for stage in self.scheduler.stages))
+
+    def submit(self, job, aliases=(), deadline=None):
+        """
+        提交任务；aliases 为同样指向该任务的其它 ID（如批量任务中的各条目）
+
+        deadline 为客户端要求的最晚完成时间（提交后的秒数），预计赶不上时抛出 DeadlineError。
+        预计耗时与开始时间记入 job.info 的 estimate / estimated_start。
+        """
+        estimate = estimate_job(job, self.estimator)
+        if estimate is not None:
+            job.set_info(estimate=estimate)
+        wait = self.estimated_wait(job)
+        if deadline is not None and wait + job_cost(job) > deadline:
+            print(f"[JOB] {job.task_id} rejected, expected to finish in {wait + job_cost(job):.0f}s > {deadline:.0f}s")
+            raise DeadlineError(wait + job_cost(job), deadline)
+        if estimate is not None:
+            job.set_info(estimated_start=time.time() + wait)
+        try:
+            self.scheduler.submit(job, block=False)
+        except queue.Full:
+            raise QueueFullError(self.retry_after())
+        with self._lock:
+            self._jobs[job.task_id] = job
+            for alias in aliases:
+                self._jobs[alias] = job
+            self._prune()
+        print(f"[JOB] {job.task_id} queued, depth={self.scheduler.stages[0].queue.qsize()}, "
+              f"estimated {job_cost(job):.0f}s, wait {wait:.0f}s")
+        return job
+
+    def get(self, task_id):
+        with self._lock:
+            return self._jobs.get(task_id)
+
+    def _prune(self):
+        finished = [(key, j) for key, j in self._jobs.items() if j.finished]
+        finished.sort(key=lambda item: item[1].finished_at)
+        for key, _ in finished[:max(0, len(finished) - JOB_QUEUE['history'])]:
+            del self._jobs[key]
+
+    def _on_start(self, job):
+        with self._lock:
+            self._running.add(job)
+        job.update(status='running')
+
+    def _finish(self, job):
+        with self._lock:
+            self._running.discard(job)
+            self._durations = (self._durations + [job.finished_at - job.started_at])[-50:]
+            self._prune()
+
+    def _on_done(self, job, result):
+        job.update(status='done', progress=1.0, result=result)
+        self._finish(job)
+        next_job = self.followup(job) if self.followup is not None else None
+        if next_job is not None:
+            try:
+                self.submit(next_job)
+            except QueueFullError:
+                print(f"[JOB] {job.task_id} follow-up rejected, queue full")
+                job.set_info(followup='rejected')
+        # 已完成的任务仍保留在历史中供查询，中间结果交给后续任务后即释放
+        job.release_artifacts()
+
+    def _on_error(self, job, error):
+        job.update(status='failed', error=str(error))
+        self._finish(job)
+        job.release_artifacts()
+
+    def stats(self):
+        with self._lock:
+            running = len(self._running)
+            tracked = len(self._jobs)
+        return {
+            'max_depth': self.max_depth,
+            'queued': self.scheduler.stages[0].queue.qsize(),
+            'running': running,
+            'tracked_jobs': tracked,
+            'stages': self.scheduler.report(),
+            'cost_model': self.estimator.stats(),
+        }
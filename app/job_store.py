@@ -0,0 +1,351 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.config import COST_MODEL, JOB_STORE
+from app.job_cost import priority_key
+from app.job_queue import DeadlineError, QueueFullError
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    task_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    info TEXT NOT NULL DEFAULT '{}',
+    error TEXT,
+    result TEXT,
+    spans TEXT NOT NULL DEFAULT '[]',
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    task_id TEXT NOT NULL
+);
+"""
+
+
+class SQLiteJobStore:
+    """
+    多个 API 节点与工作节点共享的任务库（SQLite）
+
+    API 节点只负责写入任务，工作节点以租约方式领取：领取时写入 worker_id 和租约到期时间，
+    渲染期间定期心跳续约。工作节点崩溃后租约过期，任务自动回到排队状态由其它节点重新领取，
+    超过 max_attempts 次后标记为失败。进度、结果和错误都写回任务库，任一 API 节点都能查询。
+
+    SQLite 适合单机多进程和测试；跨主机部署需把数据库放在支持文件锁的共享存储上，
+    或按相同接口实现基于数据库服务的后端（见 JOB_STORES）。
+
+    Args:
+        path (str, optional): 数据库文件路径
+        lease_seconds (float, optional): 租约时长（秒）
+        max_attempts (int, optional): 单个任务最多被领取的次数
+        max_queued (int, optional): 排队任务上限，超出时 enqueue 抛出 QueueFullError
+    """
+
+    def __init__(self, path=None, lease_seconds=None, max_attempts=None, max_queued=None):
+        self.path = path or JOB_STORE['path']
+        self.lease_seconds = lease_seconds if lease_seconds is not None else JOB_STORE['lease_seconds']
+        self.max_attempts = max_attempts if max_attempts is not None else JOB_STORE['max_attempts']
+        self.max_queued = max_queued if max_queued is not None else JOB_STORE['max_queued']
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        # 每次操作使用独立连接，可在多线程、多进程间安全共享同一个数据库文件
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return _Connection(conn)
+
+    def enqueue(self, task_id, kind, params, aliases=(), info=None, replace=False, deadline=None):
+        """
+        写入一个排队任务；aliases 为同样指向该任务的其它 ID（如批量任务中的各条目）
+
+        replace 为 True 时覆盖已结束的同名任务（如预览完成后以同一 task_id 排队完整渲染）。
+        info['estimate'] 为预计耗时（见 app.job_cost），用于领取顺序和预计开始时间；
+        deadline 为最晚完成时间（提交后的秒数），预计赶不上时抛出 DeadlineError。
+
+        Returns:
+            float: 预计开始时间（时间戳）
+        """
+        info = dict(info or {})
+        cost = (info.get('estimate') or {}).get('render_seconds', 0.0)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.max_queued:
+                conn.execute("ROLLBACK")
+                raise QueueFullError(self.retry_after(conn, queued))
+            now = time.time()
+            wait = self.estimated_wait(conn, cost, now)
+            if deadline is not None and wait + cost > deadline:
+                conn.execute("ROLLBACK")
+                raise DeadlineError(wait + cost, deadline)
+            if info.get('estimate'):
+                info['estimated_start'] = now + wait
+            conn.execute(
+                f"INSERT {'OR REPLACE ' if replace else ''}INTO jobs (task_id, kind, params, status, info, created_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?)",
+                (task_id, kind, json.dumps(params, ensure_ascii=False), json.dumps(info, ensure_ascii=False), now))
+            conn.executemany("INSERT OR REPLACE INTO aliases (alias, task_id) VALUES (?, ?)",
+                             [(alias, task_id) for alias in aliases])
+            conn.execute("COMMIT")
+        print(f"[STORE] {task_id} queued ({kind}), depth={queued + 1}, estimated {cost:.0f}s, wait {wait:.0f}s")
+        return now + wait
+
+    def estimated_wait(self, conn, cost, now):
+        """
+        预计开始前的等待时间（秒）：领取顺序排在前面的排队任务与进行中任务的剩余预计耗时之和，
+        除以活跃工作节点数
+        """
+        key = priority_key(cost, now)
+        work = 0.0
+        for row in conn.execute("SELECT status, info, created_at, started_at FROM jobs "
+                                "WHERE status IN ('queued', 'running')").fetchall():
+            row_cost = (json.loads(row['info']).get('estimate') or {}).get('render_seconds', 0.0)
+            if row['status'] == 'running':
+                work += max(0.0, row_cost - (now - (row['started_at'] or now)))
+            elif not COST_MODEL['shortest_first'] or priority_key(row_cost, row['created_at']) <= key:
+                work += row_cost
+        workers = conn.execute("SELECT COUNT(DISTINCT worker_id) FROM jobs WHERE status = 'running'").fetchone()[0]
+        return work / max(workers, 1)
+
+    def _claim_order(self):
+        """领取顺序，与 app.job_cost.priority_key 一致：短作业优先并随等待时间老化，或按提交顺序"""
+        if not COST_MODEL['shortest_first']:
+            return " ORDER BY created_at", []
+        cost = "COALESCE(json_extract(info, '$.estimate.render_seconds'), 0)"
+        if COST_MODEL['aging'] > 0:
+            return f" ORDER BY created_at + {cost} / ?, created_at", [COST_MODEL['aging']]
+        return f" ORDER BY {cost}, created_at", []
+
+    def retry_after(self, conn, queued):
+        """按最近完成任务的平均耗时和活跃工作节点数估算建议的重试间隔（秒）"""
+        row = conn.execute(
+            "SELECT AVG(finished_at - started_at) FROM (SELECT finished_at, started_at FROM jobs "
+            "WHERE status = 'done' ORDER BY finished_at DESC LIMIT 50)").fetchone()
+        if row[0] is None:
+            return JOB_STORE['retry_after']
+        workers = conn.execute("SELECT COUNT(DISTINCT worker_id) FROM jobs WHERE status = 'running'").fetchone()[0]
+        return max(1, int(row[0] * (queued + 1) / max(workers, 1)))
+
+    def requeue_expired(self, conn=None):
+        """
+        回收租约已过期的任务（工作节点崩溃或失联）：未达到 max_attempts 的重新排队，否则标记失败
+
+        Returns:
+            int: 重新排队的任务数
+        """
+        if conn is None:
+            with self._connect() as conn:
+                return self.requeue_expired(conn)
+        now = time.time()
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, worker_id = NULL, lease_expires = NULL "
+            "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+            (f"工作节点失联，已重试 {self.max_attempts} 次", now, now, self.max_attempts))
+        requeued = conn.execute(
+            "UPDATE jobs SET status = 'queued', worker_id = NULL, lease_expires = NULL "
+            "WHERE status = 'running' AND lease_expires < ?", (now,)).rowcount
+        if requeued:
+            print(f"[STORE] Requeued {requeued} job(s) with expired leases")
+        return requeued
+
+    def claim(self, worker_id, kinds=None):
+        """
+        领取下一个排队任务（顺序见 _claim_order）
+
+        Returns:
+            dict or None: 任务记录（含 params），没有可领取的任务时返回 None
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self.requeue_expired(conn)
+            query = "SELECT task_id FROM jobs WHERE status = 'queued'"
+            args = []
+            if kinds:
+                query += f" AND kind IN ({','.join('?' * len(kinds))})"
+                args += list(kinds)
+            order, order_args = self._claim_order()
+            row = conn.execute(query + order + " LIMIT 1", args + order_args).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, lease_expires = ?, attempts = attempts + 1, "
+                "started_at = COALESCE(started_at, ?) WHERE task_id = ?",
+                (worker_id, now + self.lease_seconds, now, row['task_id']))
+            record = self._record(conn, row['task_id'])
+            conn.execute("COMMIT")
+        print(f"[STORE] {record['task_id']} claimed by {worker_id} (attempt {record['attempts']})")
+        return record
+
+    def _owned_update(self, task_id, worker_id, assignments, args):
+        """仅当任务仍由 worker_id 持有时更新；租约已被回收时返回 False"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE task_id = ? AND worker_id = ? AND status = 'running'",
+                list(args) + [task_id, worker_id])
+            return cursor.rowcount == 1
+
+    def heartbeat(self, task_id, worker_id):
+        """续约；返回 False 表示租约已失效（任务已被回收给其它节点）"""
+        return self._owned_update(task_id, worker_id, "lease_expires = ?",
+                                  [time.time() + self.lease_seconds])
+
+    def update(self, task_id, worker_id, stage=None, progress=None, info=None):
+        """写回进度；info 为完整的附加信息字典"""
+        assignments, args = [], []
+        for column, value in (('stage', stage), ('progress', progress)):
+            if value is not None:
+                assignments.append(f"{column} = ?")
+                args.append(value)
+        if info is not None:
+            assignments.append("info = ?")
+            args.append(json.dumps(info, ensure_ascii=False))
+        if not assignments:
+            return True
+        return self._owned_update(task_id, worker_id, ", ".join(assignments), args)
+
+    def complete(self, task_id, worker_id, result, spans=()):
+        return self._owned_update(
+            task_id, worker_id,
+            "status = 'done', progress = 1.0, result = ?, spans = ?, finished_at = ?, lease_expires = NULL",
+            [json.dumps(result, ensure_ascii=False), json.dumps(list(spans)), time.time()])
+
+    def fail(self, task_id, worker_id, error, spans=()):
+        return self._owned_update(
+            task_id, worker_id,
+            "status = 'failed', error = ?, spans = ?, finished_at = ?, lease_expires = NULL",
+            [error, json.dumps(list(spans)), time.time()])
+
+    def _record(self, conn, task_id):
+        row = conn.execute("SELECT * FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+        if row is None:
+            alias = conn.execute("SELECT task_id FROM aliases WHERE alias = ?", (task_id,)).fetchone()
+            if alias is None:
+                return None
+            row = conn.execute("SELECT * FROM jobs WHERE task_id = ?", (alias['task_id'],)).fetchone()
+            if row is None:
+                return None
+        record = dict(row)
+        record['params'] = json.loads(record['params'])
+        record['info'] = json.loads(record['info'])
+        record['result'] = json.loads(record['result']) if record['result'] is not None else None
+        record['spans'] = json.loads(record['spans'])
+        return record
+
+    def get(self, task_id):
+        """按任务 ID 或别名查询任务记录，不存在时返回 None"""
+        with self._connect() as conn:
+            return self._record(conn, task_id)
+
+    def stats(self):
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            workers = conn.execute(
+                "SELECT COUNT(DISTINCT worker_id) FROM jobs WHERE status = 'running' AND lease_expires >= ?",
+                (time.time(),)).fetchone()[0]
+        return {
+            'backend': 'sqlite',
+            'max_queued': self.max_queued,
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'done': counts.get('done', 0),
+            'failed': counts.get('failed', 0),
+            'active_workers': workers,
+        }
+
+
+class _Connection:
+    """sqlite3 连接的上下文管理器：退出时关闭连接（sqlite3 自带的只提交不关闭），异常时回滚"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is not None and self.conn.in_transaction:
+                self.conn.execute("ROLLBACK")
+        finally:
+            self.conn.close()
+        return False
+
+
+class JobHandle:
+    """
+    任务库中的任务在 API 节点上的只读视图，接口与 Job 的查询部分一致
+
+    任务可能在任一工作节点上执行，每次访问都从任务库读取最新状态。
+    """
+
+    def __init__(self, store, task_id):
+        self.store = store
+        self.task_id = task_id
+
+    def _get(self):
+        return self.store.get(self.task_id)
+
+    @property
+    def status(self):
+        record = self._get()
+        return record['status'] if record is not None else 'queued'
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    @property
+    def spans(self):
+        record = self._get()
+        return record['spans'] if record is not None else []
+
+    def to_dict(self):
+        record = self._get()
+        if record is None:
+            return {'task_id': self.task_id, 'status': 'queued', 'stage': None, 'progress': 0.0,
+                    'error': None, 'result': None, 'info': {}}
+        return {key: record[key] for key in (
+            'task_id', 'status', 'stage', 'progress', 'error', 'result', 'created_at', 'started_at',
+            'finished_at', 'info', 'worker_id', 'attempts')}
+
+
+JOB_STORES = {
+    'sqlite': SQLiteJobStore,
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_job_store():
+    """获取进程级共享的任务库；JOB_STORE['backend'] 为 'local' 时返回 None（使用进程内 JobQueue）"""
+    global _store
+    backend = JOB_STORE['backend']
+    if backend == 'local':
+        return None
+    if backend not in JOB_STORES:
+        raise ValueError(f"不支持的任务库: {backend}，支持: local, {', '.join(JOB_STORES)}")
+    with _store_lock:
+        if _store is None:
+            _store = JOB_STORES[backend]()
+        return _store
@@ -1,15 +1,53 @@
-def lip_sync(image_path, audio_path, output_path, model_path):
-    import subprocess
-    import os
+import os
+import subprocess
+
+from app.artifacts import AudioArtifact, ImageArtifact, audio_file, image_file
+from app.config import WAV2LIP_DIR, WAV2LIP_ENGINE
+from app.cpu_slots import slot_env
+from app.wav2lip_engine import get_wav2lip_engine
+
+STILL_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def lip_sync(image_path, audio_path, output_path, model_path, fps=25, use_engine=None, sink_options=None):
+    """
+    Wav2Lip 口型同步
+
+    静态图片默认使用进程内常驻的 Wav2LipEngine（人脸只检测一次、大批量推理）；
+    引擎不可用或输入为视频时回退到官方 inference.py 子进程。
+
+    Args:
+        image_path (str or ImageArtifact): 输入图片或视频
+        audio_path (str or AudioArtifact): 输入音频，子进程方式下才写出文件
+        fps (int, optional): 静态图片生成视频的帧率
+        use_engine (bool, optional): 是否使用常驻引擎，默认取 WAV2LIP_ENGINE['mode']
+        sink_options (dict, optional): 常驻引擎的编码参数（覆盖 FRAME_SINK），子进程方式忽略
+
+    Returns:
+        dict or None: 常驻引擎的渲染统计，子进程方式为 None
+    """
     assert os.path.exists(model_path), f"模型权重未找到: {model_path}"
-    assert os.path.exists(image_path), f"图片未找到: {image_path}"
-    assert os.path.exists(audio_path), f"音频未找到: {audio_path}"
+    assert isinstance(image_path, ImageArtifact) or os.path.exists(image_path), f"图片未找到: {image_path}"
+    assert isinstance(audio_path, AudioArtifact) or os.path.exists(audio_path), f"音频未找到: {audio_path}"
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    use_engine = use_engine if use_engine is not None else WAV2LIP_ENGINE['mode'] == 'engine'
+    still_image = isinstance(image_path, ImageArtifact) or image_path.lower().endswith(STILL_IMAGE_EXTENSIONS)
+    if use_engine and still_image:
+        engine = get_wav2lip_engine(model_path)
+        try:
+            engine.load()
+        except Exception as e:
+            print(f"[Wav2Lip] 常驻引擎不可用，回退到子进程方式: {e}")
+        else:
+            return engine.render(image_path, audio_path, output_path, fps=fps, sink_options=sink_options)
+
     cmd = [
-        'python', 'scripts/Wav2Lip/inference.py',
+        'python', os.path.join(WAV2LIP_DIR, 'inference.py'),
         '--checkpoint_path', model_path,
-        '--face', image_path,
-        '--audio', audio_path,
-        '--outfile', output_path
+        '--face', image_file(image_path),
+        '--audio', audio_file(audio_path),
+        '--outfile', output_path,
+        '--fps', str(fps)
     ]
-    subprocess.run(cmd, check=True)
+    subprocess.run(cmd, check=True, env=slot_env())
@@ -0,0 +1,176 @@
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# 耗时直方图的分桶（秒），覆盖从毫秒级的缓存命中到数分钟的长视频渲染
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join(f'{k}="{str(v)}"' for k, v in sorted(labels.items()))
+    return '{' + inner + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """带标签的累积直方图，按 Prometheus 文本格式输出 _bucket / _sum / _count"""
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}  # 标签元组 -> [各桶计数, 总和, 次数]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                labels = dict(key)
+                for bound, n in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {n}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class CallbackMetric:
+    """
+    采集时才读取的 gauge / counter，用于队列深度、缓存命中数等已由各模块统计的数值
+
+    Args:
+        name (str): 指标名
+        help_text (str): 说明
+        metric_type (str): 'gauge' 或 'counter'
+        fn (callable): 返回 [(标签字典, 数值), ...]
+    """
+
+    def __init__(self, name, help_text, metric_type, fn):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.fn = fn
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        try:
+            samples = self.fn()
+        except Exception as e:
+            print(f"[METRICS] 采集 {self.name} 失败: {e}")
+            return []
+        for labels, value in samples:
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """注册指标；同名指标只保留第一次注册的实例并返回它"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        """Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+SPAN_SECONDS = REGISTRY.register(Histogram(
+    'avatar_span_seconds', '各阶段及其子步骤（模型加载、推理、子进程、ffmpeg）的耗时'))
+
+
+def peak_rss_bytes():
+    """本进程与已回收子进程中最大的峰值常驻内存（字节）"""
+    scale = 1 if sys.platform == 'darwin' else 1024  # Linux 下 ru_maxrss 单位为 KB
+    return {
+        'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+        'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale,
+    }
+
+
+_local = threading.local()
+
+
+@contextmanager
+def span(name, trace=None):
+    """
+    记录一个耗时区间：写入 avatar_span_seconds 直方图，并追加到当前请求的 trace
+
+    trace 为列表（如 Job.spans）时，它在区间内成为当前线程的 trace，内部嵌套的 span
+    （例如 musetalk_sync 中的子进程）会记录到同一个请求上。峰值内存为区间结束时的进程级高水位。
+    """
+    stack = getattr(_local, 'traces', None)
+    if stack is None:
+        stack = _local.traces = []
+    if trace is not None:
+        stack.append(trace)
+    current = stack[-1] if stack else None
+    depth = getattr(_local, 'depth', 0)
+    _local.depth = depth + 1
+    start_time = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        wall_time = time.perf_counter() - start
+        _local.depth = depth
+        SPAN_SECONDS.observe(wall_time, span=name)
+        if current is not None:
+            rss = peak_rss_bytes()
+            current.append({
+                'name': name,
+                'depth': depth,
+                'start': start_time,
+                'wall_time': wall_time,
+                'peak_rss_bytes': rss['self'],
+                'children_peak_rss_bytes': rss['children'],
+                'error': error,
+            })
+        if trace is not None:
+            stack.pop()
+
+
+def register_callback(name, help_text, metric_type, fn):
+    return REGISTRY.register(CallbackMetric(name, help_text, metric_type, fn))
+
+
+register_callback('avatar_peak_rss_bytes', '本进程（self）与已回收子进程中最大（children）的峰值常驻内存', 'gauge',
+                  lambda: [({'process': k}, v) for k, v in peak_rss_bytes().items()])
+
+
+def render_metrics():
+    return REGISTRY.render()
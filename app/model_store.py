@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import threading
+
+from app.config import MODEL_STORE
+
+
+def store_key(name, tensors, source=None):
+    """
+    存储文件名：模型名 + 参数结构（名称、形状、类型）与源权重文件大小 / 修改时间的摘要
+
+    更换权重文件或改变精度后自动生成新的存储文件。
+
+    Args:
+        name (str): 模型名
+        tensors (list): [(参数名, 形状, 类型)]；为 None 时不参与摘要（加载前还不知道参数结构）
+        source (str, optional): 源权重文件或目录
+    """
+    payload = {}
+    if tensors is not None:
+        payload['tensors'] = [[n, list(shape), str(dtype)] for n, shape, dtype in tensors]
+    if source is not None and os.path.exists(source):
+        stat = os.stat(source)
+        payload['source'] = [os.path.abspath(source), stat.st_size, stat.st_mtime_ns]
+    digest = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+    return f"{name}_{digest[:12]}"
+
+
+def _modules(obj):
+    """
+    对象中需要共享参数的模块：本身是 nn.Module 时为 {'': obj}，
+    否则为字典项或属性中的模块（如 MuseTalk 的 VAE / UNet 包装类、Bark 的 {'model', 'tokenizer'}）
+    """
+    import torch
+    if isinstance(obj, torch.nn.Module):
+        return {'': obj}
+    items = obj.items() if isinstance(obj, dict) else vars(obj).items()
+    return {key: value for key, value in items if isinstance(value, torch.nn.Module)}
+
+
+def _state(obj):
+    """各模块的参数合并为一个字典，参数名加上所在的属性名前缀"""
+    return {(f"{key}." if key else '') + n: t
+            for key, module in _modules(obj).items() for n, t in module.state_dict().items()}
+
+
+def _to_meta(module):
+    """
+    参数与持久 buffer 换成 meta 张量（只保留形状与类型）；非持久 buffer 不在 state_dict 中，
+    保留原值随骨架一起保存
+    """
+    import torch
+    for submodule in module.modules():
+        for n, param in submodule._parameters.items():
+            if param is not None:
+                submodule._parameters[n] = torch.nn.Parameter(param.to('meta'), requires_grad=param.requires_grad)
+        for n, buffer in submodule._buffers.items():
+            if buffer is not None and n not in submodule._non_persistent_buffers_set:
+                submodule._buffers[n] = buffer.to('meta')
+
+
+def _assign(obj, state):
+    """把 _state() 格式的参数（内存映射）直接赋给各模块，不做拷贝"""
+    for key, module in _modules(obj).items():
+        prefix = f"{key}." if key else ''
+        module.load_state_dict({n[len(prefix):]: t for n, t in state.items() if n.startswith(prefix)},
+                               assign=True)
+
+
+class ModelStore:
+    """
+    进程间共享模型权重的只读存储
+
+    第一个进程照常加载模型后调用 share()：参数写入存储目录（PyTorch zipfile 格式，可内存映射），
+    同时保存一份不含权重的模型骨架（模块移到 meta 设备后序列化），随后以 mmap 方式读回参数并替换
+    模块中的参数（load_state_dict(assign=True)）。之后的工作进程先调用 load()：存储中已有该模型时
+    反序列化骨架并直接赋入映射的参数，不再在进程内完整加载一遍权重，峰值内存也不会涨到一份完整模型。
+    多个工作进程映射同一个文件，权重只在页缓存中保留一份，每个进程的独占内存（USS）只剩激活值和各自的状态。
+
+    只对 CPU 上的模块生效（GPU 显存无法通过文件映射共享）；int8 后端的量化模块是新建的，
+    不在共享范围内。映射为写时复制，推理中原地修改参数只影响本进程。骨架以 pickle 保存，
+    存储目录只应由本服务写入。
+
+    Args:
+        store_dir (str, optional): 存储目录
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = os.path.abspath(store_dir or MODEL_STORE['dir'])
+        self.shared = {}
+        self._lock = threading.Lock()
+
+    def path(self, name, module, source=None):
+        tensors = [(n, t.shape, t.dtype) for n, t in _state(module).items()]
+        return os.path.join(self.store_dir, store_key(name, tensors, source) + '.pt')
+
+    def skeleton_path(self, name, source=None):
+        """模型骨架文件：加载前就要能找到，只按模型名与源权重文件计算"""
+        return os.path.join(self.store_dir, store_key(name, None, source) + '.module.pt')
+
+    def convert(self, name, module, source=None):
+        """把模块参数写入存储（已存在时跳过），返回存储文件路径"""
+        import torch
+        path = self.path(name, module, source)
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(self.store_dir, exist_ok=True)
+                print(f"[STORE] 写入共享权重: {path}")
+                # 多个工作进程可能同时首次转换，各写各的临时文件再原子替换
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                torch.save(_state(module), tmp_path)
+                os.replace(tmp_path, path)
+        return path
+
+    def _save_skeleton(self, name, module, source):
+        """把参数换成 meta 张量（丢弃数据）后序列化模块，调用方随后重新赋入映射的参数"""
+        import torch
+        path = self.skeleton_path(name, source)
+        with self._lock:
+            if os.path.exists(path):
+                return
+            for submodule in _modules(module).values():
+                _to_meta(submodule)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            torch.save(module, tmp_path)
+            os.replace(tmp_path, path)
+
+    def _map(self, name, module, path):
+        import torch
+        mapped = torch.load(path, mmap=True, map_location='cpu', weights_only=True)
+        _assign(module, mapped)
+        size = os.path.getsize(path)
+        with self._lock:
+            self.shared[name] = {'path': path, 'bytes': size}
+        print(f"[STORE] {name} 已映射 {size / 1e6:.0f}MB: {path}")
+        return module
+
+    def load(self, name, source=None):
+        """
+        存储中已有该模型时，由骨架和映射的参数直接构造并返回，不在进程内读取一份完整权重；
+        没有时返回 None，调用方照常加载后调用 share()
+
+        Args:
+            name (str): 模型名，与 share() 时一致
+            source (str, optional): 源权重文件或目录，用于判断存储是否过期
+        """
+        import torch
+        skeleton_path = self.skeleton_path(name, source)
+        if not os.path.exists(skeleton_path):
+            return None
+        module = torch.load(skeleton_path, map_location='cpu', weights_only=False)
+        path = self.path(name, module, source)
+        if not os.path.exists(path):
+            return None
+        return self._map(name, module, path)
+
+    def share(self, name, module, source=None):
+        """
+        把模块参数替换为存储文件的内存映射，返回模块；模块不在 CPU 上时原样返回
+
+        Args:
+            name (str): 模型名（如 musetalk_v15_fp16_unet）
+            module: 已加载的 nn.Module，或以属性 / 字典项持有 nn.Module 的对象
+            source (str, optional): 源权重文件或目录，用于判断存储是否过期
+        """
+        state = _state(module)
+        if not state or any(t.device.type != 'cpu' for t in state.values()):
+            return module
+        path = self.convert(name, module, source)
+        del state
+        try:
+            self._save_skeleton(name, module, source)
+        finally:
+            # 骨架写入失败时同样换回映射的参数，模块保持可用
+            self._map(name, module, path)
+        return module
+
+    def stats(self):
+        with self._lock:
+            return {
+                'store_dir': self.store_dir,
+                'models': dict(self.shared),
+                'shared_bytes': sum(entry['bytes'] for entry in self.shared.values()),
+            }
+
+
+def process_memory(pid='self'):
+    """
+    进程内存（字节），读取 /proc/<pid>/smaps_rollup：
+
+    - rss: 常驻内存，共享页在每个进程中都计入
+    - pss: 共享页按映射进程数均摊
+    - uss: 独占内存（Private_Clean + Private_Dirty），即多开一个进程实际增加的内存
+    - shared: 与其它进程共享的页（Shared_Clean + Shared_Dirty）
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+        'shared': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+    }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_model_store():
+    """获取进程级共享的模型存储；MODEL_STORE['enabled'] 为 False 时返回 None"""
+    global _store
+    if not MODEL_STORE['enabled']:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ModelStore()
+        return _store
@@ -0,0 +1,221 @@
+import hashlib
+import os
+
+import numpy as np
+
+from app.config import MUSETALK_BACKEND
+from app.cpu_slots import slot_threads, stage_threads
+
+
+def frame_psnr(reference, frame):
+    """两帧 uint8 图像的峰值信噪比（dB），完全相同时为 inf"""
+    diff = reference.astype(np.float64) - frame.astype(np.float64)
+    mse = float(np.mean(diff * diff))
+    if mse == 0:
+        return float('inf')
+    return 10 * np.log10(255.0 ** 2 / mse)
+
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    设置 PyTorch 的算子内 / 算子间线程数，返回实际使用的算子内线程数
+
+    intra_op_threads 为 0 时取当前进程可用的 CPU 数；启用 CPU 槽位时改取口型槽位的核心数
+    （渲染线程各自绑定到这样大小的槽位，按全部 CPU 开线程会互相争抢）。算子间线程数只能在首次并行计算前设置，
+    之后再设置会被 PyTorch 拒绝，此时保持原值。
+    """
+    import torch
+    intra = intra_op_threads if intra_op_threads is not None else MUSETALK_BACKEND['intra_op_threads']
+    inter = inter_op_threads if inter_op_threads is not None else MUSETALK_BACKEND['inter_op_threads']
+    if not intra:
+        intra = slot_threads() or stage_threads('lipsync')
+    if not intra:
+        intra = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    torch.set_num_threads(intra)
+    try:
+        torch.set_num_interop_threads(inter)
+    except RuntimeError:
+        pass
+    return intra
+
+
+def _decoded_to_bgr(image):
+    """VAE 解码输出（N, 3, H, W，取值 -1~1，RGB）转为 uint8 BGR 帧，与 MuseTalk 的 decode_latents 一致"""
+    image = np.clip(image / 2 + 0.5, 0, 1).transpose(0, 2, 3, 1)
+    image = (image * 255).round().astype(np.uint8)
+    return image[..., ::-1]
+
+
+class TorchBackend:
+    """
+    原始 PyTorch 推理（GPU 上可配合 use_float16），UNet 与 VAE 解码直接调用 MuseTalk 的模型
+
+    Args:
+        models (dict): MuseTalkEngine 加载的模型字典
+    """
+
+    name = 'torch'
+
+    def __init__(self, models, **options):
+        self.torch = models['torch']
+        self.unet = models['unet'].model
+        self.vae = models['vae']
+        self.timesteps = models['timesteps']
+
+    def predict(self, latent_batch, audio_feature_batch):
+        """UNet 单步推理，返回预测的隐变量"""
+        latent_batch = latent_batch.to(dtype=self.unet.dtype)
+        return self.unet(latent_batch, self.timesteps, encoder_hidden_states=audio_feature_batch).sample
+
+    def decode(self, latents):
+        """VAE 解码为 uint8 BGR 口型区域图像"""
+        return self.vae.decode_latents(latents)
+
+
+class Int8Backend(TorchBackend):
+    """
+    PyTorch 动态 int8 量化（仅 CPU）
+
+    UNet 和 VAE 解码器中的 Linear 层权重量化为 int8，激活在运行时按批量化；
+    卷积层不支持动态量化，仍为 fp32，其加速主要来自 intra_op_threads。
+    VAE 编码器（形象预处理）不量化，形象缓存与 torch 后端通用。
+
+    Args:
+        models (dict): MuseTalkEngine 加载的模型字典
+        inplace (bool): 是否直接替换模型中的模块；为 False 时量化副本，原模型可作为 fp32 基准
+    """
+
+    name = 'int8'
+
+    def __init__(self, models, inplace=True, **options):
+        super().__init__(models)
+        torch = self.torch
+        configure_threads(options.get('intra_op_threads'), options.get('inter_op_threads'))
+        quantize = torch.ao.quantization.quantize_dynamic
+        self.unet = quantize(self.unet.float(), {torch.nn.Linear}, dtype=torch.qint8, inplace=inplace)
+        vae = self.vae.vae
+        self.post_quant_conv = vae.post_quant_conv.float()
+        self.decoder = quantize(vae.decoder.float(), {torch.nn.Linear}, dtype=torch.qint8, inplace=inplace)
+        self.scaling_factor = self.vae.scaling_factor
+
+    def predict(self, latent_batch, audio_feature_batch):
+        return self.unet(latent_batch.float(), self.timesteps, encoder_hidden_states=audio_feature_batch.float()).sample
+
+    def decode(self, latents):
+        latents = latents.float() / self.scaling_factor
+        image = self.decoder(self.post_quant_conv(latents))
+        return _decoded_to_bgr(image.detach().cpu().numpy())
+
+
+class OnnxBackend:
+    """
+    导出为 ONNX 并以 ONNX Runtime 推理（仅 CPU），默认对 MatMul 做动态 int8 量化
+
+    首次使用时把 UNet 和 VAE 解码器导出到 onnx_dir，文件名包含权重文件的大小和修改时间，
+    更换权重后自动重新导出。位置编码和 Whisper 仍在 PyTorch 中执行。
+
+    Args:
+        models (dict): MuseTalkEngine 加载的模型字典
+        model_key (str): 区分版本与权重的导出目录名
+        onnx_dir (str, optional): 导出目录
+        quantize (bool, optional): 是否动态 int8 量化
+    """
+
+    name = 'onnx'
+
+    def __init__(self, models, model_key='musetalk', onnx_dir=None, quantize=None, **options):
+        import onnxruntime as ort
+        self.torch = models['torch']
+        self.scaling_factor = models['vae'].scaling_factor
+        quantize = quantize if quantize is not None else MUSETALK_BACKEND['quantize']
+        export_dir = os.path.join(onnx_dir or MUSETALK_BACKEND['onnx_dir'], model_key)
+        os.makedirs(export_dir, exist_ok=True)
+
+        unet_path = self._export_unet(models, os.path.join(export_dir, 'unet.onnx'))
+        decoder_path = self._export_decoder(models, os.path.join(export_dir, 'vae_decoder.onnx'))
+        if quantize:
+            unet_path = self._quantize(unet_path)
+            decoder_path = self._quantize(decoder_path)
+
+        intra = configure_threads(options.get('intra_op_threads'), options.get('inter_op_threads'))
+        session_options = ort.SessionOptions()
+        session_options.intra_op_num_threads = intra
+        session_options.inter_op_num_threads = options.get('inter_op_threads') or MUSETALK_BACKEND['inter_op_threads']
+        session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = ['CPUExecutionProvider']
+        self.unet = ort.InferenceSession(unet_path, session_options, providers=providers)
+        self.decoder = ort.InferenceSession(decoder_path, session_options, providers=providers)
+        print(f"[MuseTalk] ONNX Runtime 后端: {unet_path}, {decoder_path}，线程数 {intra}")
+
+    def _export(self, module, args, path, input_names):
+        torch = self.torch
+        if os.path.exists(path):
+            return path
+        print(f"[MuseTalk] 导出 ONNX: {path}")
+        tmp_path = f"{path}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(module, args, tmp_path, input_names=input_names, output_names=['output'],
+                              dynamic_axes={name: {0: 'batch'} for name in input_names + ['output']},
+                              opset_version=17)
+        os.replace(tmp_path, path)
+        return path
+
+    def _export_unet(self, models, path):
+        torch = self.torch
+        unet, timesteps = models['unet'].model.float(), models['timesteps']
+
+        class UNetStep(torch.nn.Module):
+            def forward(self, latents, audio_feature):
+                return unet(latents, timesteps, encoder_hidden_states=audio_feature).sample
+
+        args = (torch.zeros((1, 8, 32, 32)), torch.zeros((1, 50, 384)))
+        return self._export(UNetStep().eval(), args, path, ['latents', 'audio_feature'])
+
+    def _export_decoder(self, models, path):
+        torch = self.torch
+        vae, scaling_factor = models['vae'].vae.float(), self.scaling_factor
+
+        class Decoder(torch.nn.Module):
+            def forward(self, latents):
+                return vae.decode(latents / scaling_factor).sample
+
+        return self._export(Decoder().eval(), (torch.zeros((1, 4, 32, 32)),), path, ['latents'])
+
+    def _quantize(self, path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = path.replace('.onnx', '.int8.onnx')
+        if not os.path.exists(int8_path):
+            print(f"[MuseTalk] 动态 int8 量化: {int8_path}")
+            quantize_dynamic(path, int8_path, weight_type=QuantType.QInt8,
+                             op_types_to_quantize=MUSETALK_BACKEND['quantize_ops'])
+        return int8_path
+
+    def predict(self, latent_batch, audio_feature_batch):
+        return self.unet.run(None, {
+            'latents': latent_batch.detach().float().cpu().numpy(),
+            'audio_feature': audio_feature_batch.detach().float().cpu().numpy(),
+        })[0]
+
+    def decode(self, latents):
+        return _decoded_to_bgr(self.decoder.run(None, {'latents': latents})[0])
+
+
+MUSETALK_BACKENDS = {
+    'torch': TorchBackend,
+    'int8': Int8Backend,
+    'onnx': OnnxBackend,
+}
+
+
+def model_key(version, weight_path):
+    """ONNX 导出目录名：版本 + 权重文件的大小和修改时间"""
+    stat = os.stat(weight_path)
+    digest = hashlib.sha256(f"{os.path.abspath(weight_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()
+    return f"{version}_{digest[:12]}"
+
+
+def make_backend(name, models, **options):
+    """按名称创建推理后端，见 MUSETALK_BACKEND['backend']"""
+    if name not in MUSETALK_BACKENDS:
+        raise ValueError(f"不支持的推理后端: {name}，支持: {list(MUSETALK_BACKENDS)}")
+    return MUSETALK_BACKENDS[name](models, **options)
@@ -0,0 +1,143 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from app.config import CPU_SLOTS, MUSETALK_BATCH, MUSETALK_DIR, MUSETALK_ENGINE
+from app.cpu_slots import pin_worker
+from app.musetalk_sync import musetalk_sync_batch
+
+_STOP = object()
+
+
+class MuseTalkBatcher:
+    """
+    MuseTalk 自动凑批器
+
+    各任务提交后返回 Future；后台线程把版本、精度、帧率、推理后端、引擎方式和编码参数都相同的任务合并，
+    达到 max_batch_size 或最早的任务已等待 max_wait 秒时，调用一次 musetalk_sync_batch。
+
+    Args:
+        max_batch_size (int, optional): 单批最多任务数
+        max_wait (float, optional): 凑批最长等待时间（秒）
+        musetalk_dir (str): MuseTalk 目录路径
+        use_engine (bool, optional): 是否使用常驻引擎的默认值，submit 可按任务覆盖
+    """
+
+    def __init__(self, max_batch_size=None, max_wait=None, musetalk_dir=MUSETALK_DIR, use_engine=None):
+        self.max_batch_size = max_batch_size or MUSETALK_BATCH['max_batch_size']
+        self.max_wait = max_wait if max_wait is not None else MUSETALK_BATCH['max_wait']
+        self.musetalk_dir = musetalk_dir
+        self.use_engine = use_engine
+        self.batch_count = 0
+        self.task_count = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        # 推理在这些线程中进行：启用 CPU 槽位时各自绑定一个口型槽位（子进程的线程数随之受限）
+        self._executor = ThreadPoolExecutor(
+            max_workers=MUSETALK_ENGINE['subprocess_concurrency'], thread_name_prefix="musetalk-batch",
+            initializer=pin_worker if CPU_SLOTS['enabled'] else None, initargs=('lipsync',))
+
+    def submit(self, image_path, audio_path, output_path, version, bbox_shift=None,
+               use_float16=None, fps=None, backend=None, sink_options=None, use_engine=None):
+        """
+        提交一个口型同步任务，返回 Future，完成时结果为该任务的渲染统计（同 musetalk_sync_batch，
+        子进程方式下为 None）
+
+        backend、sink_options（质量档位的编码参数）与 use_engine 同 musetalk_sync_batch，
+        只与设置相同的任务合并。
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._collect, name="musetalk-batcher", daemon=True)
+                self._thread.start()
+        future = Future()
+        task = {
+            'image_path': image_path,
+            'audio_path': audio_path,
+            'output_path': output_path,
+            'bbox_shift': bbox_shift,
+        }
+        use_engine = use_engine if use_engine is not None else self.use_engine
+        sink_key = tuple(sorted(sink_options.items())) if sink_options else None
+        group = (version, use_float16, fps, backend, use_engine, sink_key)
+        self._queue.put((group, task, future, time.monotonic()))
+        return future
+
+    def _collect(self):
+        pending = {}  # group -> [(task, future, arrived_at)]
+        while True:
+            now = time.monotonic()
+            deadlines = [items[0][2] + self.max_wait for items in pending.values()]
+            timeout = max(0.0, min(deadlines) - now) if deadlines else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                for group, items in pending.items():
+                    self._flush(group, items)
+                break
+            if item is not None:
+                group, task, future, arrived_at = item
+                pending.setdefault(group, []).append((task, future, arrived_at))
+                if len(pending[group]) >= self.max_batch_size:
+                    self._flush(group, pending.pop(group))
+
+            now = time.monotonic()
+            for group in [g for g, items in pending.items() if items[0][2] + self.max_wait <= now]:
+                self._flush(group, pending.pop(group))
+
+    def _flush(self, group, items):
+        with self._lock:
+            self.batch_count += 1
+            self.task_count += len(items)
+        self._executor.submit(self._run, group, items)
+
+    def _run(self, group, items):
+        version, use_float16, fps, backend, use_engine, sink_key = group
+        print(f"[MuseTalk] 合并 {len(items)} 个任务为一次推理调用")
+        try:
+            results = musetalk_sync_batch([task for task, _, _ in items], musetalk_dir=self.musetalk_dir,
+                                          version=version, use_float16=use_float16, fps=fps,
+                                          use_engine=use_engine, backend=backend,
+                                          sink_options=dict(sink_key) if sink_key else None)
+        except Exception as e:
+            for _, future, _ in items:
+                future.set_exception(e)
+        else:
+            for (_, future, _), result in zip(items, results):
+                future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batches': self.batch_count,
+                'tasks': self.task_count,
+                'avg_batch_size': self.task_count / self.batch_count if self.batch_count else None,
+                'max_batch_size': self.max_batch_size,
+                'max_wait': self.max_wait,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+        self._executor.shutdown(wait=True)
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_musetalk_batcher():
+    """获取进程级共享的凑批器"""
+    global _batcher
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = MuseTalkBatcher()
+        return _batcher
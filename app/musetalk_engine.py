@@ -0,0 +1,536 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from app.avatar_cache import get_avatar_cache
+from app.frame_sink import make_frame_sink
+from app.metrics import span
+from app.artifacts import audio_artifact, audio_file, image_artifact, image_file
+from app.audio_utils import silence_weights, voiced_frames
+from app.musetalk_backends import make_backend, model_key
+from app.model_store import get_model_store
+from app.config import (MUSETALK_BACKEND, MUSETALK_CONFIG, MUSETALK_DIR, MUSETALK_ENGINE, MUSETALK_INFERENCE,
+                        MUSETALK_VERSION, SILENCE_SKIP)
+
+# MuseTalk 在导入和建模时使用写死的相对路径（dwpose 配置与权重、人脸解析权重、./models/sd-vae），
+# 加载期间只能切换到其目录。工作目录对所有线程生效，而 output/、cache/ 和任务文件都是相对路径，
+# 因此只在启动阶段、处理请求和任务的线程开始工作之前加载（见 close_engine_loading）；
+# 该锁保证同一时刻只有一个引擎在加载
+_load_dir_lock = threading.Lock()
+_loading_closed = threading.Event()
+
+
+def close_engine_loading():
+    """
+    处理请求 / 任务的线程启动前调用：此后 load() 不再切换工作目录加载模型，
+    未在启动时加载的引擎视为不可用（调用方回退到子进程方式）
+    """
+    _loading_closed.set()
+
+
+@contextmanager
+def _in_musetalk_dir(musetalk_dir):
+    with _load_dir_lock:
+        current_dir = os.getcwd()
+        os.chdir(musetalk_dir)
+        if musetalk_dir not in sys.path:
+            sys.path.insert(0, musetalk_dir)
+        try:
+            yield
+        finally:
+            os.chdir(current_dir)
+
+
+class MuseTalkEngine:
+    """
+    常驻内存的 MuseTalk 推理引擎
+
+    按 MUSETALK_CONFIG 中的版本一次性加载 UNet、VAE、Whisper 音频编码器、
+    位置编码和人脸解析模型，之后每次 render 只做人脸预处理、音频特征提取和逐帧推理。
+    推理流程与 MuseTalk 官方 scripts/inference.py 保持一致。
+
+    Args:
+        version (str): 版本, v1.0 或 v1.5
+        musetalk_dir (str): MuseTalk 目录路径
+        use_float16 (bool, optional): 是否使用半精度推理
+        device (str, optional): 推理设备，默认自动选择
+        batch_size (int, optional): UNet 推理批大小
+        avatar_cache (AvatarCache, optional): 形象预处理缓存，默认使用进程级共享缓存
+        backend (str, optional): UNet / VAE 解码的推理后端（见 MUSETALK_BACKEND），
+            int8 / onnx 只在 CPU 上以 fp32 输入运行，此时忽略 use_float16 和 device
+    """
+
+    def __init__(self, version=MUSETALK_VERSION, musetalk_dir=MUSETALK_DIR, use_float16=None,
+                 device=None, batch_size=None, avatar_cache=None, backend=None):
+        if version not in MUSETALK_CONFIG:
+            raise ValueError(
+                f"不支持的 MuseTalk 版本: {version}，支持的版本: {list(MUSETALK_CONFIG.keys())}")
+        self.version = version
+        self.version_config = MUSETALK_CONFIG[version]
+        self.musetalk_dir = os.path.abspath(musetalk_dir)
+        self.backend = backend or MUSETALK_BACKEND['backend']
+        use_float16 = use_float16 if use_float16 is not None else MUSETALK_INFERENCE['use_float16']
+        self.use_float16 = use_float16 and self.backend == 'torch'
+        self.device = device or MUSETALK_ENGINE['device']
+        if self.backend != 'torch':
+            self.device = 'cpu'
+        self.batch_size = batch_size or MUSETALK_ENGINE['batch_size']
+        self.avatar_cache = avatar_cache
+        # 模型加载期间会切换到 MuseTalk 目录，导出目录需预先转为绝对路径
+        self.onnx_dir = os.path.abspath(MUSETALK_BACKEND['onnx_dir'])
+        self.model_store = get_model_store()
+
+        self.load_time = None
+        self.load_error = None
+        self.render_count = 0
+        self.frame_count = 0
+        self.skipped_frame_count = 0
+        self.prepare_time = 0.0
+        self.infer_time = 0.0
+        self.write_time = 0.0
+
+        self._models = None
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._models is not None
+
+    @property
+    def is_v15(self):
+        return self.version_config['version_arg'] == 'v15'
+
+    def _load_models(self):
+        """加载全部模型，返回模型字典"""
+        import torch
+        from transformers import WhisperModel
+        from musetalk.utils.utils import load_all_model
+        from musetalk.utils.audio_processor import AudioProcessor
+        from musetalk.utils.face_parsing import FaceParsing
+
+        device = self.device
+        if device == 'auto':
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        device = torch.device(device)
+
+        # 本项目给出的路径都解析为绝对路径，不依赖加载期间的工作目录
+        model_dir = os.path.join(self.musetalk_dir, self.version_config['model_dir'])
+        whisper_dir = os.path.join(self.musetalk_dir, MUSETALK_ENGINE['whisper_dir'])
+        sources = {
+            'unet': os.path.join(model_dir, self.version_config['model_file']),
+            'vae': os.path.join(self.musetalk_dir, 'models', MUSETALK_ENGINE['vae_type']),
+            'whisper': whisper_dir,
+        }
+        # CPU 上 UNet / VAE / Whisper 的参数换成共享存储的内存映射，多个工作进程共用一份权重；
+        # 存储中已有时直接从映射构造，不再完整加载一遍
+        store = self.model_store if device.type == 'cpu' else None
+        name = f"musetalk_{self.version}_{'fp16' if self.use_float16 else 'fp32'}"
+        shared = {}
+        if store is not None:
+            for part, source in sources.items():
+                shared[part] = store.load(f"{name}_{part}", source)
+                if shared[part] is None:
+                    shared = {}
+                    break
+
+        if shared:
+            from musetalk.models.unet import PositionalEncoding
+            vae, unet, whisper = shared['vae'], shared['unet'], shared['whisper']
+            pe = PositionalEncoding(d_model=384)
+            if self.use_float16:
+                pe = pe.half()
+            pe = pe.to(device)
+        else:
+            vae, unet, pe = load_all_model(
+                unet_model_path=sources['unet'],
+                vae_type=MUSETALK_ENGINE['vae_type'],
+                unet_config=os.path.join(model_dir, self.version_config['config_file']),
+                device=device)
+            if self.use_float16:
+                pe = pe.half()
+                vae.vae = vae.vae.half()
+                unet.model = unet.model.half()
+            pe = pe.to(device)
+            vae.vae = vae.vae.to(device)
+            unet.model = unet.model.to(device)
+            whisper = WhisperModel.from_pretrained(whisper_dir)
+            whisper = whisper.to(device=device, dtype=unet.model.dtype).eval()
+            whisper.requires_grad_(False)
+            if store is not None:
+                for part, model in (('unet', unet), ('vae', vae), ('whisper', whisper)):
+                    store.share(f"{name}_{part}", model, sources[part])
+        weight_dtype = unet.model.dtype
+        audio_processor = AudioProcessor(feature_extractor_path=whisper_dir)
+
+        if self.is_v15:
+            fp = FaceParsing(left_cheek_width=MUSETALK_ENGINE['left_cheek_width'],
+                             right_cheek_width=MUSETALK_ENGINE['right_cheek_width'])
+        else:
+            fp = FaceParsing()
+
+        # 人脸检测 / 关键点模型在模块导入时加载
+        from musetalk.utils import preprocessing
+        from musetalk.utils import utils
+        from musetalk.utils import blending
+
+        models = {
+            'torch': torch,
+            'device': device,
+            'vae': vae,
+            'unet': unet,
+            'pe': pe,
+            'whisper': whisper,
+            'audio_processor': audio_processor,
+            'fp': fp,
+            'weight_dtype': weight_dtype,
+            'timesteps': torch.tensor([0], device=device),
+            'preprocessing': preprocessing,
+            'utils': utils,
+            'blending': blending,
+        }
+        models['backend'] = make_backend(
+            self.backend, models, onnx_dir=self.onnx_dir,
+            model_key=model_key(self.version, os.path.join(model_dir, self.version_config['model_file'])))
+        return models
+
+    def load(self):
+        """加载模型（只执行一次），返回加载耗时（秒）；加载失败时记录并重新抛出异常"""
+        with self._load_lock:
+            if self.load_error is not None:
+                raise self.load_error
+            if not self.loaded:
+                if not os.path.exists(self.musetalk_dir):
+                    self.load_error = FileNotFoundError(f"MuseTalk 目录未找到: {self.musetalk_dir}")
+                    raise self.load_error
+                if _loading_closed.is_set():
+                    raise RuntimeError(f"MuseTalk {self.version} 引擎未在启动时加载，运行期间不再切换工作目录加载模型")
+                print(f"[MuseTalk] 加载 {self.version} 模型...")
+                start = time.perf_counter()
+                try:
+                    with span('musetalk_load'), _in_musetalk_dir(self.musetalk_dir):
+                        self._models = self._load_models()
+                except Exception as e:
+                    self.load_error = e
+                    raise
+                self.load_time = time.perf_counter() - start
+                print(f"[MuseTalk] 模型加载完成，耗时 {self.load_time:.2f}s")
+        return self.load_time
+
+    def warmup(self):
+        """加载模型并跑一批空输入，让首个请求不再承担初始化开销"""
+        self.load()
+        m = self._models
+        torch = m['torch']
+        start = time.perf_counter()
+        with torch.no_grad():
+            latents = torch.zeros((1, 8, 32, 32), device=m['device'], dtype=m['weight_dtype'])
+            audio = torch.zeros((1, 50, 384), device=m['device'], dtype=m['weight_dtype'])
+            m['backend'].decode(m['backend'].predict(latents, m['pe'](audio)))
+        print(f"[MuseTalk] 预热完成，耗时 {time.perf_counter() - start:.2f}s")
+
+    def prepare_avatar(self, image_path, bbox_shift):
+        """人脸检测、bbox 计算与 VAE 编码，返回渲染所需的中间结果"""
+        import cv2
+        m = self._models
+        coord_list, frame_list = m['preprocessing'].get_landmark_and_bbox([image_path], bbox_shift)
+        latent_list = []
+        for bbox, frame in zip(coord_list, frame_list):
+            if bbox == m['preprocessing'].coord_placeholder:
+                continue
+            x1, y1, x2, y2 = bbox
+            if self.is_v15:
+                y2 = min(y2 + MUSETALK_ENGINE['extra_margin'], frame.shape[0])
+            crop_frame = cv2.resize(frame[y1:y2, x1:x2], (256, 256),
+                                    interpolation=cv2.INTER_LANCZOS4)
+            latent_list.append(m['vae'].get_latents_for_unet(crop_frame))
+        if not latent_list:
+            raise RuntimeError(f"未在图片中检测到人脸: {image_path}")
+        return {
+            'coord_list': coord_list,
+            'frame_list': frame_list,
+            'latent_list': latent_list,
+        }
+
+    def get_avatar(self, image, bbox_shift):
+        """
+        按图片内容哈希 + bbox_shift + 版本查询形象缓存，未命中时执行预处理并写入缓存
+
+        image 为路径或 ImageArtifact；内存中的图片只在缓存未命中、需要人脸检测时才写出文件。
+        """
+        image = image_artifact(image)
+        cache = self.avatar_cache or get_avatar_cache()
+        key = cache.make_key(image.sha256(), bbox_shift, self.version, self.use_float16)
+        return cache.get_or_create(key, lambda: self.prepare_avatar(image_file(image), bbox_shift))
+
+    def _audio_features(self, audio):
+        """
+        Whisper 输入特征，与 AudioProcessor.get_audio_feature 相同（按 30 秒分段提取），
+        但直接使用 AudioArtifact 缓存的 16kHz 数组（与 librosa.load(WAV 文件, sr=16000) 逐样本一致），
+        不再从 WAV 文件读回并重采样
+        """
+        m = self._models
+        samples = audio.samples(16000)
+        segment_length = 30 * 16000
+        features = [m['audio_processor'].feature_extractor(samples[i:i + segment_length], return_tensors="pt",
+                                                           sampling_rate=16000).input_features
+                    for i in range(0, len(samples), segment_length)]
+        return features, len(samples)
+
+    def _audio_chunks(self, audio, fps):
+        m = self._models
+        features, librosa_length = self._audio_features(audio_artifact(audio))
+        return m['audio_processor'].get_whisper_chunk(
+            features, m['device'], m['weight_dtype'], m['whisper'], librosa_length, fps=fps,
+            audio_padding_length_left=MUSETALK_ENGINE['audio_padding_length_left'],
+            audio_padding_length_right=MUSETALK_ENGINE['audio_padding_length_right'])
+
+    def _infer_frames(self, whisper_chunks, latent_list, frame_indices=None):
+        """UNet + VAE 解码，返回 frame_indices（默认全部帧）对应的口型区域图像列表"""
+        m = self._models
+        torch = m['torch']
+        latent_cycle = latent_list + latent_list[::-1]
+        if frame_indices is None:
+            frame_indices = list(range(len(whisper_chunks)))
+        if not frame_indices:
+            return []
+        # 只取需要推理的帧，隐变量按原帧号对齐
+        gen = m['utils'].datagen(whisper_chunks=whisper_chunks[frame_indices],
+                                 vae_encode_latents=[latent_cycle[i % len(latent_cycle)] for i in frame_indices],
+                                 batch_size=self.batch_size, delay_frame=0, device=m['device'])
+        res_frames = []
+        with torch.no_grad():
+            for whisper_batch, latent_batch in gen:
+                pred_latents = m['backend'].predict(latent_batch, m['pe'](whisper_batch))
+                res_frames.extend(m['backend'].decode(pred_latents))
+        return res_frames
+
+    def _silence_weights(self, audio, num_frames, fps):
+        """每帧使用闭口帧的权重（见 audio_utils.silence_weights），未启用时返回 None"""
+        if not SILENCE_SKIP['enabled']:
+            return None
+        import numpy as np
+        audio = audio_artifact(audio)
+        voiced = voiced_frames(audio.samples(), audio.sample_rate, fps, SILENCE_SKIP['threshold_db'],
+                               SILENCE_SKIP['min_silence_ms'], SILENCE_SKIP['pad_ms'])
+        # 与 Whisper 特征的帧数对齐，多出的帧按语音处理
+        voiced = np.concatenate([voiced, np.ones(max(0, num_frames - len(voiced)), dtype=bool)])[:num_frames]
+        return silence_weights(voiced, SILENCE_SKIP['transition_frames'])
+
+    def _silent_frame(self, avatar, whisper_chunks, index):
+        """
+        形象的闭口帧：用一帧静音音频特征推理一次，结果按推理后端存入形象数据，之后的请求直接复用
+
+        形象来自单张图片，所有帧共用同一个隐变量，闭口帧与帧号无关。形象缓存的键不含推理后端，
+        各后端（torch / int8 / onnx）的输出不同，闭口帧分别保存，避免与本后端推理的帧混用。
+        """
+        frames = avatar.setdefault('silent_frames', {})
+        if frames.get(self.backend) is None:
+            frames[self.backend] = self._infer_frames(whisper_chunks, avatar['latent_list'], [index])[0]
+        return frames[self.backend]
+
+    def _lip_frames(self, avatar, whisper_chunks, audio, fps):
+        """逐帧口型区域图像；静音帧不推理，使用闭口帧，边界处线性过渡。返回 (帧列表, 跳过帧数)"""
+        import numpy as np
+        num_frames = len(whisper_chunks)
+        weights = self._silence_weights(audio, num_frames, fps)
+        if weights is None or not (weights == 1).any():
+            return self._infer_frames(whisper_chunks, avatar['latent_list']), 0
+
+        infer_indices = [i for i in range(num_frames) if weights[i] < 1]
+        inferred = dict(zip(infer_indices, self._infer_frames(whisper_chunks, avatar['latent_list'], infer_indices)))
+        # 取最长静音段的中点，其音频特征窗口内不含语音
+        runs, start = [], None
+        for i in range(num_frames + 1):
+            if i < num_frames and weights[i] == 1:
+                start = i if start is None else start
+            elif start is not None:
+                runs.append((i - start, start))
+                start = None
+        length, start = max(runs)
+        silent = self._silent_frame(avatar, whisper_chunks, start + length // 2)
+        res_frames = []
+        for i in range(num_frames):
+            w = weights[i]
+            if w == 1:
+                res_frames.append(silent)
+            elif w > 0:
+                res_frames.append(((1 - w) * inferred[i].astype(np.float32)
+                                   + w * silent.astype(np.float32)).astype(np.uint8))
+            else:
+                res_frames.append(inferred[i])
+        return res_frames, num_frames - len(infer_indices)
+
+    def _blend(self, avatar, index, res_frame):
+        """把生成的口型区域贴回原图"""
+        import copy
+        import cv2
+        import numpy as np
+        m = self._models
+        coord_cycle = avatar['coord_list'] + avatar['coord_list'][::-1]
+        frame_cycle = avatar['frame_list'] + avatar['frame_list'][::-1]
+        x1, y1, x2, y2 = coord_cycle[index % len(coord_cycle)]
+        ori_frame = copy.deepcopy(frame_cycle[index % len(frame_cycle)])
+        if self.is_v15:
+            y2 = min(y2 + MUSETALK_ENGINE['extra_margin'], ori_frame.shape[0])
+        res_frame = cv2.resize(res_frame.astype(np.uint8), (x2 - x1, y2 - y1))
+        if self.is_v15:
+            return m['blending'].get_image(ori_frame, res_frame, [x1, y1, x2, y2],
+                                           mode=MUSETALK_ENGINE['parsing_mode'], fp=m['fp'])
+        return m['blending'].get_image(ori_frame, res_frame, [x1, y1, x2, y2], fp=m['fp'])
+
+    def _write_video(self, avatar, res_frames, audio, output_path, fps, sink_options=None):
+        """逐帧贴回原图并送入帧输出（默认经管道直接编码，不写中间图片）；ffmpeg 复用音轨时才写出音频文件"""
+        with make_frame_sink(output_path, fps, audio_file(audio), **(sink_options or {})) as sink:
+            for i, res_frame in enumerate(res_frames):
+                sink.write(self._blend(avatar, i, res_frame))
+
+    def render(self, image_path, audio_path, output_path, bbox_shift=None, fps=None, sink_options=None):
+        """
+        生成口型同步视频
+
+        Args:
+            image_path (str or ImageArtifact): 输入图片
+            audio_path (str or AudioArtifact): 输入音频；16kHz 重采样与静音分析共用同一份解码结果
+            output_path (str): 输出视频路径
+            bbox_shift (int, optional): 嘴部区域调整
+            fps (int, optional): 生成视频的帧率
+            sink_options (dict, optional): 编码参数，覆盖 FRAME_SINK（如预览档位的 preset / crf）
+
+        Returns:
+            dict: 本次渲染的耗时统计
+        """
+        bbox_shift = bbox_shift if bbox_shift is not None else MUSETALK_INFERENCE['bbox_shift']
+        fps = fps if fps is not None else MUSETALK_INFERENCE['fps']
+        self.load()
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+        audio = audio_artifact(audio_path)
+        start = time.perf_counter()
+        with span('musetalk_prepare'):
+            avatar = self.get_avatar(image_path, bbox_shift)
+            whisper_chunks = self._audio_chunks(audio, fps)
+        prepare_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with span('musetalk_infer'):
+            res_frames, skipped = self._lip_frames(avatar, whisper_chunks, audio, fps)
+        infer_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with span('musetalk_write'):
+            self._write_video(avatar, res_frames, audio, output_path, fps, sink_options)
+        write_time = time.perf_counter() - start
+
+        num_frames = len(res_frames)
+        with self._stats_lock:
+            self.render_count += 1
+            self.frame_count += num_frames
+            self.skipped_frame_count += skipped
+            self.prepare_time += prepare_time
+            self.infer_time += infer_time
+            self.write_time += write_time
+        per_frame = infer_time / num_frames if num_frames else 0
+        skip_ratio = skipped / num_frames if num_frames else 0.0
+        print(f"[MuseTalk] 渲染完成 {output_path}: {num_frames} 帧（静音跳过 {skip_ratio:.0%}），"
+              f"预处理 {prepare_time:.2f}s，推理 {infer_time:.2f}s（{per_frame * 1000:.1f}ms/帧），"
+              f"写出 {write_time:.2f}s")
+        return {
+            'frames': num_frames,
+            'skipped_frames': skipped,
+            'skip_ratio': skip_ratio,
+            'prepare_time': prepare_time,
+            'infer_time': infer_time,
+            'infer_time_per_frame': per_frame,
+            'write_time': write_time,
+        }
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'version': self.version,
+                'backend': self.backend,
+                'loaded': self.loaded,
+                'load_time': self.load_time,
+                'load_error': str(self.load_error) if self.load_error else None,
+                'render_count': self.render_count,
+                'frame_count': self.frame_count,
+                'skipped_frame_count': self.skipped_frame_count,
+                'skip_ratio': self.skipped_frame_count / self.frame_count if self.frame_count else None,
+                'prepare_time': self.prepare_time,
+                'infer_time': self.infer_time,
+                'infer_time_per_frame': self.infer_time / self.frame_count if self.frame_count else None,
+                'write_time': self.write_time,
+                'model_store': self.model_store.stats() if self.model_store is not None else None,
+            }
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def _engine_key(version, musetalk_dir, use_float16, backend):
+    # 非 torch 后端忽略 use_float16，与 MuseTalkEngine 的处理一致
+    return (version, os.path.abspath(musetalk_dir), bool(use_float16) and backend == 'torch', backend)
+
+
+def get_musetalk_engine(version=MUSETALK_VERSION, musetalk_dir=MUSETALK_DIR, use_float16=None, backend=None):
+    """获取（必要时创建）指定版本和推理后端的进程级共享引擎，不会触发模型加载"""
+    use_float16 = use_float16 if use_float16 is not None else MUSETALK_INFERENCE['use_float16']
+    backend = backend or MUSETALK_BACKEND['backend']
+    key = _engine_key(version, musetalk_dir, use_float16, backend)
+    with _engines_lock:
+        if key not in _engines:
+            _engines[key] = MuseTalkEngine(version, musetalk_dir, use_float16, backend=backend)
+        return _engines[key]
+
+
+def register_musetalk_engine(engine):
+    """注册自定义引擎（如离线压测用的替身），替换同一版本配置下的已有引擎"""
+    key = _engine_key(engine.version, engine.musetalk_dir, engine.use_float16, engine.backend)
+    with _engines_lock:
+        old = _engines.get(key)
+        _engines[key] = engine
+        return old
+
+
+def preload_configs():
+    """启动时加载的引擎配置 [(version, use_float16, backend)]，见 MUSETALK_ENGINE['preload_engines']"""
+    return [(config['version'],
+             config['use_float16'] if config.get('use_float16') is not None else MUSETALK_INFERENCE['use_float16'],
+             config.get('backend') or MUSETALK_BACKEND['backend'])
+            for config in MUSETALK_ENGINE['preload_engines']]
+
+
+def warmup_engines(musetalk_dir=MUSETALK_DIR):
+    """加载并预热 preload_configs() 中的每个引擎（须在 close_engine_loading 之前调用），返回预热成功的引擎"""
+    ready = []
+    for version, use_float16, backend in preload_configs():
+        engine = get_musetalk_engine(version, musetalk_dir, use_float16, backend)
+        try:
+            engine.warmup()
+        except Exception as e:
+            print(f"[MuseTalk] {version} 引擎（use_float16={use_float16}, backend={backend}）预热失败，"
+                  f"该配置的请求回退到子进程方式: {e}")
+        else:
+            ready.append(engine)
+    return ready
+
+
+def engine_available(version, use_float16=None, backend=None, musetalk_dir=MUSETALK_DIR):
+    """该配置的常驻引擎能否使用：加载关闭前总是可以按需加载，关闭后只有已加载的引擎可用"""
+    if not _loading_closed.is_set():
+        return True
+    use_float16 = use_float16 if use_float16 is not None else MUSETALK_INFERENCE['use_float16']
+    backend = backend or MUSETALK_BACKEND['backend']
+    with _engines_lock:
+        engine = _engines.get(_engine_key(version, musetalk_dir, use_float16, backend))
+    return engine is not None and engine.loaded
+
+
+def musetalk_engine_stats():
+    with _engines_lock:
+        engines = list(_engines.values())
+    return [engine.stats() for engine in engines]
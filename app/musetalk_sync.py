@@ -2,29 +2,93 @@ import subprocess
 import os
 import sys
 import shutil
+import tempfile
+import threading
 from scripts.check_musetalk import check_musetalk_installation
-from app.config import MUSETALK_CONFIG, MUSETALK_INFERENCE
+from app.artifacts import audio_file, image_file
+from app.config import MUSETALK_CONFIG, MUSETALK_ENGINE, MUSETALK_INFERENCE
+from app.cpu_slots import slot_env
+from app.metrics import span
+from app.musetalk_engine import get_musetalk_engine
+
+# 限制同时运行的 MuseTalk 子进程数
+_subprocess_slots = threading.BoundedSemaphore(MUSETALK_ENGINE['subprocess_concurrency'])
+
+
+def _link_input(src, dst):
+    """把输入文件以硬链接放入工作区；跨文件系统时退回符号链接，最后才复制"""
+    try:
+        os.link(src, dst)
+        return 'link'
+    except OSError:
+        pass
+    try:
+        os.symlink(os.path.abspath(src), dst)
+        return 'symlink'
+    except OSError:
+        shutil.copy(src, dst)
+        return 'copy'
 
 
 def musetalk_sync(image_path, audio_path, output_path, musetalk_dir="external/MuseTalk", version="v1.0",
-                  bbox_shift=None, use_float16=None, fps=None):
+                  bbox_shift=None, use_float16=None, fps=None, use_engine=None, backend=None,
+                  sink_options=None):
     """
     基于 MuseTalk 官方 inference.sh 优化实现的口型同步函数
 
+    默认使用进程内常驻的 MuseTalkEngine，模型只加载一次；
+    引擎不可用（依赖缺失、加载失败）时回退到启动官方推理脚本的子进程方式。
+    子进程方式下每次调用使用独立的工作区（输入、推理配置、结果目录），
+    不修改 MuseTalk 目录和当前进程的工作目录，多个任务可以安全并发。
+
     Args:
-        image_path (str): 输入图片路径
-        audio_path (str): 输入音频路径
+        image_path (str or ImageArtifact): 输入图片
+        audio_path (str or AudioArtifact): 输入音频；常驻引擎直接使用内存数据，子进程方式下才写出文件
         output_path (str): 输出视频路径
         musetalk_dir (str): MuseTalk 目录路径
         version (str): 版本, v1.0 或 v1.5
         bbox_shift (int, optional): 嘴部区域调整，正值增加嘴部开度，负值减少嘴部开度
         use_float16 (bool, optional): 是否使用半精度推理以节省显存
         fps (int, optional): 生成视频的帧率
+        use_engine (bool, optional): 是否使用常驻引擎，默认取 MUSETALK_ENGINE['mode']
+        backend (str, optional): 常驻引擎的推理后端，默认取 MUSETALK_BACKEND['backend']
+        sink_options (dict, optional): 常驻引擎写视频的编码参数（覆盖 FRAME_SINK），子进程方式忽略
+
+    Returns:
+        dict or None: 常驻引擎的渲染统计（见 MuseTalkEngine.render），子进程方式为 None
     """
-    # 检查 MuseTalk 安装
-    if not check_musetalk_installation(musetalk_dir, version):
-        raise RuntimeError("MuseTalk 安装检查失败，请确保正确安装")
+    return musetalk_sync_batch([{
+        'image_path': image_path,
+        'audio_path': audio_path,
+        'output_path': output_path,
+        'bbox_shift': bbox_shift,
+    }], musetalk_dir=musetalk_dir, version=version, use_float16=use_float16, fps=fps,
+        use_engine=use_engine, backend=backend, sink_options=sink_options)[0]
+
 
+def musetalk_sync_batch(tasks, musetalk_dir="external/MuseTalk", version="v1.0",
+                        use_float16=None, fps=None, use_engine=None, backend=None, sink_options=None):
+    """
+    在一个 MuseTalk 模型会话中渲染多个口型同步视频
+
+    子进程方式下所有任务写入同一个推理配置（task_0 ... task_N），只启动一次推理脚本、
+    只加载一次模型，结果按任务分别写回各自的 output_path；常驻引擎方式下依次调用 render。
+    版本、精度和帧率作用于整个会话，bbox_shift 可按任务设置。
+
+    Args:
+        tasks (list[dict]): 每项包含 image_path、audio_path（路径或 ImageArtifact / AudioArtifact）、
+            output_path，可选 bbox_shift
+        musetalk_dir (str): MuseTalk 目录路径
+        version (str): 版本, v1.0 或 v1.5
+        use_float16 (bool, optional): 是否使用半精度推理以节省显存
+        fps (int, optional): 生成视频的帧率
+        use_engine (bool, optional): 是否使用常驻引擎，默认取 MUSETALK_ENGINE['mode']
+        backend (str, optional): 常驻引擎的推理后端，默认取 MUSETALK_BACKEND['backend']
+        sink_options (dict, optional): 常驻引擎写视频的编码参数（覆盖 FRAME_SINK），子进程方式忽略
+
+    Returns:
+        list: 每个任务的渲染统计，子进程方式下为 None
+    """
     # 检查版本并获取配置
     if version not in MUSETALK_CONFIG:
         raise ValueError(
@@ -34,119 +98,123 @@ def musetalk_sync(image_path, audio_path, output_path, musetalk_dir="external/Mu
     version_config = MUSETALK_CONFIG[version]
 
     # 获取推理参数，优先使用传入的参数
-    bbox_shift = bbox_shift if bbox_shift is not None else MUSETALK_INFERENCE['bbox_shift']
+    tasks = [dict(task, bbox_shift=task.get('bbox_shift') if task.get('bbox_shift') is not None
+                  else MUSETALK_INFERENCE['bbox_shift']) for task in tasks]
     use_float16 = use_float16 if use_float16 is not None else MUSETALK_INFERENCE[
         'use_float16']
     fps = fps if fps is not None else MUSETALK_INFERENCE['fps']
 
-    result_dir = os.path.dirname(output_path)
-    os.makedirs(result_dir, exist_ok=True)
+    use_engine = use_engine if use_engine is not None else MUSETALK_ENGINE['mode'] == 'engine'
+    if use_engine:
+        engine = get_musetalk_engine(version, musetalk_dir, use_float16, backend)
+        try:
+            engine.load()
+        except Exception as e:
+            print(f"[MuseTalk] 常驻引擎不可用，回退到子进程方式: {e}")
+        else:
+            results = []
+            for task in tasks:
+                results.append(engine.render(task['image_path'], task['audio_path'], task['output_path'],
+                                             bbox_shift=task['bbox_shift'], fps=fps,
+                                             sink_options=sink_options))
+                print(f"[MuseTalk] 成功生成视频: {task['output_path']}")
+            return results
+
+    # 检查 MuseTalk 安装（常驻引擎在加载时自行检查，已注册的替身引擎不依赖 MuseTalk 目录）
+    if not check_musetalk_installation(musetalk_dir, version):
+        raise RuntimeError("MuseTalk 安装检查失败，请确保正确安装")
 
-    # 切换工作目录到 MuseTalk 目录
-    current_dir = os.getcwd()
     musetalk_abs_dir = os.path.abspath(musetalk_dir)
+    # 子进程只能读文件：内存中的图片和音频在此写出
+    tasks = [dict(task, image_path=image_file(task['image_path']), audio_path=audio_file(task['audio_path']))
+             for task in tasks]
 
     # 检查 MuseTalk 目录是否存在
     if not os.path.exists(musetalk_abs_dir):
         raise FileNotFoundError(f"MuseTalk 目录未找到: {musetalk_abs_dir}")
 
-    try:
-        # 准备输入目录
-        data_dir = os.path.join(musetalk_abs_dir, "data")
-        video_dir = os.path.join(data_dir, "video")
-        audio_dir = os.path.join(data_dir, "audio")
-
-        os.makedirs(video_dir, exist_ok=True)
-        os.makedirs(audio_dir, exist_ok=True)
-
-        # 结果目录
-        results_dir = os.path.join(musetalk_abs_dir, "results", "test")
-        os.makedirs(results_dir, exist_ok=True)
-
-        # 提取文件名，不包含扩展名
-        image_basename = os.path.splitext(os.path.basename(image_path))[0]
-        audio_basename = os.path.splitext(os.path.basename(audio_path))[0]
-
-        # 复制输入文件到 MuseTalk 目录结构
-        input_image = os.path.join(video_dir, f"{image_basename}.jpg")
-        input_audio = os.path.join(audio_dir, f"{audio_basename}.wav")
-
-        print(f"[MuseTalk] 复制输入文件: {image_path} -> {input_image}")
-        shutil.copy(image_path, input_image)
-        print(f"[MuseTalk] 复制输入文件: {audio_path} -> {input_audio}")
-        shutil.copy(audio_path, input_audio)
+    for task in tasks:
+        os.makedirs(os.path.dirname(os.path.abspath(task['output_path'])), exist_ok=True)
 
-        # 创建或修改配置文件 - 使用官方格式
-        config_dir = os.path.join(musetalk_abs_dir, "configs", "inference")
-        os.makedirs(config_dir, exist_ok=True)
-
-        test_config = os.path.join(config_dir, "test.yaml")
-        with open(test_config, 'w', encoding='utf-8') as f:
-            f.write('task_0:\n')
-            f.write(f' video_path: "data/video/{image_basename}.jpg"\n')
-            f.write(f' audio_path: "data/audio/{audio_basename}.wav"\n')
+    # 本次调用使用独立的工作区（输入、配置、结果），不再写入 MuseTalk 目录下的共享路径
+    workspace = tempfile.mkdtemp(
+        prefix="musetalk_", dir=os.path.dirname(os.path.abspath(tasks[0]['output_path'])))
+    try:
+        return _render_in_workspace(tasks, workspace, musetalk_abs_dir, version_config, use_float16, fps)
+    except Exception:
+        if MUSETALK_ENGINE['keep_failed_workspace']:
+            print(f"[MuseTalk] 保留工作区以便排查: {workspace}")
+            workspace = None
+        raise
+    finally:
+        # 成功或失败都删除工作区，只有打开排查开关时保留失败的现场
+        if workspace is not None:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+
+def _render_in_workspace(tasks, workspace, musetalk_abs_dir, version_config, use_float16, fps):
+    """在工作区中写入输入与推理配置，运行一次推理脚本，并把结果移回各任务的 output_path"""
+    video_dir = os.path.join(workspace, "data", "video")
+    audio_dir = os.path.join(workspace, "data", "audio")
+    results_dir = os.path.join(workspace, "results")
+    os.makedirs(video_dir)
+    os.makedirs(audio_dir)
+    os.makedirs(results_dir)
+
+    # 写入本次调用专属的推理配置 - 使用官方格式，路径均为绝对路径
+    inference_config = os.path.join(workspace, "inference.yaml")
+    with open(inference_config, 'w', encoding='utf-8') as f:
+        for i, task in enumerate(tasks):
+            # 按任务编号命名输入，避免不同任务的同名文件（如 input.jpg）在 MuseTalk 中冲突
+            input_image = os.path.join(video_dir, f"task_{i}.jpg")
+            input_audio = os.path.join(audio_dir, f"task_{i}.wav")
+            # 输入只建立链接，不复制数据
+            method = _link_input(task['image_path'], input_image)
+            print(f"[MuseTalk] 输入文件（{method}）: {task['image_path']} -> {input_image}")
+            method = _link_input(task['audio_path'], input_audio)
+            print(f"[MuseTalk] 输入文件（{method}）: {task['audio_path']} -> {input_audio}")
+
+            f.write(f'task_{i}:\n')
+            f.write(f" video_path: '{input_image}'\n")
+            f.write(f" audio_path: '{input_audio}'\n")
+            f.write(f" result_name: 'task_{i}.mp4'\n")
 
             # 添加可选参数
-            if bbox_shift != 0:  # 只有当非零时才添加
-                f.write(f' bbox_shift: {bbox_shift}\n')
-
-            if fps != 25:  # 只有当不是默认帧率时才添加
-                f.write(f' fps: {fps}\n')
-
-        # 设置版本相关路径
-        model_dir = version_config['model_dir']
-        unet_model_path = f"{model_dir}/{version_config['model_file']}"
-        unet_config = f"{model_dir}/{version_config['config_file']}"
-        version_arg = version_config['version_arg']
-
-        # 切换到 MuseTalk 目录
-        os.chdir(musetalk_abs_dir)
-
-        # 构建命令 - 使用官方推荐的命令格式
-        cmd = []
-        if os.name == 'nt':  # Windows
-            cmd = [
-                sys.executable,
-                "-m", "scripts.inference",
-                "--inference_config", "configs/inference/test.yaml",
-                "--result_dir", "results/test",
-                "--unet_model_path", unet_model_path,
-                "--unet_config", unet_config,
-                "--version", version_arg
-            ]
-
-            # 添加半精度选项
-            if use_float16:
-                cmd.append("--use_float16")
-
-        else:  # Linux
-            # 使用 bash 脚本运行
-            shell_script_path = os.path.join(musetalk_abs_dir, "inference.sh")
-            if os.path.exists(shell_script_path):
-                # 使用脚本时不能直接传递额外参数，所以只能使用一个脚本
-                cmd = ["bash", "inference.sh",
-                       version.lower().replace("v", ""), "normal"]
-            else:
-                # 如果没有 shell 脚本，直接调用 Python 模块
-                cmd = [
-                    sys.executable,
-                    "-m", "scripts.inference",
-                    "--inference_config", "configs/inference/test.yaml",
-                    "--result_dir", "results/test",
-                    "--unet_model_path", unet_model_path,
-                    "--unet_config", unet_config,
-                    "--version", version_arg
-                ]
-
-                # 添加半精度选项
-                if use_float16:
-                    cmd.append("--use_float16")
-
-        print(f"[MuseTalk] 运行命令: {' '.join(cmd)}")
-
+            if task['bbox_shift'] != 0:  # 只有当非零时才添加
+                f.write(f" bbox_shift: {task['bbox_shift']}\n")
+
+    # 设置版本相关路径（相对 MuseTalk 目录）
+    model_dir = version_config['model_dir']
+    unet_model_path = f"{model_dir}/{version_config['model_file']}"
+    unet_config = f"{model_dir}/{version_config['config_file']}"
+    version_arg = version_config['version_arg']
+
+    # 直接调用 Python 模块：官方 inference.sh 固定读写共享的 test.yaml 和 results/test，无法隔离
+    cmd = [
+        sys.executable,
+        "-m", "scripts.inference",
+        "--inference_config", inference_config,
+        "--result_dir", results_dir,
+        "--unet_model_path", unet_model_path,
+        "--unet_config", unet_config,
+        "--version", version_arg,
+        "--fps", str(fps)
+    ]
+
+    # 添加半精度选项
+    if use_float16:
+        cmd.append("--use_float16")
+
+    print(f"[MuseTalk] 运行命令（{len(tasks)} 个任务）: {' '.join(cmd)}")
+
+    # 子进程在 MuseTalk 目录中运行，不改变当前进程的工作目录；并发数受限，等待名额的时间单独统计
+    with span('musetalk_slot_wait'):
+        _subprocess_slots.acquire()
+    try:
         try:
-            result = subprocess.run(
-                cmd, check=True, capture_output=True, text=True)
+            with span('musetalk_subprocess'):
+                result = subprocess.run(
+                    cmd, check=True, capture_output=True, text=True, cwd=musetalk_abs_dir, env=slot_env())
             print(f"[MuseTalk] 命令执行成功")
             if result.stdout:
                 print(f"[MuseTalk] 输出: {result.stdout[:500]}...")
@@ -157,32 +225,31 @@ def musetalk_sync(image_path, audio_path, output_path, musetalk_dir="external/Mu
             if e.stderr:
                 print(f"[MuseTalk] 错误输出: {e.stderr}")
             raise RuntimeError(f"MuseTalk 执行失败: {e.stderr}")
-
-        # 查找结果视频
-        result_mp4 = os.path.join(results_dir, "result.mp4")
-        if os.path.exists(result_mp4):
-            shutil.copy(result_mp4, output_path)
-            print(f"[MuseTalk] 成功生成视频: {output_path}")
-        else:
-            # 如果没有 result.mp4，查找其他可能的输出文件
-            mp4_files = []
-            for root, _, files in os.walk(results_dir):
-                mp4_files.extend([os.path.join(root, f)
-                                 for f in files if f.endswith('.mp4')])
-
-            if mp4_files:
-                print(f"[MuseTalk] 找到其他视频文件: {mp4_files}")
-                shutil.copy(mp4_files[0], output_path)
-                print(f"[MuseTalk] 使用替代文件: {mp4_files[0]} -> {output_path}")
-            else:
-                raise FileNotFoundError(
-                    f"MuseTalk 没有生成任何视频文件，检查 {results_dir} 目录")
-
     finally:
-        # 恢复原工作目录
-        os.chdir(current_dir)
-
-        # 可以选择清理临时文件，取决于是否需要保留调试信息
-        # 如果需要清理，取消下面的注释
-        # shutil.rmtree(os.path.join(video_dir, image_basename + ".jpg"), ignore_errors=True)
-        # shutil.rmtree(os.path.join(audio_dir, audio_basename + ".wav"), ignore_errors=True)
+        _subprocess_slots.release()
+
+    # 按配置中的 result_name 把结果分发回各任务
+    mp4_files = {}
+    for root, _, files in os.walk(results_dir):
+        for name in files:
+            if name.endswith('.mp4'):
+                mp4_files.setdefault(name, os.path.join(root, name))
+
+    missing = []
+    for i, task in enumerate(tasks):
+        result_mp4 = mp4_files.get(f"task_{i}.mp4")
+        if result_mp4 is None and len(tasks) == 1 and mp4_files:
+            # 单任务时兼容不识别 result_name 的 MuseTalk 版本
+            result_mp4 = sorted(mp4_files.values())[0]
+            print(f"[MuseTalk] 使用替代文件: {result_mp4}")
+        if result_mp4 is None:
+            missing.append(task['output_path'])
+            continue
+        # 工作区建在输出目录下，同一文件系统内 move 只是改名，不复制数据
+        shutil.move(result_mp4, task['output_path'])
+        print(f"[MuseTalk] 成功生成视频: {task['output_path']}")
+
+    if missing:
+        raise FileNotFoundError(f"MuseTalk 没有生成以下视频: {missing}")
+
+    return [None] * len(tasks)
@@ -0,0 +1,73 @@
+import os
+
+from app.artifacts import ImageArtifact
+from app.config import QUALITY
+from app.job_queue import Job
+
+
+def quality_tier(params):
+    """任务的质量档位配置，未指定时为 QUALITY['default']"""
+    name = params.get('quality') or QUALITY['default']
+    if name not in QUALITY['tiers']:
+        raise ValueError(f"不支持的质量档位: {name}，支持: {list(QUALITY['tiers'])}")
+    return QUALITY['tiers'][name]
+
+
+def tier_fps(params):
+    """档位限制后的帧率"""
+    fps = quality_tier(params).get('fps')
+    return min(params['fps'], fps) if fps else params['fps']
+
+
+def tier_sink_options(params):
+    """档位对应的编码参数，覆盖 FRAME_SINK"""
+    tier = quality_tier(params)
+    return {key: tier[key] for key in ('preset', 'crf') if key in tier}
+
+
+def tier_image(item, params, image=None):
+    """
+    档位对应的参考图（ImageArtifact）：image_scale < 1 时为内存中缩小后的图片，否则为原图
+
+    缩小只降低输出视频的分辨率：MuseTalk 的人脸裁剪始终缩放到 256×256，推理量不变（见 QUALITY）。
+
+    缩小后的图片只在需要文件的后端使用时才写入任务目录；形象缓存以原图哈希 + 缩放比例为键，
+    与原图分开存放，注册形象时按实时会话档位预处理的结果可直接命中（见 app.realtime.prepare_session_avatar）。
+
+    Args:
+        item (dict): 渲染条目，需包含 image_path 和 video_path
+        params (dict): 任务参数
+        image (ImageArtifact, optional): 原图，已解码时直接复用
+    """
+    image = image or ImageArtifact(path=item['image_path'])
+    scale = quality_tier(params).get('image_scale', 1.0)
+    if scale >= 1.0:
+        return image
+    scaled_path = os.path.join(os.path.dirname(item['video_path']), f"input_x{scale:g}.png")
+    key = f"{image.sha256()}@x{scale:g}"
+    if os.path.exists(scaled_path):
+        return ImageArtifact(path=scaled_path, key=key)
+    import cv2
+    source = image.array()
+    height, width = source.shape[:2]
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return ImageArtifact(path=scaled_path, image=cv2.resize(source, size, interpolation=cv2.INTER_AREA), key=key)
+
+
+def upgrade_job(job):
+    """
+    preview 任务完成后的 full 重渲染任务（同一 task_id），不需要升级时返回 None
+
+    沿用 preview 已合成的 TTS 音频，mux 阶段替换同一路径下的最终视频；
+    preview 的耗时等信息保留在新任务的 info 中。
+    """
+    params = job.params
+    if (params.get('quality') or QUALITY['default']) != 'preview' or not params.get('auto_upgrade', QUALITY['auto_upgrade']):
+        return None
+    upgrade = Job(job.task_id, {**params, 'quality': 'full', 'reuse_tts': True})
+    # 同一进程内执行时直接复用内存中的 TTS 音频和已解码的原图
+    upgrade.artifacts = dict(job.artifacts)
+    preview_time = job.finished_at - job.started_at if job.finished_at and job.started_at else None
+    upgrade.set_info(**{**job.info, 'quality': 'full', 'preview_ready': True, 'preview_time': preview_time})
+    print(f"[QUALITY] {job.task_id} preview ready in {preview_time or 0:.2f}s, full render queued")
+    return upgrade
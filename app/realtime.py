@@ -0,0 +1,231 @@
+import os
+import shutil
+import threading
+import time
+
+from app.artifacts import AudioArtifact
+from app.config import MUSETALK_DIR, MUSETALK_INFERENCE, MUSETALK_VERSION, REALTIME
+from app.metrics import span
+from app.musetalk_engine import get_musetalk_engine
+from app.quality import tier_fps, tier_image, tier_sink_options
+from app.scheduler import Stage, StageScheduler
+from app.text_segment import take_sentences
+from app.tts import get_tts_engine
+
+_sessions_lock = threading.Lock()
+_active_sessions = 0
+
+
+class SessionLimitError(Exception):
+    """同时进行的实时会话数已达 REALTIME['max_sessions']"""
+
+
+def prepare_session_avatar(engine, image_path, bbox_shift, quality=None):
+    """
+    注册形象时按实时会话的画质档位预处理
+
+    档位缩小参考图时形象缓存与原图分开存放（键为原图哈希 + 缩放比例），提前预处理后
+    会话开启时直接命中，不再做人脸检测和 VAE 编码；档位使用原图时即为原图的缓存。
+    """
+    image = tier_image({'image_path': image_path, 'video_path': os.path.join(os.path.dirname(image_path), 'avatar')},
+                       {'quality': quality or REALTIME['quality']})
+    return engine.get_avatar(image, bbox_shift)
+
+
+class RealtimeSession:
+    """
+    绑定一个形象的实时会话：文本增量输入，逐句返回音频和视频分段
+
+    open() 加载常驻的 TTS 与 MuseTalk 引擎并预处理形象，之后每输入完一句即进入
+    TTS → 口型两级流水线（第 k 句生成口型时第 k+1 句已在合成语音）。每句产出两个事件，
+    经 on_event 回调（在工作线程中调用）按输入顺序送出：
+
+    - {'type': 'audio', 'seq', 'text', 'data': WAV 字节, 'duration', 'latency', 'tts_time'}
+    - {'type': 'video', 'seq', 'text', 'data': MP4 字节（含音轨）, 'duration', 'latency', 'lipsync_time'}
+    - {'type': 'error', 'seq', 'text', 'error'}：该句失败，后续句子照常处理
+
+    latency 为该句文本可合成（句子输入完整或 flush）到分段就绪的耗时。
+
+    Args:
+        image_path (str): 形象图片路径（一般为已注册形象）
+        session_dir (str): 分段文件目录，关闭会话时删除（REALTIME['keep_files'] 为 False 时）
+        on_event (callable): 事件回调
+        musetalk_version (str, optional): MuseTalk 版本
+        bbox_shift (int, optional): 嘴部区域调整
+        use_float16 (bool, optional): 是否使用半精度推理
+        fps (int, optional): 帧率上限，实际帧率还受画质档位限制
+        quality (str, optional): 画质档位，默认 REALTIME['quality']
+        backend (str, optional): 常驻引擎的推理后端
+        tts_engine (TTSEngine, optional): 默认使用进程级共享引擎
+        musetalk_engine (MuseTalkEngine, optional): 默认按版本、精度和后端取进程级共享引擎
+    """
+
+    def __init__(self, image_path, session_dir, on_event, musetalk_version=MUSETALK_VERSION, bbox_shift=None,
+                 use_float16=None, fps=None, quality=None, backend=None, tts_engine=None, musetalk_engine=None):
+        self.session_dir = session_dir
+        self.on_event = on_event
+        self.bbox_shift = bbox_shift if bbox_shift is not None else MUSETALK_INFERENCE['bbox_shift']
+        self.params = {
+            'fps': fps if fps is not None else MUSETALK_INFERENCE['fps'],
+            'quality': quality or REALTIME['quality'],
+        }
+        self.fps = tier_fps(self.params)
+        self.sink_options = tier_sink_options(self.params)
+        self.tts_engine = tts_engine or get_tts_engine()
+        self.musetalk_engine = musetalk_engine or get_musetalk_engine(musetalk_version, MUSETALK_DIR, use_float16,
+                                                                      backend)
+        os.makedirs(session_dir, exist_ok=True)
+        self.image = tier_image({'image_path': image_path,
+                                 'video_path': os.path.join(session_dir, 'avatar')}, self.params)
+
+        self.buffer = ''
+        self.seq = 0
+        self.chunks = []  # 各句的耗时记录
+        self.opened_at = None
+        self.warmup_time = None
+        self._futures = []
+        self._lock = threading.Lock()
+        self._cancelled = threading.Event()
+        self._scheduler = StageScheduler([
+            Stage('tts', self._tts),
+            Stage('lipsync', self._lipsync),
+        ], on_error=self._on_error)
+
+    def open(self):
+        """加载模型并预处理形象（已注册形象一般已在形象缓存中），返回耗时（秒）"""
+        start = time.perf_counter()
+        with span('realtime_warmup'):
+            self.tts_engine.load()
+            self.musetalk_engine.load()
+            self.musetalk_engine.get_avatar(self.image, self.bbox_shift)
+        self.warmup_time = time.perf_counter() - start
+        self.opened_at = time.time()
+        print(f"[REALTIME] 会话就绪 {self.session_dir}，预热 {self.warmup_time:.2f}s，fps={self.fps}")
+        return self.warmup_time
+
+    def feed(self, text):
+        """追加文本，已完整的句子立即提交，返回本次提交的句数"""
+        with self._lock:
+            chunks, self.buffer = take_sentences(self.buffer + text, REALTIME['segment_max_cost'])
+            for chunk in chunks:
+                self._submit(chunk)
+        return len(chunks)
+
+    def flush(self):
+        """提交缓冲中尚未结束的文本（如客户端表示本轮输入结束），返回提交的句数"""
+        with self._lock:
+            rest, self.buffer = self.buffer.strip(), ''
+            if rest:
+                self._submit(rest)
+        return 1 if rest else 0
+
+    def _submit(self, text):
+        seg = {
+            'seq': self.seq,
+            'text': text,
+            'wav_path': os.path.join(self.session_dir, f"chunk_{self.seq:05d}.wav"),
+            'video_path': os.path.join(self.session_dir, f"chunk_{self.seq:05d}.mp4"),
+            'submitted': time.perf_counter(),
+        }
+        self.seq += 1
+        self._futures.append(self._scheduler.submit(seg))
+
+    def _check_cancelled(self):
+        if self._cancelled.is_set():
+            raise RuntimeError("会话已关闭")
+
+    def _tts(self, seg):
+        self._check_cancelled()
+        start = time.perf_counter()
+        with span('realtime_tts'):
+            audio_array = self.tts_engine.synthesize(seg['text'])
+        # 发送的 WAV 字节与写给 ffmpeg 的文件共用同一次编码；Whisper 的 16kHz 数组直接从内存重采样
+        seg['audio'] = AudioArtifact(audio_array, self.tts_engine.sample_rate, path=seg['wav_path'])
+        data = seg['audio'].wav_bytes()
+        seg['tts_time'] = time.perf_counter() - start
+        seg['duration'] = seg['audio'].duration
+        self.on_event({
+            'type': 'audio', 'seq': seg['seq'], 'text': seg['text'], 'data': data, 'duration': seg['duration'],
+            'latency': time.perf_counter() - seg['submitted'], 'tts_time': seg['tts_time'],
+        })
+        return seg
+
+    def _lipsync(self, seg):
+        self._check_cancelled()
+        start = time.perf_counter()
+        with span('realtime_lipsync'):
+            self.musetalk_engine.render(self.image, seg['audio'], seg['video_path'],
+                                        bbox_shift=self.bbox_shift, fps=self.fps, sink_options=self.sink_options)
+        with open(seg['video_path'], 'rb') as f:
+            data = f.read()
+        lipsync_time = time.perf_counter() - start
+        latency = time.perf_counter() - seg['submitted']
+        with self._lock:
+            self.chunks.append({'seq': seg['seq'], 'duration': seg['duration'], 'latency': latency,
+                                'tts_time': seg['tts_time'], 'lipsync_time': lipsync_time})
+        print(f"[REALTIME] 第 {seg['seq']} 句就绪，{seg['duration']:.2f}s 音频，延迟 {latency:.2f}s"
+              f"（TTS {seg['tts_time']:.2f}s，口型 {lipsync_time:.2f}s）")
+        self.on_event({
+            'type': 'video', 'seq': seg['seq'], 'text': seg['text'], 'data': data, 'duration': seg['duration'],
+            'latency': latency, 'lipsync_time': lipsync_time,
+        })
+        return seg
+
+    def _on_error(self, seg, error):
+        if self._cancelled.is_set():
+            return
+        self.on_event({'type': 'error', 'seq': seg['seq'], 'text': seg['text'], 'error': str(error)})
+
+    def wait(self, timeout=None):
+        """等待已提交的句子全部处理完（失败的句子已通过 error 事件报告）"""
+        for future in list(self._futures):
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+
+    def close(self, wait=True):
+        """关闭会话：wait 为 True 时先处理完已提交的句子，否则（如客户端已断开）跳过未开始的句子，返回会话统计"""
+        if wait:
+            self.wait()
+        else:
+            self._cancelled.set()
+        self._scheduler.shutdown()
+        if not REALTIME['keep_files']:
+            shutil.rmtree(self.session_dir, ignore_errors=True)
+        return self.stats()
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(chunk['latency'] for chunk in self.chunks)
+            return {
+                'warmup_time': self.warmup_time,
+                'fps': self.fps,
+                'quality': self.params['quality'],
+                'submitted': self.seq,
+                'chunks': len(self.chunks),
+                'first_chunk_latency': self.chunks[0]['latency'] if self.chunks else None,
+                'latency_p50': latencies[len(latencies) // 2] if latencies else None,
+                'latency_max': latencies[-1] if latencies else None,
+                'audio_duration': sum(chunk['duration'] for chunk in self.chunks),
+            }
+
+
+def acquire_session_slot():
+    """占用一个会话名额，已满时抛出 SessionLimitError"""
+    global _active_sessions
+    with _sessions_lock:
+        if _active_sessions >= REALTIME['max_sessions']:
+            raise SessionLimitError(f"实时会话数已达上限 {REALTIME['max_sessions']}")
+        _active_sessions += 1
+
+
+def release_session_slot():
+    global _active_sessions
+    with _sessions_lock:
+        _active_sessions = max(0, _active_sessions - 1)
+
+
+def active_sessions():
+    with _sessions_lock:
+        return _active_sessions
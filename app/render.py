@@ -0,0 +1,192 @@
+import os
+
+from app.artifacts import AudioArtifact, ImageArtifact
+from app.tts import get_tts_engine
+from app.musetalk_sync import musetalk_sync, musetalk_sync_batch
+from app.musetalk_batch import get_musetalk_batcher
+from app.av_merge import finalize
+from app.job_cost import observe_job, refine_estimate
+from app.metrics import span
+from app.quality import tier_fps, tier_image, tier_sink_options
+from app.config import MUSETALK_BATCH, MUSETALK_DIR, PIPELINE_STAGES
+
+
+def make_item(task_dir, text_path, image_path, bbox_shift, task_id=None):
+    """按 API 任务目录的文件命名构造一个渲染条目"""
+    return {
+        'task_id': task_id,
+        'text_path': text_path,
+        'image_path': image_path,
+        'bbox_shift': bbox_shift,
+        'tts_path': os.path.join(task_dir, "tts.wav"),
+        'video_path': os.path.join(task_dir, "musetalk_output.mp4"),
+        'final_path': os.path.join(task_dir, "final.mp4"),
+    }
+
+
+# 渲染任务分为三个阶段，由 StageScheduler 按阶段并行执行，或由 render_job 顺序执行。
+# job.params 需包含 items（见 make_item）以及整个任务共用的 musetalk_version、
+# use_float16、fps；可选 lip_model（musetalk / wav2lip）、model_path、musetalk_dir、use_engine、
+# musetalk_backend（常驻引擎的推理后端）、quality（质量档位，见 app.quality）、
+# reuse_tts（TTS 音频已存在时直接使用）。
+# TTS 音频与参考图以 AudioArtifact / ImageArtifact 存放在 job.artifacts 中（以条目中的路径为键），
+# 在阶段之间直接传递内存数据，只有需要文件的后端（ffmpeg 复用音轨、子进程推理）才写出。
+
+def item_audio(job, item):
+    """条目的 TTS 音频：本进程合成的内存数据，否则为已有的 WAV 文件（首次使用时读取）"""
+    if item['tts_path'] not in job.artifacts:
+        job.artifacts[item['tts_path']] = AudioArtifact.from_file(item['tts_path'])
+    return job.artifacts[item['tts_path']]
+
+
+def item_image(job, item):
+    """条目的参考图，解码结果与内容哈希在同一任务（含 preview 后的完整画质渲染）中只计算一次"""
+    if item['image_path'] not in job.artifacts:
+        job.artifacts[item['image_path']] = ImageArtifact(path=item['image_path'])
+    return job.artifacts[item['image_path']]
+
+
+def stage_tts(job):
+    """步骤1：TTS"""
+    items = job.params['items']
+    tts_engine = get_tts_engine()
+    job.set_stage('tts', 0.05)
+    if job.params.get('quality'):
+        job.set_info(quality=job.params['quality'])
+    with span('tts', job.spans):
+        for item in items:
+            if job.params.get('reuse_tts') and (item['tts_path'] in job.artifacts
+                                                or os.path.exists(item['tts_path'])):
+                print(f"[RENDER] {job.task_id} reusing TTS audio: {item['tts_path']}")
+                continue
+            audio = tts_engine.tts_artifact(item['text_path'], item['tts_path'])
+            job.artifacts[item['tts_path']] = audio
+            print(f"[RENDER] {job.task_id} TTS done, {audio.duration:.2f}s audio kept in memory")
+        # 以实际音频时长修正任务的预计耗时（复用的音频不再计入朗读速度统计）
+        refine_estimate(job, sum(item_audio(job, item).duration for item in items),
+                        observe=not job.params.get('reuse_tts'))
+
+
+def stage_lipsync(job):
+    """步骤2：口型视频生成；多个条目在一次 MuseTalk 会话中渲染"""
+    with span('lipsync', job.spans):
+        _lipsync(job)
+
+
+def _lipsync(job):
+    params = job.params
+    items = params['items']
+    job.set_stage('lipsync', 0.3)
+    # 质量档位决定帧率、参考图分辨率和编码参数
+    fps = tier_fps(params)
+    images = [tier_image(item, params, item_image(job, item)) for item in items]
+    audios = [item_audio(job, item) for item in items]
+    sink_options = tier_sink_options(params)
+
+    if params.get('lip_model', 'musetalk') == 'wav2lip':
+        from app.lip_sync import lip_sync
+        for item, image, audio in zip(items, images, audios):
+            lip_sync(image, audio, item['video_path'], params['model_path'],
+                     fps=fps, use_engine=params.get('use_engine'), sink_options=sink_options)
+        return
+
+    musetalk_dir = params.get('musetalk_dir', MUSETALK_DIR)
+    use_engine = params.get('use_engine')
+    backend = params.get('musetalk_backend')
+    if len(items) == 1 and MUSETALK_BATCH['enabled'] and musetalk_dir == MUSETALK_DIR:
+        # 与同时到达该阶段、设置相同的其它任务合并为一次推理调用
+        item = items[0]
+        results = [get_musetalk_batcher().submit(
+            images[0], audios[0], item['video_path'],
+            version=params['musetalk_version'],
+            bbox_shift=item['bbox_shift'],
+            use_float16=params['use_float16'],
+            fps=fps,
+            backend=backend,
+            sink_options=sink_options,
+            use_engine=use_engine
+        ).result()]
+    elif len(items) == 1:
+        item = items[0]
+        results = [musetalk_sync(
+            images[0],
+            audios[0],
+            item['video_path'],
+            musetalk_dir=musetalk_dir,
+            version=params['musetalk_version'],
+            bbox_shift=item['bbox_shift'],
+            use_float16=params['use_float16'],
+            fps=fps,
+            use_engine=use_engine,
+            backend=backend,
+            sink_options=sink_options
+        )]
+    else:
+        results = musetalk_sync_batch([{
+            'image_path': image,
+            'audio_path': audio,
+            'output_path': item['video_path'],
+            'bbox_shift': item['bbox_shift'],
+        } for item, image, audio in zip(items, images, audios)], musetalk_dir=musetalk_dir,
+            version=params['musetalk_version'], use_float16=params['use_float16'], fps=fps,
+            use_engine=use_engine, backend=backend, sink_options=sink_options)
+    for item in items:
+        print(f"[RENDER] {job.task_id} lip sync done, output: {item['video_path']}")
+    record_skip_ratio(job, results)
+
+
+def record_skip_ratio(job, results):
+    """把常驻引擎跳过的静音帧比例记入任务信息（子进程方式没有该统计）"""
+    results = [r for r in results if r]
+    frames = sum(r['frames'] for r in results)
+    if frames:
+        skipped = sum(r['skipped_frames'] for r in results)
+        job.set_info(skipped_frames=skipped, skipped_frame_ratio=skipped / frames)
+        print(f"[RENDER] {job.task_id} skipped {skipped}/{frames} silent frames")
+
+
+def stage_mux(job):
+    """步骤3：发布最终视频，返回其路径（多条目时为列表）"""
+    items = job.params['items']
+    job.set_stage('mux', 0.9)
+    with span('mux', job.spans):
+        for item in items:
+            # 口型阶段的输出已复用 TTS 音频，这里只做改名或 faststart 流复制
+            finalize(item['video_path'], item['final_path'])
+            print(f"[RENDER] {job.task_id} final video ready: {item['final_path']}")
+    observe_job(job)
+    finals = [item['final_path'] for item in items]
+    return finals[0] if len(finals) == 1 else finals
+
+
+RENDER_STAGES = [
+    ('tts', stage_tts),
+    ('lipsync', stage_lipsync),
+    ('mux', stage_mux),
+]
+
+
+def render_stage_config(stage_config=None):
+    """
+    渲染流水线的阶段配置（默认取 PIPELINE_STAGES）
+
+    启用 MuseTalk 凑批时，口型阶段的每个工作线程都阻塞等待自己任务所在的批次，
+    工作线程数至少为 MUSETALK_BATCH['max_batch_size']，多个任务才能同时进入凑批器；
+    这些线程不做计算，不绑定 CPU 槽位，口型槽位留给凑批器的推理线程。
+    """
+    config = dict(stage_config if stage_config is not None else PIPELINE_STAGES)
+    if MUSETALK_BATCH['enabled']:
+        lipsync = dict(config.get('lipsync', {}))
+        lipsync['workers'] = max(lipsync.get('workers', 1), MUSETALK_BATCH['max_batch_size'])
+        lipsync['pin'] = False
+        config['lipsync'] = lipsync
+    return config
+
+
+def render_job(job):
+    """在当前线程中依次执行全部阶段，返回最终视频路径"""
+    result = None
+    for _, fn in RENDER_STAGES:
+        job.check_lease()
+        result = fn(job)
+    return result
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import threading
+
+from app.config import OUTPUT_DIR, RESULT_CACHE
+from app.tts_cache import normalize_text
+
+
+def request_fingerprint(text, image_sha, **params):
+    """
+    请求指纹：规范化文本 + 图片内容哈希 + 所有影响渲染结果的参数
+
+    Args:
+        text (str): 输入文本
+        image_sha (str): 图片内容的 sha256
+        **params: 版本、bbox_shift、fps、精度、音色等渲染参数
+    """
+    payload = json.dumps({'text': normalize_text(text), 'image': image_sha, **params},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """
+    请求结果缓存，使 /generate 幂等
+
+    指纹到 task_id 的映射每条保存为一个小文件，服务重启后仍然有效；命中时要求对应的
+    final.mp4 存在。相同指纹的任务仍在排队或渲染时，新请求合并到该任务上，不重复渲染。
+
+    Args:
+        index_dir (str, optional): 映射文件目录
+        output_dir (str, optional): 任务输出根目录
+    """
+
+    def __init__(self, index_dir=None, output_dir=None):
+        self.index_dir = index_dir or RESULT_CACHE['index_dir']
+        self.output_dir = output_dir or OUTPUT_DIR
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self._inflight = {}  # 指纹 -> Job
+        self._lock = threading.Lock()
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def _index_path(self, fingerprint):
+        return os.path.join(self.index_dir, fingerprint)
+
+    def _read_index(self, fingerprint):
+        try:
+            with open(self._index_path(fingerprint), encoding='utf-8') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _write_index(self, fingerprint, task_id):
+        path = self._index_path(fingerprint)
+        tmp_path = f"{path}.{task_id}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(task_id)
+        os.replace(tmp_path, path)
+
+    def final_path(self, task_id):
+        return os.path.join(self.output_dir, task_id, "final.mp4")
+
+    def claim(self, fingerprint, job):
+        """
+        查询指纹；未命中时登记 job 为该指纹的任务
+
+        Returns:
+            tuple or None: 命中已完成的任务返回 (task_id, 'hit')，合并到进行中的任务返回
+                (task_id, 'coalesced')，未命中返回 None（调用方应提交 job）
+        """
+        with self._lock:
+            self._prune()
+            running = self._inflight.get(fingerprint)
+            if running is not None:
+                self.coalesced += 1
+                return running.task_id, 'coalesced'
+            task_id = self._read_index(fingerprint)
+            if task_id and os.path.exists(self.final_path(task_id)):
+                self.hits += 1
+                return task_id, 'hit'
+            self.misses += 1
+            self._inflight[fingerprint] = job
+            self._write_index(fingerprint, job.task_id)
+            return None
+
+    def _prune(self):
+        """移除已结束的任务（调用方需持有锁）：之后的相同请求按磁盘上的映射命中，不再引用 Job 对象"""
+        for fingerprint, job in list(self._inflight.items()):
+            if job.finished:
+                del self._inflight[fingerprint]
+
+    def release(self, fingerprint, job):
+        """任务未能提交（如队列已满）时撤销登记"""
+        with self._lock:
+            if self._inflight.get(fingerprint) is job:
+                del self._inflight[fingerprint]
+                if self._read_index(fingerprint) == job.task_id:
+                    os.remove(self._index_path(fingerprint))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.coalesced + self.misses
+            return {
+                'hits': self.hits,
+                'coalesced': self.coalesced,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.coalesced) / total if total else None,
+                'inflight': sum(1 for job in self._inflight.values() if not job.finished),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """获取进程级共享的结果缓存；未启用时返回 None"""
+    global _cache
+    if not RESULT_CACHE['enabled']:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
@@ -0,0 +1,196 @@
+import heapq
+import itertools
+import math
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class PriorityStageQueue(queue.Queue):
+    """
+    按 priority(条目) 从小到大出队的阶段输入队列，相同优先级按到达顺序
+
+    停止标记排在所有条目之后，shutdown() 时仍先处理完已排队的条目。
+    """
+
+    def __init__(self, maxsize, priority):
+        self.priority = priority
+        super().__init__(maxsize)
+
+    def _init(self, maxsize):
+        self.queue = []
+        self._counter = itertools.count()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, entry):
+        key = math.inf if entry is _STOP else self.priority(entry[0])
+        heapq.heappush(self.queue, (key, next(self._counter), entry))
+
+    def _get(self):
+        return heapq.heappop(self.queue)[2]
+
+    def pending(self):
+        with self.mutex:
+            return [entry[0] for _, _, entry in sorted(self.queue) if entry is not _STOP]
+
+
+class Stage:
+    """
+    流水线中的一个阶段
+
+    Args:
+        name (str): 阶段名
+        fn (callable): 处理函数，参数为流经流水线的条目
+        workers (int): 该阶段的工作线程数
+        queue_size (int): 该阶段输入队列的容量，0 表示不限
+        priority (callable, optional): 条目的排队优先级（越小越先执行），默认按到达顺序
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=0, priority=None):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.priority = priority
+        if priority is not None:
+            self.queue = PriorityStageQueue(queue_size, priority)
+        else:
+            self.queue = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.wait_time = 0.0
+
+    def pending(self):
+        """排队中的条目，按出队顺序"""
+        if self.priority is not None:
+            return self.queue.pending()
+        with self.queue.mutex:
+            return [entry[0] for entry in self.queue.queue if entry is not _STOP]
+
+
+class StageScheduler:
+    """
+    多阶段流水线调度器
+
+    每个阶段有独立的工作线程和有界输入队列，条目依次流经各阶段：
+    条目 k 在口型阶段时，条目 k+1 可以同时在 TTS 阶段执行。下游队列满时上游工作线程阻塞，
+    形成逐级反压。report() 给出各阶段的利用率，用于按阶段而不是按请求配置工作线程数。
+
+    Args:
+        stages (list[Stage]): 按执行顺序排列的阶段
+        on_start (callable, optional): 条目进入第一个阶段时回调
+        on_done (callable, optional): 条目完成全部阶段时回调，参数为 (条目, 最后阶段返回值)
+        on_error (callable, optional): 条目在某阶段失败时回调，参数为 (条目, 异常)
+        init_worker (callable, optional): 各工作线程启动时回调，参数为 (阶段名, 线程序号)，
+            如把线程绑定到 CPU 槽位（见 app.cpu_slots.pin_worker）
+    """
+
+    def __init__(self, stages, on_start=None, on_done=None, on_error=None, init_worker=None):
+        self.stages = stages
+        self.on_start = on_start
+        self.on_done = on_done
+        self.on_error = on_error
+        self.init_worker = init_worker
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started_at = None
+
+    def start(self):
+        """启动各阶段工作线程（重复调用无副作用）"""
+        with self._lock:
+            if self._threads:
+                return
+            self._started_at = time.monotonic()
+            for index, stage in enumerate(self.stages):
+                for i in range(stage.workers):
+                    t = threading.Thread(target=self._worker, args=(index, i),
+                                         name=f"stage-{stage.name}-{i}", daemon=True)
+                    t.start()
+                    self._threads.append(t)
+
+    def submit(self, item, block=True, timeout=None):
+        """
+        提交条目，返回 Future（结果为最后一个阶段的返回值）
+
+        第一个阶段的队列已满时：block=True 阻塞等待，否则抛出 queue.Full。
+        """
+        self.start()
+        future = Future()
+        self.stages[0].queue.put((item, future, time.monotonic()), block=block, timeout=timeout)
+        return future
+
+    def _worker(self, index, worker_index=0):
+        stage = self.stages[index]
+        if self.init_worker is not None:
+            self.init_worker(stage.name, worker_index)
+        is_last = index == len(self.stages) - 1
+        while True:
+            entry = stage.queue.get()
+            if entry is _STOP:
+                break
+            item, future, enqueued_at = entry
+            started = time.monotonic()
+            if index == 0 and self.on_start is not None:
+                self.on_start(item)
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                traceback.print_exc()
+                with self._lock:
+                    stage.failed += 1
+                    stage.busy_time += time.monotonic() - started
+                    stage.wait_time += started - enqueued_at
+                if self.on_error is not None:
+                    self.on_error(item, e)
+                future.set_exception(e)
+                continue
+            with self._lock:
+                stage.processed += 1
+                stage.busy_time += time.monotonic() - started
+                stage.wait_time += started - enqueued_at
+            if is_last:
+                if self.on_done is not None:
+                    self.on_done(item, result)
+                future.set_result(result)
+            else:
+                # 下游队列满时在此阻塞，实现逐级反压
+                self.stages[index + 1].queue.put((item, future, time.monotonic()))
+
+    def report(self):
+        """各阶段的处理数、忙碌时间和利用率（忙碌时间 / (运行时长 × 工作线程数)）"""
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+            report = {}
+            for stage in self.stages:
+                done = stage.processed + stage.failed
+                report[stage.name] = {
+                    'workers': stage.workers,
+                    'queued': stage.queue.qsize(),
+                    'processed': stage.processed,
+                    'failed': stage.failed,
+                    'busy_time': stage.busy_time,
+                    'avg_time': stage.busy_time / done if done else None,
+                    'avg_wait': stage.wait_time / done if done else None,
+                    'utilization': stage.busy_time / (elapsed * stage.workers) if elapsed else 0.0,
+                }
+            return report
+
+    def shutdown(self):
+        """等待已提交的条目处理完毕后停止全部工作线程"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if not threads:
+            return
+        # 逐个阶段关闭：先让上游排空，再通知下游退出
+        for stage in self.stages:
+            for _ in range(stage.workers):
+                stage.queue.put(_STOP)
+            for t in threads:
+                if t.name.startswith(f"stage-{stage.name}-"):
+                    t.join()
@@ -0,0 +1,203 @@
+import math
+import os
+import threading
+import time
+
+from app.artifacts import AudioArtifact
+from app.av_merge import concat_playlist, mux_segment
+from app.config import MUSETALK_DIR, STREAMING
+from app.metrics import span
+from app.musetalk_sync import musetalk_sync
+from app.render import item_image, record_skip_ratio
+from app.scheduler import Stage, StageScheduler
+from app.text_segment import split_sentences, text_cost
+from app.tts import get_tts_engine
+
+PLAYLIST_NAME = "index.m3u8"
+
+
+class HLSPlaylist:
+    """
+    随渲染进度增长的 HLS 播放列表（EVENT 类型）
+
+    每完成一个分段追加一条记录并原子地重写 m3u8，播放器轮询时总能读到完整文件；
+    全部分段完成后写入 #EXT-X-ENDLIST。
+
+    Args:
+        path (str): 播放列表路径
+        target_duration (int, optional): 目标分段时长（秒）
+    """
+
+    def __init__(self, path, target_duration=None):
+        self.path = path
+        self.target_duration = target_duration if target_duration is not None else STREAMING['target_duration']
+        self.segments = []  # (文件名, 时长)
+        self.ended = False
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self):
+        """已发布分段的总时长，即下一个分段的起始时间"""
+        with self._lock:
+            return sum(d for _, d in self.segments)
+
+    def add_segment(self, filename, duration):
+        with self._lock:
+            if duration > self.target_duration:
+                # EVENT 播放列表发布后不能修改 TARGETDURATION，超长分段只能提示
+                print(f"[STREAM] 分段 {filename} 时长 {duration:.2f}s 超过目标时长 {self.target_duration}s")
+            self.segments.append((filename, duration))
+            self._write()
+
+    def finish(self):
+        with self._lock:
+            self.ended = True
+            self._write()
+
+    def render(self):
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{int(math.ceil(self.target_duration))}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for filename, duration in self.segments:
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(filename)
+        if self.ended:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+
+def split_stream_text(text, first_max_cost=None, max_cost=None):
+    """
+    按句切分流式文本，首段单独使用更小的长度上限以尽快产出第一帧
+
+    Returns:
+        list[str]: 各分段文本
+    """
+    first_max_cost = first_max_cost if first_max_cost is not None else STREAMING['first_segment_max_cost']
+    max_cost = max_cost if max_cost is not None else STREAMING['segment_max_cost']
+    chunks = split_sentences(text, max_cost)
+    if not chunks or text_cost(chunks[0]) <= first_max_cost:
+        return chunks
+    head = split_sentences(chunks[0], first_max_cost)
+    if chunks[0].startswith(head[0]):
+        rest = chunks[0][len(head[0]):].strip()
+    else:
+        rest = ''.join(head[1:])
+    return head[:1] + split_sentences(rest, max_cost) + chunks[1:]
+
+
+def render_stream(job):
+    """
+    渐进式渲染：按句分段，每段依次经过 TTS、口型、TS 封装后立即发布到播放列表
+
+    分段之间流水线执行（第 k 段口型生成时第 k+1 段已在合成语音），客户端拿到
+    首个分段即可开始播放，无需等待整段视频。全部完成后再拼接出 final.mp4 供下载。
+    job.params 与 render.py 相同（单个条目），另需 stream_dir。
+
+    Returns:
+        str: 最终视频路径
+    """
+    params = job.params
+    item = params['items'][0]
+    # 各分段共用同一参考图，内容哈希只计算一次
+    image = item_image(job, item)
+    stream_dir = params['stream_dir']
+    os.makedirs(stream_dir, exist_ok=True)
+
+    with open(item['text_path'], 'r', encoding='utf-8') as f:
+        segments = split_stream_text(f.read().strip())
+    if not segments:
+        raise ValueError("文本为空")
+
+    playlist = HLSPlaylist(os.path.join(stream_dir, PLAYLIST_NAME))
+    playlist.write()
+    tts_engine = get_tts_engine()
+    job.set_stage('stream', 0.0)
+    job.set_info(segments=len(segments), published=0)
+
+    # 任一分段失败后不再发布后续分段，避免播放列表出现缺口
+    failed = threading.Event()
+
+    def check_failed():
+        if failed.is_set():
+            raise RuntimeError("前序分段渲染失败")
+        job.check_lease()
+
+    def seg_tts(seg):
+        check_failed()
+        with span('stream_tts', job.spans):
+            audio_array = tts_engine.synthesize(seg['text'])
+        seg['audio'] = AudioArtifact(audio_array, tts_engine.sample_rate, path=seg['wav_path'])
+        seg['duration'] = seg['audio'].duration
+        return seg
+
+    lip_results = []
+
+    def seg_lipsync(seg):
+        check_failed()
+        with span('stream_lipsync', job.spans):
+            lip_results.append(musetalk_sync(
+                image, seg['audio'], seg['video_path'],
+                musetalk_dir=params.get('musetalk_dir', MUSETALK_DIR),
+                version=params['musetalk_version'],
+                bbox_shift=item['bbox_shift'],
+                use_float16=params['use_float16'],
+                fps=params['fps'],
+                use_engine=params.get('use_engine'),
+                backend=params.get('musetalk_backend')
+            ))
+        return seg
+
+    def seg_mux(seg):
+        check_failed()
+        # 各阶段单线程，分段按顺序到达，播放列表的时间轴因此连续
+        with span('stream_mux', job.spans):
+            mux_segment(seg['video_path'], seg['ts_path'], ts_offset=playlist.duration)
+        playlist.add_segment(os.path.basename(seg['ts_path']), seg['duration'])
+        published = len(playlist.segments)
+        if published == 1:
+            latency = time.time() - (job.started_at or job.created_at)
+            job.set_info(time_to_first_segment=latency)
+            print(f"[STREAM] {job.task_id} 首个分段已发布，耗时 {latency:.2f}s")
+        job.set_info(published=published)
+        job.set_stage('stream', published / len(segments))
+        return seg
+
+    scheduler = StageScheduler([
+        Stage('tts', seg_tts),
+        Stage('lipsync', seg_lipsync),
+        Stage('mux', seg_mux),
+    ], on_error=lambda seg, e: failed.set())
+    try:
+        futures = [scheduler.submit({
+            'text': text,
+            'wav_path': os.path.join(stream_dir, f"seg_{i:05d}.wav"),
+            'video_path': os.path.join(stream_dir, f"seg_{i:05d}.mp4"),
+            'ts_path': os.path.join(stream_dir, f"seg_{i:05d}.ts"),
+        }) for i, text in enumerate(segments)]
+        for future in futures:
+            future.result()
+    finally:
+        scheduler.shutdown()
+
+    record_skip_ratio(job, lip_results)
+    job.check_lease()
+    playlist.finish()
+    with span('stream_concat', job.spans):
+        concat_playlist(playlist.path, item['final_path'])
+    print(f"[STREAM] {job.task_id} 完成，{len(segments)} 段，总时长 {playlist.duration:.2f}s")
+    return item['final_path']
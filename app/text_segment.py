@@ -0,0 +1,109 @@
+import re
+
+from app.config import TTS_SEGMENT
+
+# 句末标点（中英文），英文句点需后接空白或位于结尾，避免切开小数和缩写
+_SENTENCE_RE = re.compile(r'.+?(?:[。！？!?；;…]+["”’」』）)]*|\.(?=\s|$)["”’)]*|$)', re.S)
+# 句内停顿标点，用于继续切分超长句子
+_CLAUSE_RE = re.compile(r'.+?(?:[，,、：:]+|$)', re.S)
+_CJK_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]')
+
+
+def text_cost(text):
+    """估算文本朗读长度：一个汉字约等于三个拉丁字母"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk * 3 + (len(text) - cjk)
+
+
+def _pieces(pattern, text):
+    return [m.group(0).strip() for m in pattern.finditer(text) if m.group(0).strip()]
+
+
+def _hard_split(text, max_cost):
+    chunks, current = [], ''
+    for char in text:
+        if current.strip() and text_cost(current + char) > max_cost:
+            chunks.append(current.strip())
+            current = ''
+        current += char
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+def split_sentences(text, max_cost=None):
+    """
+    将长文本切分为适合 Bark 单次生成的片段
+
+    先按中英文句末标点分句，超长句子再按逗号等停顿切分，仍然超长时按长度硬切；
+    相邻短句会合并，直到接近 max_cost，以减少 generate_audio 调用次数。
+
+    Args:
+        text (str): 输入文本
+        max_cost (int, optional): 单个片段的最大朗读长度，见 text_cost
+
+    Returns:
+        list[str]: 文本片段
+    """
+    max_cost = max_cost if max_cost is not None else TTS_SEGMENT['max_cost']
+    text = re.sub(r'\s+', ' ', text).strip()
+
+    pieces = []
+    for sentence in _pieces(_SENTENCE_RE, text):
+        if text_cost(sentence) <= max_cost:
+            pieces.append(sentence)
+            continue
+        for clause in _pieces(_CLAUSE_RE, sentence):
+            if text_cost(clause) <= max_cost:
+                pieces.append(clause)
+            else:
+                pieces.extend(_hard_split(clause, max_cost))
+
+    chunks = []
+    for piece in pieces:
+        if chunks:
+            # 英文结尾补空格，中文（含全角标点）直接拼接
+            joiner = ' ' if chunks[-1][-1].isascii() else ''
+            merged = chunks[-1] + joiner + piece
+            if text_cost(merged) <= max_cost:
+                chunks[-1] = merged
+                continue
+        chunks.append(piece)
+    return chunks
+
+
+def take_sentences(text, max_cost=None):
+    """
+    从增量输入的文本缓冲中取出已完整的句子，用于边输入边合成
+
+    以句末标点结尾的句子立即取出（超长句再按 split_sentences 切分）；末尾未结束的部分
+    留在缓冲中，超过 max_cost 时按停顿切出前面的片段，只保留最后一段。
+
+    Returns:
+        tuple: (片段列表, 剩余文本)
+    """
+    max_cost = max_cost if max_cost is not None else TTS_SEGMENT['max_cost']
+    matches = [m for m in _SENTENCE_RE.finditer(text) if m.group(0).strip()]
+    rest = ''
+    if matches and not _ends_sentence(matches[-1], text):
+        rest = matches.pop().group(0)
+    sentences = [m.group(0) for m in matches]
+    chunks = []
+    for sentence in sentences:
+        chunks.extend(split_sentences(sentence, max_cost))
+    if text_cost(rest) > max_cost:
+        pieces = split_sentences(rest, max_cost)
+        chunks.extend(pieces[:-1])
+        rest = pieces[-1]
+    return chunks, rest.lstrip()
+
+
+def _ends_sentence(match, text):
+    """_SENTENCE_RE 的匹配以句末标点结束（而不是文本结尾）"""
+    stripped = re.sub(r'["”’」』）)]+$', '', match.group(0).rstrip())
+    if not stripped:
+        return False
+    # 英文句点只有后接空白时才算句末，缓冲末尾的句点可能是小数或缩写的一部分
+    if stripped[-1] == '.':
+        return text[match.end():match.end() + 1].isspace()
+    return stripped[-1] in '。！？!?；;…'
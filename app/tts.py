@@ -1,7 +1,244 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.artifacts import AudioArtifact
+from app.audio_utils import crossfade_concat
+from app.config import CPU_SLOTS, TTS_ENGINE, TTS_SEGMENT
+from app.cpu_slots import pin_worker
+from app.model_store import get_model_store
+from app.metrics import span
+from app.text_segment import split_sentences
+from app.tts_cache import get_tts_cache
+
+
+class TTSEngine:
+    """
+    常驻内存的 Bark TTS 引擎
+
+    进程启动时一次性加载 text / coarse / fine 模型，之后的合成请求全部复用；
+    合成在有界线程池中执行，不阻塞事件循环。模型加载耗时与合成耗时分开统计。
+    长文本按句切分后由线程池并行合成，所有片段共用同一个 voice preset。
+    每个片段合成前先查询 TTS 缓存，改动过的脚本只需重新合成变化的句子。
+
+    Args:
+        max_workers (int, optional): 合成线程池大小
+        use_gpu (bool, optional): 是否使用 GPU
+        use_small (bool, optional): 是否使用 Bark 小模型
+        voice_preset (str, optional): Bark history prompt
+        cache (TTSCache, optional): 音频缓存，默认使用进程级共享缓存
+        use_cache (bool): 是否启用缓存
+    """
+
+    def __init__(self, max_workers=None, use_gpu=None, use_small=None, voice_preset=None,
+                 cache=None, use_cache=True):
+        self.max_workers = max_workers if max_workers is not None else TTS_ENGINE['max_workers']
+        self.use_gpu = use_gpu if use_gpu is not None else TTS_ENGINE['use_gpu']
+        self.use_small = use_small if use_small is not None else TTS_ENGINE['use_small']
+        self.voice_preset = voice_preset if voice_preset is not None else TTS_ENGINE['voice_preset']
+        self.cache = (cache or get_tts_cache()) if use_cache else None
+        self.model_store = get_model_store()
+
+        self.sample_rate = None
+        self.load_time = None
+        self.synth_count = 0
+        self.synth_time = 0.0
+
+        self._generate = None
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # 启用 CPU 槽位时每个合成线程绑定到各自的核心
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="tts",
+            initializer=pin_worker if CPU_SLOTS['enabled'] else None, initargs=('bark',))
+
+    @property
+    def loaded(self):
+        return self._generate is not None
+
+    @property
+    def model_version(self):
+        """参与缓存键计算，模型变化后旧缓存自然失效"""
+        return 'bark-small' if self.use_small else 'bark'
+
+    def _load_models(self):
+        """加载 Bark 模型，返回 (generate_fn, sample_rate)"""
+        from bark import SAMPLE_RATE, generate_audio, preload_models
+        shared = set()
+        if self.model_store is not None and not self.use_gpu:
+            shared = self._load_shared_models()
+        preload_models(
+            text_use_gpu=self.use_gpu, text_use_small=self.use_small,
+            coarse_use_gpu=self.use_gpu, coarse_use_small=self.use_small,
+            fine_use_gpu=self.use_gpu, fine_use_small=self.use_small,
+            codec_use_gpu=self.use_gpu)
+        if self.model_store is not None:
+            self._share_models(skip=shared)
+        return generate_audio, SAMPLE_RATE
+
+    def _store_entry(self, key):
+        """子模型在共享存储中的 (名称, 源权重文件)"""
+        from bark import generation
+        suffix = '_small' if self.use_small else ''
+        source = None
+        if key != 'codec' and hasattr(generation, '_get_ckpt_path'):
+            source = generation._get_ckpt_path(key, self.use_small)
+        return f"bark_{key}{suffix}", source
+
+    def _load_shared_models(self):
+        """
+        共享存储中已有的子模型直接从内存映射构造并放入 Bark 的模型表，
+        preload_models 随后只加载缺少的部分，返回已构造的子模型名
+        """
+        from bark import generation
+        shared = set()
+        for key in ('text', 'coarse', 'fine', 'codec'):
+            if key in generation.models:
+                continue
+            entry = self.model_store.load(*self._store_entry(key))
+            if entry is not None:
+                generation.models[key] = entry
+                shared.add(key)
+        return shared
+
+    def _share_models(self, skip=()):
+        """把 Bark 各子模型的参数换成共享存储的内存映射，多个工作进程共用一份权重"""
+        from bark import generation
+        for key, entry in generation.models.items():
+            if key in skip:
+                continue
+            # text 子模型是 {'model', 'tokenizer'}，整体保存骨架，之后连同分词器一起直接构造
+            if not any(hasattr(module, 'state_dict')
+                       for module in (entry.values() if isinstance(entry, dict) else [entry])):
+                continue
+            name, source = self._store_entry(key)
+            self.model_store.share(name, entry, source)
+
+    def load(self):
+        """预加载模型（只执行一次），返回加载耗时（秒）"""
+        with self._load_lock:
+            if not self.loaded:
+                print("[TTS] 加载 Bark 模型...")
+                start = time.perf_counter()
+                with span('tts_load'):
+                    generate, sample_rate = self._load_models()
+                self.load_time = time.perf_counter() - start
+                self.sample_rate = sample_rate
+                self._generate = generate
+                print(f"[TTS] 模型加载完成，耗时 {self.load_time:.2f}s")
+        return self.load_time
+
+    def synthesize(self, text):
+        """同步合成一段文本（单次 generate_audio），返回音频数组"""
+        self.load()
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(text, self.voice_preset, self.model_version)
+            audio_array = self.cache.get(cache_key)
+            if audio_array is not None:
+                print(f"[TTS] 缓存命中，{len(text)} 字")
+                return audio_array
+
+        start = time.perf_counter()
+        with span('tts_generate'):
+            audio_array = self._generate(text, history_prompt=self.voice_preset)
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self.synth_count += 1
+            self.synth_time += elapsed
+        print(f"[TTS] 合成完成，{len(text)} 字，耗时 {elapsed:.2f}s")
+
+        if cache_key is not None:
+            self.cache.put(cache_key, audio_array)
+        return audio_array
+
+    def submit(self, text):
+        """提交到合成线程池，返回 Future"""
+        return self._executor.submit(self.synthesize, text)
+
+    async def synthesize_async(self, text):
+        """在合成线程池中执行，供异步接口 await"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.synthesize, text)
+
+    def synthesize_text(self, text, max_cost=None, crossfade_ms=None):
+        """
+        合成任意长度的文本：按句切分，线程池并行合成各片段，再交叉淡化拼接
+
+        Args:
+            text (str): 输入文本
+            max_cost (int, optional): 单个片段的最大朗读长度
+            crossfade_ms (int, optional): 拼接处交叉淡化时长
+
+        Returns:
+            np.ndarray: 拼接后的音频
+        """
+        crossfade_ms = crossfade_ms if crossfade_ms is not None else TTS_SEGMENT['crossfade_ms']
+        self.load()
+        chunks = split_sentences(text, max_cost)
+        start = time.perf_counter()
+        # 调用方线程只负责分发与拼接，不占用合成线程池
+        audio_chunks = [f.result() for f in [self.submit(c) for c in chunks]]
+        audio_array = crossfade_concat(audio_chunks, self.sample_rate, crossfade_ms)
+        elapsed = time.perf_counter() - start
+        duration = len(audio_array) / self.sample_rate
+        print(f"[TTS] 分段合成完成，{len(chunks)} 段，音频 {duration:.1f}s，"
+              f"耗时 {elapsed:.2f}s，实时率 {duration / elapsed if elapsed else 0:.2f}x")
+        return audio_array
+
+    def tts_artifact(self, text_path, output_path=None):
+        """读取文本文件并合成，返回内存中的 AudioArtifact；output_path 只是默认写出位置，需要时才写"""
+        with open(text_path, 'r', encoding='utf-8') as f:
+            text = f.read().strip()
+        return AudioArtifact(self.synthesize_text(text), self.sample_rate, path=output_path)
+
+    def tts_file(self, text_path, output_path):
+        """读取文本文件，合成后写入单个 WAV"""
+        self.tts_artifact(text_path, output_path).to_file()
+
+    async def tts_file_async(self, text_path, output_path):
+        # 分段任务由 tts_file 提交到合成线程池，协调本身放在默认线程池，避免自我死锁
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.tts_file, text_path, output_path)
+
+    def stats(self):
+        """返回加载耗时与合成耗时统计"""
+        with self._stats_lock:
+            return {
+                'loaded': self.loaded,
+                'load_time': self.load_time,
+                'synth_count': self.synth_count,
+                'synth_time': self.synth_time,
+                'avg_synth_time': self.synth_time / self.synth_count if self.synth_count else None,
+                'cache': self.cache.stats() if self.cache is not None else None,
+                'model_store': self.model_store.stats() if self.model_store is not None else None,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_tts_engine():
+    """获取进程级共享的 TTS 引擎"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = TTSEngine()
+        return _engine
+
+
+def set_tts_engine(engine):
+    """替换进程级共享的 TTS 引擎，返回旧引擎"""
+    global _engine
+    with _engine_lock:
+        old, _engine = _engine, engine
+        return old
+
+
 def tts(text_path, output_path):
-    from bark import SAMPLE_RATE, generate_audio
-    import soundfile as sf
-    with open(text_path, 'r', encoding='utf-8') as f:
-        text = f.read().strip()
-    audio_array = generate_audio(text)
-    sf.write(output_path, audio_array, SAMPLE_RATE)
+    get_tts_engine().tts_file(text_path, output_path)
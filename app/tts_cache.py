@@ -0,0 +1,131 @@
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+from app.config import TTS_CACHE
+
+
+def normalize_text(text):
+    """规范化文本：统一全角/半角并折叠空白，使等价文本命中同一缓存"""
+    text = unicodedata.normalize('NFKC', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class TTSCache:
+    """
+    磁盘上的 TTS 音频缓存，内容寻址 + LRU 淘汰
+
+    键由规范化文本、voice preset 和模型版本计算得到；每个条目保存为一个 .npy 文件，
+    文件的 mtime 记录最近访问时间，重启后据此恢复 LRU 顺序。
+
+    Args:
+        cache_dir (str, optional): 缓存目录
+        max_bytes (int, optional): 缓存总大小上限
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or TTS_CACHE['cache_dir']
+        self.max_bytes = max_bytes if max_bytes is not None else TTS_CACHE['max_bytes']
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> 文件大小，按访问时间从旧到新
+        self._total_bytes = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npy'):
+                st = os.stat(os.path.join(self.cache_dir, name))
+                files.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    @staticmethod
+    def make_key(text, voice_preset, model_version):
+        payload = '\0'.join([normalize_text(text), voice_preset or '', model_version])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npy")
+
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        path = self._path(key)
+        try:
+            audio = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            # 文件被外部删除或损坏，按未命中处理
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+                self.hits -= 1
+                self.misses += 1
+            return None
+        return audio
+
+    def put(self, key, audio):
+        """写入缓存（原子替换），必要时淘汰最久未使用的条目"""
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, np.asarray(audio, dtype=np.float32))
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                self.evictions += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache():
+    """获取进程级共享的 TTS 缓存，未启用时返回 None"""
+    global _cache
+    if not TTS_CACHE['enabled']:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache()
+        return _cache
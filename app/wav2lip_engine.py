@@ -0,0 +1,262 @@
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from app.artifacts import audio_artifact, audio_file, image_artifact
+from app.avatar_cache import get_avatar_cache
+from app.frame_sink import make_frame_sink
+from app.metrics import span
+from app.config import WAV2LIP_DIR, WAV2LIP_ENGINE, WAV2LIP_MODEL_PATH
+
+# 与 Wav2Lip inference.py 相同：每个视频帧对应 16 个 mel 帧（80 个/秒）的窗口
+MEL_STEP_SIZE = 16
+
+_import_lock = threading.Lock()
+
+
+def mel_chunks(mel, fps):
+    """按 Wav2Lip inference.py 的方式把 mel 频谱切成逐帧窗口，最后一个窗口与末尾对齐"""
+    chunks = []
+    mel_idx_multiplier = 80. / fps
+    i = 0
+    while True:
+        start_idx = int(i * mel_idx_multiplier)
+        if start_idx + MEL_STEP_SIZE > len(mel[0]):
+            chunks.append(mel[:, len(mel[0]) - MEL_STEP_SIZE:])
+            break
+        chunks.append(mel[:, start_idx:start_idx + MEL_STEP_SIZE])
+        i += 1
+    return chunks
+
+
+class Wav2LipEngine:
+    """
+    静态形象的 Wav2Lip 常驻推理引擎
+
+    官方 inference.py 每次调用都要启动进程、加载 Wav2Lip 和 S3FD 人脸检测模型、检测人脸，
+    再写出 AVI 并用 ffmpeg 重新编码。单张图片的所有帧共用同一个人脸区域，这里模型只加载一次，
+    人脸检测与裁剪按图片内容哈希缓存（形象缓存），人脸输入只构造一次，mel 窗口按大批量推理，
+    生成的帧经帧输出直接编码。逐帧的模型输入、输出与贴回方式与 inference.py 相同。
+
+    Args:
+        model_path (str): Wav2Lip 权重路径
+        wav2lip_dir (str, optional): Wav2Lip 代码目录（inference.py 所在目录）
+        device (str, optional): 推理设备，默认自动选择
+        batch_size (int, optional): 每批推理的帧数
+        avatar_cache (AvatarCache, optional): 人脸裁剪缓存，默认使用进程级共享缓存
+    """
+
+    def __init__(self, model_path=WAV2LIP_MODEL_PATH, wav2lip_dir=WAV2LIP_DIR, device=None, batch_size=None,
+                 avatar_cache=None):
+        self.model_path = os.path.abspath(model_path)
+        self.wav2lip_dir = os.path.abspath(wav2lip_dir)
+        self.device = device or WAV2LIP_ENGINE['device']
+        self.batch_size = batch_size or WAV2LIP_ENGINE['batch_size']
+        self.pads = list(WAV2LIP_ENGINE['pads'])
+        self.img_size = WAV2LIP_ENGINE['img_size']
+        self.avatar_cache = avatar_cache
+
+        self.load_time = None
+        self.load_error = None
+        self.render_count = 0
+        self.frame_count = 0
+        self.prepare_time = 0.0
+        self.infer_time = 0.0
+
+        self._models = None
+        self._load_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._models is not None
+
+    def _load_models(self):
+        import torch
+        with _import_lock:
+            if self.wav2lip_dir not in sys.path:
+                sys.path.insert(0, self.wav2lip_dir)
+            import audio
+            import face_detection
+            from models import Wav2Lip
+
+        device = self.device
+        if device == 'auto':
+            device = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+        checkpoint = torch.load(self.model_path, map_location=lambda storage, loc: storage)
+        state_dict = {k.replace('module.', ''): v for k, v in checkpoint["state_dict"].items()}
+        model = Wav2Lip()
+        model.load_state_dict(state_dict)
+        model = model.to(device).eval()
+        # 人脸检测模型只在形象缓存未命中时使用，按需加载
+        return {
+            'torch': torch,
+            'device': device,
+            'model': model,
+            'audio': audio,
+            'face_detection': face_detection,
+            'detector': None,
+        }
+
+    def load(self):
+        """加载模型（只执行一次），返回加载耗时（秒）；加载失败时记录并重新抛出异常"""
+        with self._load_lock:
+            if self.load_error is not None:
+                raise self.load_error
+            if not self.loaded:
+                for path, what in ((self.model_path, "模型权重"), (self.wav2lip_dir, "Wav2Lip 目录")):
+                    if not os.path.exists(path):
+                        self.load_error = FileNotFoundError(f"{what}未找到: {path}")
+                        raise self.load_error
+                print("[Wav2Lip] 加载模型...")
+                start = time.perf_counter()
+                try:
+                    with span('wav2lip_load'):
+                        self._models = self._load_models()
+                except Exception as e:
+                    self.load_error = e
+                    raise
+                self.load_time = time.perf_counter() - start
+                print(f"[Wav2Lip] 模型加载完成，耗时 {self.load_time:.2f}s")
+        return self.load_time
+
+    def _detector(self):
+        m = self._models
+        with self._load_lock:
+            if m['detector'] is None:
+                fd = m['face_detection']
+                m['detector'] = fd.FaceAlignment(fd.LandmarksType._2D, flip_input=False, device=m['device'])
+            return m['detector']
+
+    def prepare_face(self, image):
+        """检测人脸并按 pads 扩展、裁剪，返回原图、人脸坐标和缩放到模型输入尺寸的人脸"""
+        import cv2
+        image = image_artifact(image)
+        frame = image.array()
+        rect = self._detector().get_detections_for_batch(np.array([frame]))[0]
+        if rect is None:
+            raise RuntimeError(f"未在图片中检测到人脸: {image.path}")
+        pady1, pady2, padx1, padx2 = self.pads
+        y1 = max(0, rect[1] - pady1)
+        y2 = min(frame.shape[0], rect[3] + pady2)
+        x1 = max(0, rect[0] - padx1)
+        x2 = min(frame.shape[1], rect[2] + padx2)
+        # inference.py 先把坐标放进整数数组再平滑，单帧时平滑结果即原坐标
+        y1, y2, x1, x2 = (int(v) for v in (y1, y2, x1, x2))
+        face = cv2.resize(frame[y1:y2, x1:x2], (self.img_size, self.img_size))
+        return {'frame': frame, 'coords': (y1, y2, x1, x2), 'face': face}
+
+    def get_face(self, image):
+        """按图片内容哈希 + pads 查询形象缓存，未命中时检测人脸并写入缓存（image 为路径或 ImageArtifact）"""
+        image = image_artifact(image)
+        cache = self.avatar_cache or get_avatar_cache()
+        key = cache.make_key(image.sha256(), ','.join(map(str, self.pads)), 'wav2lip')
+        return cache.get_or_create(key, lambda: self.prepare_face(image))
+
+    def _mel_chunks(self, audio, fps):
+        # AudioArtifact 的 16kHz 数组与 audio.load_wav(path, 16000)（librosa.load）读写出的文件逐样本一致
+        mel = self._models['audio'].melspectrogram(audio_artifact(audio).samples(16000))
+        if np.isnan(mel.reshape(-1)).sum() > 0:
+            raise ValueError("mel 频谱包含 NaN，如使用 TTS 音频请在末尾补少量静音后重试")
+        return mel_chunks(mel, fps)
+
+    def _face_input(self, face, count):
+        """模型的人脸输入：下半脸置零的人脸与原人脸按通道拼接；静态形象各帧相同，构造一次按批复用"""
+        img_batch = np.repeat(face[None], count, axis=0)
+        img_masked = img_batch.copy()
+        img_masked[:, self.img_size // 2:] = 0
+        return np.concatenate((img_masked, img_batch), axis=3) / 255.
+
+    def _infer(self, img_batch, mel_batch):
+        """一批推理，返回 0~255 的口型区域（N, H, W, 3）"""
+        m = self._models
+        torch = m['torch']
+        img_batch = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(m['device'])
+        mel_batch = torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(m['device'])
+        with torch.no_grad():
+            pred = m['model'](mel_batch, img_batch)
+        return pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
+
+    def _predictions(self, face, chunks):
+        """按 batch_size 分批推理全部 mel 窗口，逐帧产出口型区域"""
+        face_input = self._face_input(face, min(self.batch_size, len(chunks)))
+        for start in range(0, len(chunks), self.batch_size):
+            mel_batch = np.asarray(chunks[start:start + self.batch_size])
+            mel_batch = np.reshape(mel_batch, [len(mel_batch), mel_batch.shape[1], mel_batch.shape[2], 1])
+            yield from self._infer(face_input[:len(mel_batch)], mel_batch)
+
+    def render(self, image_path, audio_path, output_path, fps=25, sink_options=None):
+        """
+        生成口型同步视频，sink_options 为覆盖 FRAME_SINK 的编码参数
+
+        image_path / audio_path 也可以是 ImageArtifact / AudioArtifact，人脸检测与 mel 频谱直接使用内存数据。
+
+        Returns:
+            dict: 本次渲染的耗时统计
+        """
+        import cv2
+        self.load()
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+        audio = audio_artifact(audio_path)
+        start = time.perf_counter()
+        with span('wav2lip_prepare'):
+            avatar = self.get_face(image_path)
+            chunks = self._mel_chunks(audio, fps)
+        prepare_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        y1, y2, x1, x2 = avatar['coords']
+        # 推理与编码交替进行，该区间包含写出耗时
+        with span('wav2lip_infer'), make_frame_sink(output_path, fps, audio_file(audio),
+                                                     **(sink_options or {})) as sink:
+            for pred in self._predictions(avatar['face'], chunks):
+                frame = avatar['frame'].copy()
+                frame[y1:y2, x1:x2] = cv2.resize(pred.astype(np.uint8), (x2 - x1, y2 - y1))
+                sink.write(frame)
+        infer_time = time.perf_counter() - start
+
+        num_frames = len(chunks)
+        with self._stats_lock:
+            self.render_count += 1
+            self.frame_count += num_frames
+            self.prepare_time += prepare_time
+            self.infer_time += infer_time
+        print(f"[Wav2Lip] 渲染完成 {output_path}: {num_frames} 帧，预处理 {prepare_time:.2f}s，"
+              f"推理与写出 {infer_time:.2f}s")
+        return {
+            'frames': num_frames,
+            'prepare_time': prepare_time,
+            'infer_time': infer_time,
+            'infer_time_per_frame': infer_time / num_frames if num_frames else 0,
+        }
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'loaded': self.loaded,
+                'load_time': self.load_time,
+                'load_error': str(self.load_error) if self.load_error else None,
+                'render_count': self.render_count,
+                'frame_count': self.frame_count,
+                'prepare_time': self.prepare_time,
+                'infer_time': self.infer_time,
+                'infer_time_per_frame': self.infer_time / self.frame_count if self.frame_count else None,
+            }
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_wav2lip_engine(model_path=WAV2LIP_MODEL_PATH):
+    """获取（必要时创建）指定权重的进程级共享引擎，不会触发模型加载"""
+    key = os.path.abspath(model_path)
+    with _engines_lock:
+        if key not in _engines:
+            _engines[key] = Wav2LipEngine(model_path)
+        return _engines[key]
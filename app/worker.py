@@ -0,0 +1,189 @@
+import argparse
+import os
+import socket
+import threading
+import uuid
+
+from app.config import CPU_SLOTS, JOB_STORE, MUSETALK_ENGINE
+from app.cpu_slots import pin_worker
+from app.job_queue import Job, QueueFullError
+from app.job_store import get_job_store
+from app.musetalk_engine import close_engine_loading, warmup_engines
+from app.quality import upgrade_job
+from app.render import render_job
+from app.streaming import render_stream
+
+# 任务类型 -> 处理函数；处理函数参数为 Job，返回值记录为任务结果
+WORKER_HANDLERS = {
+    'render': render_job,
+    'stream': render_stream,
+}
+
+
+class LeasedJob(Job):
+    """从任务库领取的任务：进度和附加信息在本地记录的同时写回任务库"""
+
+    def __init__(self, store, record, worker_id):
+        super().__init__(record['task_id'], record['params'])
+        self.store = store
+        self.worker_id = worker_id
+        self.created_at = record['created_at']
+        self.info = dict(record['info'])
+        self.lost = False  # 租约已被回收，本节点的结果不再写回，后续阶段也不再执行（见 Job.check_lease）
+        self.update(status='running')
+
+    def update(self, status=None, stage=None, progress=None, error=None, result=None):
+        super().update(status, stage, progress, error, result)
+        if stage is not None or progress is not None:
+            self._sync(self.store.update(self.task_id, self.worker_id, stage=stage, progress=progress))
+
+    def set_info(self, **info):
+        super().set_info(**info)
+        self._sync(self.store.update(self.task_id, self.worker_id, info=dict(self.info)))
+
+    def _sync(self, owned):
+        if not owned and not self.lost:
+            self.lost = True
+            print(f"[WORKER] {self.task_id} lease lost, stopping before the next stage")
+
+
+class Worker:
+    """
+    工作节点：从任务库领取任务、执行并写回结果
+
+    执行期间后台线程按 heartbeat_interval 续约；进程崩溃时不再续约，租约过期后
+    任务由任务库重新排队给其它节点。
+
+    Args:
+        store: 任务库（见 app.job_store）
+        handlers (dict, optional): 任务类型 -> 处理函数，默认 WORKER_HANDLERS
+        kinds (list, optional): 只领取这些类型的任务，默认为 handlers 中的全部类型
+        worker_id (str, optional): 节点标识，默认由主机名、进程号和随机串组成
+        followup (callable, optional): 任务完成后调用，返回需要接着排队的任务或 None，
+            默认为预览任务排队完整渲染（见 app.quality.upgrade_job）
+    """
+
+    def __init__(self, store, handlers=None, kinds=None, worker_id=None,
+                 heartbeat_interval=None, poll_interval=None, followup=upgrade_job):
+        self.store = store
+        self.handlers = handlers if handlers is not None else WORKER_HANDLERS
+        self.kinds = list(kinds) if kinds else list(self.handlers)
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.heartbeat_interval = heartbeat_interval if heartbeat_interval is not None else JOB_STORE['heartbeat_interval']
+        self.poll_interval = poll_interval if poll_interval is not None else JOB_STORE['poll_interval']
+        self.followup = followup
+        self.processed = 0
+        self.failed = 0
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _heartbeat(self, job, done):
+        while not done.wait(self.heartbeat_interval):
+            job._sync(self.store.heartbeat(job.task_id, self.worker_id))
+
+    def run_once(self):
+        """
+        领取并执行一个任务
+
+        Returns:
+            LeasedJob or None: 执行过的任务，没有可领取的任务时返回 None
+        """
+        record = self.store.claim(self.worker_id, self.kinds)
+        if record is None:
+            return None
+        job = LeasedJob(self.store, record, self.worker_id)
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), daemon=True)
+        heartbeat.start()
+        try:
+            result = self.handlers[record['kind']](job)
+        except Exception as e:
+            print(f"[WORKER] {job.task_id} failed: {e}")
+            job.update(status='failed', error=str(e))
+            self.failed += 1
+            done.set()
+            self.store.fail(job.task_id, self.worker_id, str(e), job.spans)
+        else:
+            job.update(status='done', progress=1.0, result=result)
+            self.processed += 1
+            done.set()
+            if not self.store.complete(job.task_id, self.worker_id, result, job.spans):
+                print(f"[WORKER] {job.task_id} finished after its lease expired, result discarded")
+            elif self.followup is not None:
+                self._enqueue_followup(job, record['kind'])
+        job.release_artifacts()
+        heartbeat.join()
+        return job
+
+    def _enqueue_followup(self, job, kind):
+        next_job = self.followup(job)
+        if next_job is None:
+            return
+        # 后续任务可能由其它节点领取，内存中的中间结果需先写到各自的路径
+        for artifact in next_job.artifacts.values():
+            artifact.to_file()
+        next_job.release_artifacts()
+        try:
+            self.store.enqueue(next_job.task_id, kind, next_job.params, info=next_job.info,
+                               replace=next_job.task_id == job.task_id)
+        except QueueFullError:
+            print(f"[WORKER] {job.task_id} follow-up rejected, queue full")
+
+    def run(self, index=0):
+        """循环领取任务直到 stop()"""
+        if CPU_SLOTS['enabled']:
+            pin_worker('worker', index)
+        print(f"[WORKER] {self.worker_id} started, kinds={self.kinds}")
+        while not self._stop.is_set():
+            try:
+                job = self.run_once()
+            except Exception as e:
+                # 任务库暂时不可用等情况，稍后重试
+                print(f"[WORKER] {self.worker_id} poll failed: {e}")
+                job = None
+            if job is None:
+                self._stop.wait(self.poll_interval)
+
+    def start(self, threads=1):
+        """在后台线程中运行，threads 为同时执行的任务数"""
+        self._stop.clear()
+        for index in range(threads):
+            thread = threading.Thread(target=self.run, args=(index,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def join(self):
+        for thread in list(self._threads):
+            thread.join()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if wait:
+            self.join()
+        self._threads = []
+
+    def stats(self):
+        return {'worker_id': self.worker_id, 'kinds': self.kinds, 'threads': len(self._threads),
+                'processed': self.processed, 'failed': self.failed}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="工作节点：从共享任务库领取并渲染任务")
+    parser.add_argument('--kinds', type=str, nargs='+', default=None, help="只领取这些类型的任务（render / stream）")
+    parser.add_argument('--threads', type=int, default=1, help="同时执行的任务数")
+    args = parser.parse_args()
+
+    store = get_job_store()
+    if store is None:
+        raise SystemExit("JOB_STORE['backend'] 为 'local'，没有可领取任务的共享任务库")
+    if MUSETALK_ENGINE['mode'] == 'engine' and MUSETALK_ENGINE['preload_on_startup']:
+        # MUSETALK_ENGINE['preload_engines'] 中的每个组合，预热失败的回退到子进程方式
+        warmup_engines()
+    # MuseTalk 加载需要切换工作目录，渲染线程启动后不再加载
+    close_engine_loading()
+    worker = Worker(store, kinds=args.kinds).start(args.threads)
+    try:
+        worker.join()
+    except KeyboardInterrupt:
+        worker.stop(wait=False)
@@ -1,50 +1,210 @@
 import os
+import json
+import time
 import argparse
-from app.tts import tts
-from app.musetalk_sync import musetalk_sync
-from app.av_merge import merge
-# from app.lip_sync import lip_sync  # 已切换为 MuseTalk
-from app.config import WAV2LIP_MODEL_PATH, MUSETALK_DIR, MUSETALK_VERSION, MUSETALK_INFERENCE
+from concurrent.futures import FIRST_COMPLETED, wait
+from app.tts import get_tts_engine
+from app.musetalk_engine import close_engine_loading, get_musetalk_engine, musetalk_engine_stats
+from app.job_queue import Job
+from app.job_cost import estimate_job, job_priority
+from app.quality import upgrade_job
+from app.io_stats import WriteMeter
+from app.render import RENDER_STAGES, render_job, render_stage_config
+from app.scheduler import Stage, StageScheduler
+from app.cpu_slots import stage_pinner
+from app.config import (WAV2LIP_MODEL_PATH, MUSETALK_DIR, MUSETALK_VERSION, MUSETALK_INFERENCE, MUSETALK_ENGINE,
+                        MUSETALK_BACKEND, QUALITY, CPU_SLOTS, COST_MODEL)
+
+
+def make_job(text_path, image_path, output_dir, model_path, use_musetalk=True,
+             musetalk_dir=MUSETALK_DIR, musetalk_version=MUSETALK_VERSION,
+             bbox_shift=MUSETALK_INFERENCE['bbox_shift'],
+             use_float16=MUSETALK_INFERENCE['use_float16'],
+             fps=MUSETALK_INFERENCE['fps'],
+             musetalk_mode=MUSETALK_ENGINE['mode'],
+             musetalk_backend=MUSETALK_BACKEND['backend'],
+             quality=QUALITY['default']):
+    """构造一个输出到 output_dir 的渲染任务（文件命名与原流水线一致）"""
+    os.makedirs(output_dir, exist_ok=True)
+    return Job(os.path.basename(os.path.normpath(output_dir)), {
+        'items': [{
+            'task_id': None,
+            'text_path': text_path,
+            'image_path': image_path,
+            'bbox_shift': bbox_shift,
+            'tts_path': os.path.join(output_dir, 'tts_output.wav'),
+            'video_path': os.path.join(output_dir, 'musetalk_output.mp4'),
+            'final_path': os.path.join(output_dir, 'final_output.mp4'),
+        }],
+        'lip_model': 'musetalk' if use_musetalk else 'wav2lip',
+        'model_path': model_path,
+        'musetalk_dir': musetalk_dir,
+        'musetalk_version': musetalk_version,
+        'use_float16': use_float16,
+        'fps': fps,
+        'use_engine': musetalk_mode == 'engine',
+        'musetalk_backend': musetalk_backend,
+        'quality': quality,
+    })
 
 
 def main(text_path, image_path, output_dir, model_path, use_musetalk=True,
          musetalk_dir=MUSETALK_DIR, musetalk_version=MUSETALK_VERSION,
          bbox_shift=MUSETALK_INFERENCE['bbox_shift'],
          use_float16=MUSETALK_INFERENCE['use_float16'],
-         fps=MUSETALK_INFERENCE['fps']):
-    os.makedirs(output_dir, exist_ok=True)
-    tts_out = os.path.join(output_dir, 'tts_output.wav')
-    video_out = os.path.join(output_dir, 'musetalk_output.mp4')
-    final_out = os.path.join(output_dir, 'final_output.mp4')
+         fps=MUSETALK_INFERENCE['fps'],
+         musetalk_mode=MUSETALK_ENGINE['mode'], report_path=None,
+         musetalk_backend=MUSETALK_BACKEND['backend'], quality=QUALITY['default']):
+    job = make_job(text_path, image_path, output_dir, model_path, use_musetalk,
+                   musetalk_dir, musetalk_version, bbox_shift, use_float16, fps, musetalk_mode,
+                   musetalk_backend, quality)
 
-    print("[PIPELINE] 步骤1：文本转语音 (TTS)")
-    tts(text_path, tts_out)
-    print("[PIPELINE] 步骤2：口型视频生成")
+    # 流水线初始化时预加载 Bark，单独统计加载耗时
+    tts_engine = get_tts_engine()
+    tts_engine.load()
 
     if use_musetalk:
         print(f"[PIPELINE] 使用 MuseTalk {musetalk_version}")
         print(
-            f"[PIPELINE] 参数: bbox_shift={bbox_shift}, use_float16={use_float16}, fps={fps}")
-        musetalk_sync(image_path, tts_out, video_out,
-                      musetalk_dir=musetalk_dir,
-                      version=musetalk_version,
-                      bbox_shift=bbox_shift,
-                      use_float16=use_float16,
-                      fps=fps)
+            f"[PIPELINE] 参数: bbox_shift={bbox_shift}, use_float16={use_float16}, fps={fps}, backend={musetalk_backend}, "
+            f"quality={quality}")
     else:
         print("[PIPELINE] 使用 Wav2Lip")
-        from app.lip_sync import lip_sync
-        lip_sync(image_path, tts_out, video_out, model_path)
 
-    print("[PIPELINE] 步骤3：音视频合成 (ffmpeg)")
-    merge(video_out, tts_out, final_out)
+    start = time.perf_counter()
+    preview_time = None
+    with WriteMeter() as meter:
+        final_out = render_job(job)
+        # preview：预览视频已可播放，沿用其 TTS 音频以完整画质重渲染并覆盖同一路径
+        upgrade = upgrade_job(job)
+        if upgrade is not None:
+            preview_time = time.perf_counter() - start
+            print(f"[PIPELINE] 预览完成（{preview_time:.2f}s）: {final_out}，开始完整画质渲染")
+            final_out = render_job(upgrade)
+            job.spans.extend(upgrade.spans)
+    total_time = time.perf_counter() - start
+    if meter.result is not None:
+        print(f"[PIPELINE] 写出 {meter.result / 1e6:.1f}MB（含 ffmpeg / MuseTalk 子进程）")
+    print(f"[PIPELINE] TTS 统计: {tts_engine.stats()}")
+    if use_musetalk and musetalk_mode == 'engine':
+        print(f"[PIPELINE] MuseTalk 引擎统计: {musetalk_engine_stats()}")
+    write_report(report_path or os.path.join(output_dir, "timing_report.json"), {
+        'final_video': final_out,
+        'total_time': total_time,
+        'preview_time': preview_time,
+        'bytes_written': meter.result,
+        'spans': job.spans,
+        'tts': tts_engine.stats(),
+        'musetalk': musetalk_engine_stats() if use_musetalk and musetalk_mode == 'engine' else None,
+    })
     print(f"[PIPELINE] 全部完成！最终视频: {final_out}")
+    return final_out
+
+
+def write_report(report_path, report):
+    """把各阶段耗时（含子进程耗时与峰值内存）写成 JSON 报告"""
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+    print(f"[PIPELINE] 耗时报告: {report_path}")
+
+
+def preload_musetalk(params):
+    """
+    多个工作线程开始渲染前加载 MuseTalk 常驻引擎（加载期间需切换工作目录），之后不再加载；
+    引擎不可用时口型阶段回退到子进程方式
+    """
+    if params['lip_model'] == 'musetalk' and params['use_engine']:
+        engine = get_musetalk_engine(params['musetalk_version'], params['musetalk_dir'], params['use_float16'],
+                                     params['musetalk_backend'])
+        try:
+            engine.load()
+        except Exception as e:
+            print(f"[PIPELINE] MuseTalk 常驻引擎不可用，回退到子进程方式: {e}")
+    close_engine_loading()
+
+
+def main_many(text_paths, image_path, output_dir, model_path, report_path=None, **kwargs):
+    """
+    批量渲染多个文本，各任务的 TTS、口型和合成阶段流水线并行执行
+
+    每个文本输出到 output_dir/<文本文件名>/，各阶段的工作线程数与队列容量见 PIPELINE_STAGES
+    （启用 MUSETALK_BATCH 时口型阶段的工作线程数见 render_stage_config）。
+    COST_MODEL['shortest_first'] 为 True 时排队的任务按预计耗时短作业优先。
+    preview 档位的任务完成预览后，与 main 一样接着提交完整画质渲染（upgrade_job）。
+    返回各阶段的利用率报告，并与各任务的耗时一起写入 JSON 报告。
+    """
+    tts_engine = get_tts_engine()
+    tts_engine.load()
+
+    stage_config = render_stage_config()
+    scheduler = StageScheduler([
+        Stage(name, fn, stage_config[name].get('workers', 1), stage_config[name].get('queue_size', 0),
+              job_priority if index == 0 and COST_MODEL['shortest_first'] else None)
+        for index, (name, fn) in enumerate(RENDER_STAGES)
+    ], init_worker=stage_pinner(stage_config) if CPU_SLOTS['enabled'] else None)
+    pending = []
+    for text_path in text_paths:
+        job_dir = os.path.join(output_dir, os.path.splitext(os.path.basename(text_path))[0])
+        job = make_job(text_path, image_path, job_dir, model_path, **kwargs)
+        estimate = estimate_job(job)
+        if estimate is not None:
+            job.set_info(estimate=estimate)
+        pending.append((text_path, job))
+    if pending:
+        preload_musetalk(pending[0][1].params)
+    start = time.perf_counter()
+    futures = {}
+    jobs = []
+    for text_path, job in pending:
+        entry = {'text': text_path, 'final_video': None, 'preview_time': None, 'spans': job.spans}
+        jobs.append(entry)
+        # 第一个阶段队列满时在此阻塞
+        futures[scheduler.submit(job)] = (entry, job)
+
+    failed = 0
+    while futures:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            entry, job = futures.pop(future)
+            if job.spans is not entry['spans']:
+                entry['spans'].extend(job.spans)
+            try:
+                entry['final_video'] = future.result()
+            except Exception as e:
+                failed += 1
+                job.release_artifacts()
+                print(f"[PIPELINE] 失败 {entry['text']}: {e}")
+                continue
+            # preview：预览视频已可播放，沿用其 TTS 音频以完整画质重渲染并覆盖同一路径
+            upgrade = upgrade_job(job)
+            job.release_artifacts()
+            if upgrade is not None:
+                entry['preview_time'] = time.perf_counter() - start
+                print(f"[PIPELINE] 预览完成 {entry['text']}: {entry['final_video']}，开始完整画质渲染")
+                futures[scheduler.submit(upgrade)] = (entry, upgrade)
+            else:
+                print(f"[PIPELINE] 完成 {entry['text']}: {entry['final_video']}")
+    report = scheduler.report()
+    scheduler.shutdown()
+
+    print("[PIPELINE] 各阶段利用率:")
+    for name, stage in report.items():
+        print(f"[PIPELINE]   {name}: workers={stage['workers']} processed={stage['processed']} "
+              f"busy={stage['busy_time']:.1f}s utilization={stage['utilization']:.0%}")
+    write_report(report_path or os.path.join(output_dir, "timing_report.json"), {
+        'stages': report,
+        'jobs': jobs,
+        'tts': tts_engine.stats(),
+    })
+    print(f"[PIPELINE] 全部完成！成功 {len(text_paths) - failed} 个，失败 {failed} 个")
+    return report
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="数字人口型视频一键流水线")
-    parser.add_argument('--text', type=str,
-                        default="input/input_text.txt", help="输入文本文件路径")
+    parser.add_argument('--text', type=str, nargs='+',
+                        default=["input/input_text.txt"], help="输入文本文件路径，可传多个以流水线方式批量渲染")
     parser.add_argument('--image', type=str,
                         default="input/reference_image.jpg", help="输入图片路径")
     parser.add_argument('--output_dir', type=str,
@@ -63,15 +223,30 @@ if __name__ == "__main__":
                         default=MUSETALK_INFERENCE['use_float16'], help="是否使用半精度推理以节省显存")
     parser.add_argument('--fps', type=int,
                         default=MUSETALK_INFERENCE['fps'], help="生成视频的帧率")
+    parser.add_argument('--musetalk_mode', type=str,
+                        default=MUSETALK_ENGINE['mode'], help="MuseTalk 运行方式[engine|subprocess]")
+    parser.add_argument('--musetalk_backend', type=str,
+                        default=MUSETALK_BACKEND['backend'], help="常驻引擎的推理后端[torch|int8|onnx]，int8 / onnx 用于纯 CPU 部署")
+    parser.add_argument('--quality', type=str,
+                        default=QUALITY['default'], help="画质档位[preview|full]，preview 先输出低清预览再覆盖为完整画质")
+    parser.add_argument('--report', type=str,
+                        default=None, help="耗时报告（JSON）路径，默认为输出目录下的 timing_report.json")
     args = parser.parse_args()
 
     # 根据模型类型选择不同的处理流程
     use_musetalk = args.lip_model.lower() == "musetalk"
 
-    main(args.text, args.image, args.output_dir, args.model,
-         use_musetalk=use_musetalk,
-         musetalk_dir=args.musetalk_dir,
-         musetalk_version=args.musetalk_version,
-         bbox_shift=args.bbox_shift,
-         use_float16=args.use_float16,
-         fps=args.fps)
+    options = dict(use_musetalk=use_musetalk,
+                   musetalk_dir=args.musetalk_dir,
+                   musetalk_version=args.musetalk_version,
+                   bbox_shift=args.bbox_shift,
+                   use_float16=args.use_float16,
+                   fps=args.fps,
+                   musetalk_mode=args.musetalk_mode,
+                   musetalk_backend=args.musetalk_backend,
+                   quality=args.quality,
+                   report_path=args.report)
+    if len(args.text) == 1:
+        main(args.text[0], args.image, args.output_dir, args.model, **options)
+    else:
+        main_many(args.text, args.image, args.output_dir, args.model, **options)
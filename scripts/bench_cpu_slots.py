@@ -0,0 +1,130 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from app.config import (CPU_SLOTS, MUSETALK_BACKEND, MUSETALK_DIR, MUSETALK_INFERENCE, MUSETALK_VERSION,
+                        PIPELINE_STAGES, TTS_ENGINE, WAV2LIP_MODEL_PATH)
+from app.cpu_slots import CpuSlotAllocator, cpu_cores, set_cpu_slots
+from app.musetalk_engine import get_musetalk_engine, register_musetalk_engine
+from app.tts import TTSEngine, get_tts_engine, set_tts_engine
+from scripts.bench_fakes import SyntheticMuseTalkEngine, ToneBarkEngine
+from scripts.benchmark import git_commit, load_workload
+
+
+@contextlib.contextmanager
+def slot_config(slot_size, workers):
+    """临时按槽位大小修改 CPU_SLOTS、TTS 线程池和流水线各阶段的工作线程数"""
+    saved = (dict(CPU_SLOTS), dict(CPU_SLOTS['slot_cores']), TTS_ENGINE['max_workers'],
+             {name: dict(stage) for name, stage in PIPELINE_STAGES.items()})
+    CPU_SLOTS.update(enabled=True, slot_cores={**CPU_SLOTS['slot_cores'], 'bark': slot_size, 'lipsync': slot_size})
+    TTS_ENGINE['max_workers'] = workers
+    PIPELINE_STAGES['lipsync']['workers'] = workers
+    old_allocator = set_cpu_slots(CpuSlotAllocator())
+    try:
+        yield
+    finally:
+        set_cpu_slots(old_allocator)
+        CPU_SLOTS.clear()
+        CPU_SLOTS.update(saved[0])
+        CPU_SLOTS['slot_cores'] = saved[1]
+        TTS_ENGINE['max_workers'] = saved[2]
+        for name, stage in saved[3].items():
+            PIPELINE_STAGES[name].clear()
+            PIPELINE_STAGES[name].update(stage)
+
+
+def main(workload, image_path, slot_sizes, limit=None, output=None, fakes=False, quiet=True,
+         seconds_per_char=0.05, tts_rtf=0.2, frame_cost=0.002):
+    """
+    按不同槽位大小运行同一批文本，比较吞吐（jobs/hour）
+
+    每种槽位大小下，Bark 合成线程与口型工作线程各取一半可分配核心：
+    工作线程数 = 可分配核心数 // (2 × 槽位核心数)，至少为 1。
+    """
+    import pipeline
+
+    texts = load_workload(workload, limit)
+    if not texts:
+        raise ValueError(f"工作负载为空: {workload}")
+    usable = len(cpu_cores()) - min(CPU_SLOTS['reserved_cores'], len(cpu_cores()) - 1)
+    workdir = tempfile.mkdtemp(prefix='avatar_slots_')
+    text_paths = []
+    for i, text in enumerate(texts):
+        text_paths.append(os.path.join(workdir, f"text_{i}.txt"))
+        with open(text_paths[-1], 'w', encoding='utf-8') as f:
+            f.write(text)
+    image_path = os.path.abspath(image_path)
+    cwd = os.getcwd()
+    old_tts = get_tts_engine()
+    results = []
+    try:
+        if fakes:
+            # 替身模式下所有相对路径（output/、cache/）都落在临时目录中
+            os.chdir(workdir)
+            register_musetalk_engine(SyntheticMuseTalkEngine(MUSETALK_VERSION, MUSETALK_DIR,
+                                                             MUSETALK_INFERENCE['use_float16'], frame_cost=frame_cost))
+        else:
+            # MuseTalk 模型与形象预处理不计入吞吐
+            engine = get_musetalk_engine(MUSETALK_VERSION, MUSETALK_DIR, MUSETALK_INFERENCE['use_float16'],
+                                         MUSETALK_BACKEND['backend'])
+            engine.load()
+            engine.get_avatar(image_path, MUSETALK_INFERENCE['bbox_shift'])
+        for slot_size in slot_sizes:
+            workers = max(1, usable // (2 * slot_size))
+            with slot_config(slot_size, workers):
+                # 在槽位配置下重新创建 TTS 引擎，合成线程池按新的线程数和槽位绑定；模型加载不计入吞吐
+                tts_engine = ToneBarkEngine(seconds_per_char=seconds_per_char, rtf=tts_rtf) if fakes else TTSEngine()
+                tts_engine.load()
+                set_tts_engine(tts_engine)
+                log = io.StringIO()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(log if quiet else sys.stdout):
+                    report = pipeline.main_many(text_paths, image_path, os.path.join(workdir, f"slot_{slot_size}"),
+                                                WAV2LIP_MODEL_PATH, musetalk_mode='engine')
+                wall_time = time.perf_counter() - start
+                tts_engine.shutdown(wait=False)
+            result = {
+                'slot_cores': slot_size,
+                'workers': workers,
+                'jobs': len(texts),
+                'wall_time': wall_time,
+                'jobs_per_hour': len(texts) / wall_time * 3600 if wall_time else None,
+                'utilization': {name: stage['utilization'] for name, stage in report.items()},
+            }
+            results.append(result)
+            print(f"[BENCH] 槽位 {slot_size:>2} 核 × {workers} 个工作线程: {wall_time:.1f}s，"
+                  f"{result['jobs_per_hour']:.0f} jobs/hour，口型阶段利用率 {result['utilization']['lipsync']:.0%}")
+    finally:
+        os.chdir(cwd)
+        set_tts_engine(old_tts)
+
+    best = max(results, key=lambda r: r['jobs_per_hour'] or 0)
+    print(f"[BENCH] 可分配核心 {usable} 个，吞吐最高: 槽位 {best['slot_cores']} 核（{best['jobs_per_hour']:.0f} jobs/hour）")
+    report = {'commit': git_commit(), 'timestamp': time.time(), 'workload': workload, 'usable_cores': usable,
+              'fakes': fakes, 'results': results}
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[BENCH] 结果: {output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CPU 槽位大小扫描：比较不同槽位核心数下的渲染吞吐（jobs/hour）")
+    parser.add_argument('--workload', type=str, default="requests.jsonl", help="JSONL 工作负载，每行取 text / body / title")
+    parser.add_argument('--image', type=str, default="input/reference_image.jpg")
+    parser.add_argument('--slot_cores', type=int, nargs='+', default=[2, 4, 8, 16], help="要比较的槽位核心数")
+    parser.add_argument('--limit', type=int, default=None, help="最多使用多少条")
+    parser.add_argument('--output', type=str, default=None, help="结果 JSON 路径")
+    parser.add_argument('--fakes', action='store_true', help="使用替身 TTS / MuseTalk（只验证调度，不代表真实吞吐）")
+    parser.add_argument('--verbose', action='store_true', help="显示流水线日志")
+    args = parser.parse_args()
+
+    main(args.workload, args.image, args.slot_cores, limit=args.limit, output=args.output, fakes=args.fakes,
+         quiet=not args.verbose)
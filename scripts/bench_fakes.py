@@ -0,0 +1,115 @@
+import math
+import struct
+import time
+
+import numpy as np
+
+from app.artifacts import audio_artifact
+from app.config import MUSETALK_DIR, MUSETALK_VERSION
+from app.musetalk_engine import MuseTalkEngine, register_musetalk_engine
+from app.tts import TTSEngine, set_tts_engine
+
+
+class ToneBarkEngine(TTSEngine):
+    """
+    Bark 替身：输出与文本长度成正比的正弦音，合成耗时按实时率模拟
+
+    Args:
+        seconds_per_char (float): 每个字符对应的音频时长
+        rtf (float): 合成耗时 / 音频时长
+        load_cost (float): 模拟的模型加载耗时（秒）
+    """
+
+    def __init__(self, seconds_per_char=0.2, rtf=0.5, load_cost=0.0, **kwargs):
+        kwargs.setdefault('use_cache', False)
+        super().__init__(**kwargs)
+        self.seconds_per_char = seconds_per_char
+        self.rtf = rtf
+        self.load_cost = load_cost
+
+    @property
+    def model_version(self):
+        return 'tone'
+
+    def _load_models(self):
+        time.sleep(self.load_cost)
+        sample_rate = 24000
+
+        def generate(text, history_prompt=None):
+            duration = max(len(text), 1) * self.seconds_per_char
+            time.sleep(duration * self.rtf)
+            t = np.arange(int(duration * sample_rate)) / sample_rate
+            return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+        return generate, sample_rate
+
+
+def _mp4_placeholder(num_frames):
+    """只有 ftyp / moov / mdat 三个顶层 box 的占位文件，moov 在前，合成阶段按 faststart 直接改名"""
+    def box(kind, payload):
+        return struct.pack('>I4s', 8 + len(payload), kind) + payload
+    return box(b'ftyp', b'isom') + box(b'moov', b'') + box(b'mdat', struct.pack('>I', num_frames))
+
+
+class SyntheticMuseTalkEngine(MuseTalkEngine):
+    """
+    MuseTalk 替身：不加载模型，按帧数和单帧耗时模拟推理，生成合成帧
+
+    Args:
+        frame_cost (float): 单帧推理耗时（秒），以 sleep 模拟（与 GPU 推理一样不占用 GIL）
+        load_cost (float): 模拟的模型加载耗时（秒）
+        frame_size (int): 合成帧边长
+        write_mode (str): 'null' 只写占位文件；'sink' 经真实的帧输出调用 ffmpeg 编码
+    """
+
+    def __init__(self, version=MUSETALK_VERSION, musetalk_dir=MUSETALK_DIR, use_float16=None,
+                 frame_cost=0.02, load_cost=0.0, frame_size=256, write_mode='null'):
+        super().__init__(version, musetalk_dir, use_float16)
+        self.frame_cost = frame_cost
+        self.load_cost = load_cost
+        self.frame_size = frame_size
+        self.write_mode = write_mode
+
+    def load(self):
+        with self._load_lock:
+            if not self.loaded:
+                time.sleep(self.load_cost)
+                self._models = {}
+                self.load_time = self.load_cost
+        return self.load_time
+
+    def warmup(self):
+        return self.load()
+
+    def get_avatar(self, image_path, bbox_shift):
+        return {'latent_list': [None]}
+
+    def _audio_chunks(self, audio, fps):
+        return np.zeros((int(math.ceil(audio_artifact(audio).duration * fps)), 1), dtype=np.float32)
+
+    def _infer_frames(self, whisper_chunks, latent_list, frame_indices=None):
+        count = len(whisper_chunks) if frame_indices is None else len(frame_indices)
+        time.sleep(count * self.frame_cost)
+        frame = np.full((self.frame_size, self.frame_size, 3), 128, dtype=np.uint8)
+        return [frame] * count
+
+    def _blend(self, avatar, index, res_frame):
+        return res_frame
+
+    def _write_video(self, avatar, res_frames, audio_path, output_path, fps, sink_options=None):
+        if self.write_mode == 'sink':
+            return super()._write_video(avatar, res_frames, audio_path, output_path, fps, sink_options)
+        with open(output_path, 'wb') as f:
+            f.write(_mp4_placeholder(len(res_frames)))
+
+
+def install_fakes(version=MUSETALK_VERSION, musetalk_dir=MUSETALK_DIR, use_float16=None,
+                  seconds_per_char=0.2, tts_rtf=0.5, frame_cost=0.02, write_mode='null'):
+    """把替身注册为进程级共享的 TTS 引擎和 MuseTalk 引擎，返回 (tts_engine, musetalk_engine)"""
+    tts_engine = ToneBarkEngine(seconds_per_char=seconds_per_char, rtf=tts_rtf)
+    old = set_tts_engine(tts_engine)
+    if old is not None:
+        old.shutdown(wait=False)
+    musetalk_engine = SyntheticMuseTalkEngine(version, musetalk_dir, use_float16,
+                                              frame_cost=frame_cost, write_mode=write_mode)
+    register_musetalk_engine(musetalk_engine)
+    return tts_engine, musetalk_engine
@@ -0,0 +1,60 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from app.frame_sink import FRAME_SINKS
+
+
+def make_frames(count, width, height):
+    """合成测试帧：渐变背景上移动的色块，避免编码器对纯色帧走捷径"""
+    base = np.zeros((height, width, 3), dtype=np.uint8)
+    base[..., 0] = np.linspace(0, 255, width, dtype=np.uint8)[None, :]
+    base[..., 1] = np.linspace(0, 255, height, dtype=np.uint8)[:, None]
+    for i in range(count):
+        frame = base.copy()
+        x = (i * 7) % (width - 64)
+        frame[height // 2 - 32:height // 2 + 32, x:x + 64] = (i * 13) % 256
+        yield frame
+
+
+def bench(mode, frames, width, height, fps, output_dir, preset, threads):
+    output_path = os.path.join(output_dir, f"{mode}.mp4")
+    start = time.perf_counter()
+    with FRAME_SINKS[mode](output_path, fps, preset=preset, threads=threads) as sink:
+        for frame in make_frames(frames, width, height):
+            sink.write(frame)
+    elapsed = time.perf_counter() - start
+    return {
+        'mode': mode,
+        'wall_time': elapsed,
+        'fps': frames / elapsed,
+        'temp_bytes': sink.temp_bytes,
+        'output_bytes': os.path.getsize(output_path),
+    }
+
+
+def main(frames, width, height, fps, modes, preset, threads):
+    with tempfile.TemporaryDirectory(prefix="bench_frame_sink_") as output_dir:
+        results = [bench(mode, frames, width, height, fps, output_dir, preset, threads) for mode in modes]
+    print(f"[BENCH] {frames} 帧 {width}x{height}@{fps}fps，preset={preset}，threads={threads}")
+    for r in results:
+        print(f"[BENCH] {r['mode']:>4}: 耗时 {r['wall_time']:.2f}s（{r['fps']:.1f} 帧/s），"
+              f"临时文件 {r['temp_bytes'] / 1e6:.1f}MB，输出 {r['output_bytes'] / 1e6:.1f}MB")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比管道写帧与逐帧 PNG 的耗时和临时磁盘占用")
+    parser.add_argument('--frames', type=int, default=1500, help="帧数（默认为 25fps 下一分钟）")
+    parser.add_argument('--width', type=int, default=512)
+    parser.add_argument('--height', type=int, default=512)
+    parser.add_argument('--fps', type=int, default=25)
+    parser.add_argument('--modes', type=str, nargs='+', default=list(FRAME_SINKS), help="pipe / png")
+    parser.add_argument('--preset', type=str, default="veryfast", help="x264 预设")
+    parser.add_argument('--threads', type=int, default=0, help="编码线程数，0 为自动")
+    args = parser.parse_args()
+
+    main(args.frames, args.width, args.height, args.fps, args.modes, args.preset, args.threads)
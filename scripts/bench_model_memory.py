@@ -0,0 +1,117 @@
+import argparse
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+
+from app.config import MODEL_STORE, MUSETALK_BACKEND, MUSETALK_DIR, MUSETALK_INFERENCE, MUSETALK_VERSION
+from app.model_store import process_memory
+from scripts.benchmark import git_commit
+
+
+def _load_models(mode, synthetic_path):
+    """在工作进程中加载模型，返回需保持引用的对象"""
+    if synthetic_path is not None:
+        import numpy as np
+        if mode == 'mmap':
+            weights = np.load(synthetic_path, mmap_mode='r')
+        else:
+            weights = np.load(synthetic_path)
+        # 读一遍全部权重（相当于一次推理），映射的页才会计入内存
+        float(weights.sum())
+        return weights
+    from app.musetalk_engine import MuseTalkEngine
+    from app.tts import TTSEngine
+    MODEL_STORE['enabled'] = mode == 'mmap'
+    tts_engine = TTSEngine(max_workers=1)
+    tts_engine.load()
+    musetalk_engine = MuseTalkEngine(MUSETALK_VERSION, MUSETALK_DIR, MUSETALK_INFERENCE['use_float16'],
+                                     backend=MUSETALK_BACKEND['backend'])
+    musetalk_engine.load()
+    return tts_engine, musetalk_engine
+
+
+def _worker(mode, synthetic_path, loaded, release, results):
+    models = _load_models(mode, synthetic_path)
+    loaded.wait()
+    # 所有工作进程都加载完后再测量，共享页此时才按映射进程数计入
+    results.put({'pid': os.getpid(), **process_memory()})
+    release.wait()
+    del models
+
+
+def measure(workers, mode, synthetic_path=None, timeout=None):
+    """启动 workers 个工作进程加载模型，返回各进程的内存（字节）"""
+    context = multiprocessing.get_context('spawn')
+    loaded = context.Barrier(workers + 1)
+    release = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(mode, synthetic_path, loaded, release, results))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        loaded.wait(timeout)
+        memory = [results.get(timeout=timeout) for _ in processes]
+    finally:
+        release.set()
+        for process in processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+    return memory
+
+
+def _summary(memory):
+    mb = lambda key: sum(m[key] for m in memory) / len(memory) / 1e6
+    return {'uss_mb': mb('uss'), 'pss_mb': mb('pss'), 'rss_mb': mb('rss'),
+            'total_uss_mb': sum(m['uss'] for m in memory) / 1e6}
+
+
+def main(worker_counts=(1, 8), modes=('copy', 'mmap'), synthetic_mb=None, output=None, timeout=600):
+    """
+    比较私有加载（copy）与共享内存映射（mmap）下，1 个与多个工作进程各自的独占内存
+
+    真实模式下每个工作进程加载 Bark 与 MuseTalk 常驻引擎，mmap 模式通过 MODEL_STORE 共享权重
+    （第一次运行时写入共享存储）；synthetic_mb 给定时改用同样大小的随机权重文件，无需模型即可验证。
+    """
+    synthetic_path = None
+    if synthetic_mb:
+        import numpy as np
+        synthetic_path = os.path.join(tempfile.mkdtemp(prefix='avatar_memory_'), 'weights.npy')
+        np.save(synthetic_path, np.random.default_rng(0).random(int(synthetic_mb * 1e6) // 8))
+    results = []
+    try:
+        for mode in modes:
+            for workers in worker_counts:
+                start = time.perf_counter()
+                memory = measure(workers, mode, synthetic_path, timeout)
+                result = {'mode': mode, 'workers': workers, 'load_time': time.perf_counter() - start,
+                          **_summary(memory), 'processes': memory}
+                results.append(result)
+                print(f"[BENCH] {mode:>4} × {workers} 进程: 每进程独占 {result['uss_mb']:.0f}MB，"
+                      f"PSS {result['pss_mb']:.0f}MB，RSS {result['rss_mb']:.0f}MB")
+    finally:
+        if synthetic_path is not None:
+            os.remove(synthetic_path)
+            os.rmdir(os.path.dirname(synthetic_path))
+
+    report = {'commit': git_commit(), 'timestamp': time.time(), 'synthetic_mb': synthetic_mb, 'results': results}
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[BENCH] 结果: {output}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="工作进程内存：比较私有加载与共享内存映射的模型权重")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 8], help="要比较的工作进程数")
+    parser.add_argument('--modes', type=str, nargs='+', default=['copy', 'mmap'], choices=['copy', 'mmap'])
+    parser.add_argument('--synthetic_mb', type=float, default=None, help="使用指定大小的随机权重代替真实模型")
+    parser.add_argument('--output', type=str, default=None, help="结果 JSON 路径")
+    args = parser.parse_args()
+
+    main(args.workers, args.modes, synthetic_mb=args.synthetic_mb, output=args.output)
@@ -0,0 +1,87 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from app.config import MUSETALK_BACKEND, MUSETALK_CONFIG, MUSETALK_DIR, MUSETALK_INFERENCE, MUSETALK_VERSION
+from app.musetalk_backends import configure_threads, frame_psnr, make_backend, model_key
+from app.musetalk_engine import MuseTalkEngine
+
+
+def infer(engine, backend, whisper_chunks, latent_list):
+    """用指定后端推理全部帧，返回 (帧列表, 耗时)"""
+    models = engine._models
+    original = models['backend']
+    models['backend'] = backend
+    try:
+        start = time.perf_counter()
+        frames = engine._infer_frames(whisper_chunks, latent_list)
+        return frames, time.perf_counter() - start
+    finally:
+        models['backend'] = original
+
+
+def main(image_path, audio_path, backends, version, musetalk_dir, bbox_shift, fps, frames, batch_size, threads):
+    intra = configure_threads(threads)
+    # fp32 PyTorch 为画质基准
+    engine = MuseTalkEngine(version, musetalk_dir, use_float16=False, device='cpu', batch_size=batch_size,
+                            backend='torch')
+    engine.load()
+    avatar = engine.get_avatar(image_path, bbox_shift)
+    whisper_chunks = engine._audio_chunks(audio_path, fps)[:frames]
+    reference, ref_time = infer(engine, engine._models['backend'], whisper_chunks, avatar['latent_list'])
+    count = len(reference)
+    print(f"[BENCH] MuseTalk {version}，{count} 帧，batch_size={engine.batch_size}，线程数 {intra}")
+    print(f"[BENCH]  torch: {ref_time:.2f}s（{ref_time / count * 1000:.1f}ms/帧），基准")
+
+    weight_path = os.path.join(engine.musetalk_dir, MUSETALK_CONFIG[version]['model_dir'],
+                               MUSETALK_CONFIG[version]['model_file'])
+    results = [{'backend': 'torch', 'wall_time': ref_time, 'ms_per_frame': ref_time / count * 1000,
+                'speedup': 1.0, 'psnr_mean': float('inf'), 'psnr_min': float('inf')}]
+    for name in backends:
+        start = time.perf_counter()
+        # inplace=False：量化副本，保留 fp32 模型继续作为基准
+        backend = make_backend(name, engine._models, inplace=False, onnx_dir=engine.onnx_dir,
+                               model_key=model_key(version, weight_path), intra_op_threads=intra)
+        setup_time = time.perf_counter() - start
+        infer(engine, backend, whisper_chunks[:1], avatar['latent_list'])  # 预热
+        res_frames, wall_time = infer(engine, backend, whisper_chunks, avatar['latent_list'])
+        psnr = [frame_psnr(a, b) for a, b in zip(reference, res_frames)]
+        result = {
+            'backend': name,
+            'setup_time': setup_time,
+            'wall_time': wall_time,
+            'ms_per_frame': wall_time / count * 1000,
+            'speedup': ref_time / wall_time,
+            'psnr_mean': float(np.mean(psnr)),
+            'psnr_min': float(np.min(psnr)),
+        }
+        results.append(result)
+        print(f"[BENCH] {name:>6}: {wall_time:.2f}s（{result['ms_per_frame']:.1f}ms/帧，{result['speedup']:.2f}x），"
+              f"PSNR 平均 {result['psnr_mean']:.1f}dB / 最低 {result['psnr_min']:.1f}dB，准备 {setup_time:.1f}s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="对比 MuseTalk CPU 推理后端的速度与画质（逐帧 PSNR，基准为 fp32 PyTorch）")
+    parser.add_argument('--image', type=str, default="input/reference_image.jpg")
+    parser.add_argument('--audio', type=str, default="output/tts_output.wav")
+    parser.add_argument('--backends', type=str, nargs='+', default=['int8', 'onnx'], help="int8 / onnx")
+    parser.add_argument('--musetalk_version', type=str, default=MUSETALK_VERSION)
+    parser.add_argument('--musetalk_dir', type=str, default=MUSETALK_DIR)
+    parser.add_argument('--bbox_shift', type=int, default=MUSETALK_INFERENCE['bbox_shift'])
+    parser.add_argument('--fps', type=int, default=MUSETALK_INFERENCE['fps'])
+    parser.add_argument('--frames', type=int, default=100, help="最多推理的帧数")
+    parser.add_argument('--batch_size', type=int, default=None)
+    parser.add_argument('--threads', type=int, default=MUSETALK_BACKEND['intra_op_threads'], help="算子内线程数，0 为自动")
+    parser.add_argument('--min_psnr', type=float, default=MUSETALK_BACKEND['min_psnr'], help="低于该 PSNR 时以非零状态退出")
+    args = parser.parse_args()
+
+    results = main(args.image, args.audio, args.backends, args.musetalk_version, args.musetalk_dir,
+                   args.bbox_shift, args.fps, args.frames, args.batch_size, args.threads)
+    failed = [r['backend'] for r in results if r['psnr_mean'] < args.min_psnr]
+    if failed:
+        print(f"[BENCH] 画质未达标（平均 PSNR < {args.min_psnr}dB）: {failed}")
+        sys.exit(1)
@@ -0,0 +1,252 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from app.config import MUSETALK_DIR, MUSETALK_INFERENCE, MUSETALK_VERSION, RESULT_CACHE
+from scripts.bench_fakes import install_fakes
+
+
+def load_workload(path, limit=None):
+    """读取 JSONL 工作负载，每行取 text 字段（兼容 body / title）"""
+    texts = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            text = entry.get('text') or entry.get('body') or entry.get('title')
+            if text:
+                texts.append(text)
+    return texts[:limit] if limit else texts
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = np.asarray(values, dtype=float)
+    return {
+        'mean': float(values.mean()),
+        'p50': float(np.percentile(values, 50)),
+        'p90': float(np.percentile(values, 90)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(values.max()),
+    }
+
+
+def stage_breakdown(span_lists):
+    """按区间名汇总各任务的耗时"""
+    by_name = {}
+    for spans in span_lists:
+        for s in spans:
+            by_name.setdefault(s['name'], []).append(s['wall_time'])
+    return {name: {'count': len(times), **percentiles(times)} for name, times in sorted(by_name.items())}
+
+
+def run_closed_loop(texts, concurrency, run_one):
+    """concurrency 个客户端线程各自取任务、等待完成后再取下一个，返回每个任务的结果"""
+    pending = queue.Queue()
+    for i, text in enumerate(texts):
+        pending.put((i, text))
+    results = []
+    lock = threading.Lock()
+
+    def client():
+        while True:
+            try:
+                i, text = pending.get_nowait()
+            except queue.Empty:
+                return
+            start = time.perf_counter()
+            try:
+                spans = run_one(i, text)
+                error = None
+            except Exception as e:
+                spans, error = [], str(e)
+            with lock:
+                results.append({'latency': time.perf_counter() - start, 'spans': spans, 'error': error})
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - start
+
+
+def pipeline_runner(workdir, image_path):
+    import pipeline
+
+    def run_one(i, text):
+        job_dir = os.path.join(workdir, 'pipeline', f"job_{i}_{time.monotonic_ns()}")
+        os.makedirs(job_dir)
+        text_path = os.path.join(job_dir, 'input.txt')
+        with open(text_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        report_path = os.path.join(job_dir, 'timing_report.json')
+        pipeline.main(text_path, image_path, job_dir, None, musetalk_mode='engine', report_path=report_path)
+        with open(report_path, encoding='utf-8') as f:
+            return json.load(f)['spans']
+    return run_one
+
+
+@contextlib.contextmanager
+def api_runner(image_bytes, poll_interval):
+    from fastapi.testclient import TestClient
+    from api.fastapi_app import app
+
+    with TestClient(app) as client:
+        def run_one(i, text):
+            response = client.post('/generate', data={'text': text},
+                                   files={'image': ('input.jpg', image_bytes, 'image/jpeg')})
+            if response.status_code not in (200, 202):
+                raise RuntimeError(f"/generate 返回 {response.status_code}: {response.text}")
+            task_id = response.json()['task_id']
+            while True:
+                status = client.get(f"/status/{task_id}").json()
+                if status['status'] == 'done':
+                    return status.get('spans', [])
+                if status['status'] == 'failed':
+                    raise RuntimeError(status['error'])
+                time.sleep(poll_interval)
+        yield run_one
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(target, concurrency, results, wall_time):
+    ok = [r for r in results if r['error'] is None]
+    return {
+        'target': target,
+        'concurrency': concurrency,
+        'jobs': len(results),
+        'errors': len(results) - len(ok),
+        'wall_time': wall_time,
+        'jobs_per_min': len(ok) / wall_time * 60 if wall_time else None,
+        'latency': percentiles([r['latency'] for r in ok]),
+        'stages': stage_breakdown([r['spans'] for r in ok]),
+        'first_error': next((r['error'] for r in results if r['error']), None),
+    }
+
+
+def print_summary(summary):
+    latency = summary['latency'] or {}
+    print(f"[BENCH] {summary['target']:>8} c={summary['concurrency']:<3} jobs={summary['jobs']} "
+          f"errors={summary['errors']} {summary['jobs_per_min'] or 0:.1f} jobs/min "
+          f"p50={latency.get('p50', 0):.2f}s p90={latency.get('p90', 0):.2f}s p99={latency.get('p99', 0):.2f}s")
+    for name, stage in summary['stages'].items():
+        print(f"[BENCH]            {name:<20} n={stage['count']:<4} mean={stage['mean']:.3f}s p50={stage['p50']:.3f}s")
+    if summary['first_error']:
+        print(f"[BENCH]   首个错误: {summary['first_error']}")
+
+
+def compare(results, baseline_path):
+    """与另一次提交的结果对比吞吐与 p50 延迟"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    old = {(r['target'], r['concurrency']): r for r in baseline['results']}
+    print(f"[BENCH] 对比基线 {baseline.get('commit')} ({baseline_path})")
+    for r in results:
+        b = old.get((r['target'], r['concurrency']))
+        if b is None or not b['jobs_per_min'] or not r['jobs_per_min']:
+            continue
+        print(f"[BENCH] {r['target']:>8} c={r['concurrency']:<3} 吞吐 {b['jobs_per_min']:.1f} -> "
+              f"{r['jobs_per_min']:.1f} jobs/min ({r['jobs_per_min'] / b['jobs_per_min'] - 1:+.0%})，"
+              f"p50 {b['latency']['p50']:.2f}s -> {r['latency']['p50']:.2f}s")
+
+
+def main(workload, targets, concurrency_levels, limit=None, output=None, baseline=None,
+         seconds_per_char=0.05, tts_rtf=0.2, frame_cost=0.002, write_mode='null',
+         use_caches=False, poll_interval=0.05, quiet=True):
+    texts = load_workload(workload, limit)
+    if not texts:
+        raise ValueError(f"工作负载为空: {workload}")
+    commit = git_commit()
+    fakes = {'seconds_per_char': seconds_per_char, 'tts_rtf': tts_rtf,
+             'frame_cost': frame_cost, 'write_mode': write_mode, 'use_caches': use_caches}
+
+    workdir = tempfile.mkdtemp(prefix='avatar_bench_')
+    cwd = os.getcwd()
+    # 所有相对路径（output/、cache/）都落在临时工作目录中，不影响仓库
+    os.chdir(workdir)
+    result_cache_enabled = RESULT_CACHE['enabled']
+    if not use_caches:
+        RESULT_CACHE['enabled'] = False
+    image_bytes = b'synthetic-avatar'
+    image_path = os.path.join(workdir, 'reference.jpg')
+    with open(image_path, 'wb') as f:
+        f.write(image_bytes)
+
+    results = []
+    try:
+        for target in targets:
+            for concurrency in concurrency_levels:
+                # 每轮重新注册替身，统计互不影响
+                install_fakes(MUSETALK_VERSION, MUSETALK_DIR, MUSETALK_INFERENCE['use_float16'],
+                              seconds_per_char=seconds_per_char, tts_rtf=tts_rtf,
+                              frame_cost=frame_cost, write_mode=write_mode)
+                log = io.StringIO()
+                with contextlib.redirect_stdout(log if quiet else sys.stdout):
+                    if target == 'pipeline':
+                        runs, wall_time = run_closed_loop(texts, concurrency, pipeline_runner(workdir, image_path))
+                    elif target == 'api':
+                        with api_runner(image_bytes, poll_interval) as run_one:
+                            runs, wall_time = run_closed_loop(texts, concurrency, run_one)
+                    else:
+                        raise ValueError(f"未知的压测对象: {target}")
+                summary = summarize(target, concurrency, runs, wall_time)
+                print_summary(summary)
+                results.append(summary)
+    finally:
+        os.chdir(cwd)
+        RESULT_CACHE['enabled'] = result_cache_enabled
+
+    report = {'commit': commit, 'timestamp': time.time(), 'workload': workload, 'fakes': fakes,
+              'results': results}
+    output = output or os.path.join('bench_results', f"{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[BENCH] 结果: {output}")
+    if baseline:
+        compare(results, baseline)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线压测：用替身 TTS / MuseTalk 测量延迟分位数、吞吐和各阶段耗时")
+    parser.add_argument('--workload', type=str, default="requests.jsonl", help="JSONL 工作负载，每行取 text / body / title")
+    parser.add_argument('--limit', type=int, default=None, help="最多使用多少条")
+    parser.add_argument('--targets', type=str, nargs='+', default=['pipeline', 'api'], help="pipeline / api")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4], help="并发客户端数")
+    parser.add_argument('--seconds_per_char', type=float, default=0.05, help="替身 TTS 每字符音频时长")
+    parser.add_argument('--tts_rtf', type=float, default=0.2, help="替身 TTS 合成耗时 / 音频时长")
+    parser.add_argument('--frame_cost', type=float, default=0.002, help="替身 MuseTalk 单帧推理耗时（秒）")
+    parser.add_argument('--write_mode', type=str, default='null', help="null 只写占位文件，sink 使用 ffmpeg 编码")
+    parser.add_argument('--use_caches', action='store_true', help="保留结果缓存（默认关闭，避免重复文本命中）")
+    parser.add_argument('--output', type=str, default=None, help="结果 JSON，默认 bench_results/<commit>.json")
+    parser.add_argument('--baseline', type=str, default=None, help="与之前某次提交的结果 JSON 对比")
+    parser.add_argument('--verbose', action='store_true', help="显示流水线日志")
+    args = parser.parse_args()
+
+    main(args.workload, args.targets, args.concurrency, limit=args.limit, output=args.output,
+         baseline=args.baseline, seconds_per_char=args.seconds_per_char, tts_rtf=args.tts_rtf,
+         frame_cost=args.frame_cost, write_mode=args.write_mode, use_caches=args.use_caches,
+         quiet=not args.verbose)
@@ -0,0 +1,72 @@
+import os
+import textwrap
+import pytest
+
+# 假的 MuseTalk 推理脚本：读取任务配置，把图片和音频内容拼接成“视频”写到结果目录，
+# 并记录开始/结束时间，用于检查并发上限
+FAKE_INFERENCE = textwrap.dedent('''
+    import argparse, os, sys, time
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--inference_config")
+    parser.add_argument("--result_dir")
+    parser.add_argument("--unet_model_path")
+    parser.add_argument("--unet_config")
+    parser.add_argument("--version")
+    parser.add_argument("--fps", type=int, default=25)
+    parser.add_argument("--use_float16", action="store_true")
+    args = parser.parse_args()
+    assert os.path.exists(args.unet_model_path)
+    log = os.environ["FAKE_MUSETALK_LOG"]
+    with open(log, "a") as f:
+        f.write("start %f\\n" % time.time())
+    tasks, current = {}, None
+    for line in open(args.inference_config, encoding="utf-8"):
+        if not line.startswith(" "):
+            current = tasks.setdefault(line.strip().rstrip(":"), {})
+        else:
+            key, value = line.strip().split(": ", 1)
+            current[key] = value.strip("'")
+    time.sleep(0.2)
+    for task in tasks.values():
+        out_dir = os.path.join(args.result_dir, args.version)
+        os.makedirs(out_dir, exist_ok=True)
+        with open(os.path.join(out_dir, task["result_name"]), "wb") as out:
+            out.write(open(task["video_path"], "rb").read())
+            out.write(open(task["audio_path"], "rb").read())
+    with open(log, "a") as f:
+        f.write("end %f\\n" % time.time())
+''')
+
+
+def make_fake_musetalk(root):
+    for d in ["configs/inference", "scripts", "models/musetalkV15"]:
+        os.makedirs(os.path.join(root, d), exist_ok=True)
+    for name in ["configs/inference/test.yaml", "scripts/__init__.py",
+                 "models/musetalkV15/unet.pth", "models/musetalkV15/musetalk.json"]:
+        open(os.path.join(root, name), "w").close()
+    with open(os.path.join(root, "scripts/inference.py"), "w") as f:
+        f.write(FAKE_INFERENCE)
+    return root
+
+
+@pytest.fixture
+def fake_musetalk(tmp_path, monkeypatch):
+    """假的 MuseTalk 目录，返回 (目录, 调用日志路径)"""
+    log_path = str(tmp_path / "calls.log")
+    monkeypatch.setenv("FAKE_MUSETALK_LOG", log_path)
+    return make_fake_musetalk(str(tmp_path / "MuseTalk")), log_path
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path_factory, monkeypatch):
+    """TTS / 结果 / 形象缓存和形象注册目录都放到临时目录，运行测试不在仓库中留下 cache/ 等目录"""
+    from app import avatar_cache, result_cache, tts_cache
+    from app.config import AVATAR_CACHE, RESULT_CACHE, TTS_CACHE
+    root = tmp_path_factory.mktemp("cache")
+    monkeypatch.setitem(TTS_CACHE, 'cache_dir', str(root / "tts"))
+    monkeypatch.setitem(RESULT_CACHE, 'index_dir', str(root / "results"))
+    monkeypatch.setitem(AVATAR_CACHE, 'cache_dir', str(root / "avatars"))
+    monkeypatch.setitem(AVATAR_CACHE, 'registry_dir', str(root / "registry"))
+    # 进程级缓存按首次使用时的配置创建，每个测试重新创建
+    for module in (tts_cache, result_cache, avatar_cache):
+        monkeypatch.setattr(module, '_cache', None)
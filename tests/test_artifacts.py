@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from app.artifacts import AudioArtifact, ImageArtifact, audio_artifact
+from app.config import MUSETALK_INFERENCE, MUSETALK_VERSION
+from app.job_queue import Job
+from app.musetalk_engine import register_musetalk_engine
+from app.quality import upgrade_job
+from app.render import make_item, stage_lipsync, stage_tts
+from app.tts import set_tts_engine
+from scripts.bench_fakes import SyntheticMuseTalkEngine, ToneBarkEngine
+
+
+def tone(seconds, sample_rate=24000):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def test_audio_resampled_once_and_written_lazily(tmp_path):
+    path = str(tmp_path / "tts.wav")
+    audio = AudioArtifact(tone(1.0), 24000, path=path)
+    resampled = audio.samples(16000)
+    assert len(resampled) == 16000 and audio.samples(16000) is resampled
+    assert audio.samples() is audio.samples(24000) and audio.duration == 1.0
+    assert not (tmp_path / "tts.wav").exists()
+
+    assert audio.to_file() == path
+    mtime = (tmp_path / "tts.wav").stat().st_mtime_ns
+    assert audio.to_file() == path and (tmp_path / "tts.wav").stat().st_mtime_ns == mtime
+    assert audio.representations() == {'sample_rates': [16000, 24000], 'wav_bytes': True, 'written': True}
+    data, sample_rate = sf.read(path, dtype='float32')
+    assert sample_rate == 24000 and np.allclose(data, audio.samples(), atol=1e-4)
+
+
+def test_audio_from_file_is_lazy(tmp_path):
+    path = str(tmp_path / "input.wav")
+    audio = audio_artifact(path)
+    # 文件在首次使用时才读取
+    sf.write(path, np.stack([tone(0.5), tone(0.5)], axis=1), 24000)
+    assert audio.sample_rate == 24000 and audio.samples().ndim == 1
+    assert audio.to_file() == path and audio_artifact(audio) is audio
+
+
+def test_resample_matches_librosa_load(tmp_path):
+    librosa = pytest.importorskip('librosa')
+    path = str(tmp_path / "tts.wav")
+    samples = tone(1.3) + np.random.default_rng(0).normal(0, 0.01, int(1.3 * 24000)).astype(np.float32)
+    audio = AudioArtifact(samples, 24000, path=path)
+    in_memory = audio.samples(16000)
+    # Wav2Lip 的 audio.load_wav 与 MuseTalk 的 AudioProcessor 都以 librosa.load 读取写出的文件
+    expected, _ = librosa.load(audio.to_file(), sr=16000)
+    assert in_memory.dtype == expected.dtype and np.array_equal(in_memory, expected)
+    assert np.array_equal(AudioArtifact.from_file(path).samples(16000), expected)
+
+
+def test_image_hash_without_file(tmp_path):
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    in_memory = ImageArtifact(path=str(tmp_path / "scaled.png"), image=image)
+    assert in_memory.sha256() == ImageArtifact(image=image.copy()).sha256()
+    assert in_memory.sha256() != ImageArtifact(image=np.ones((8, 8, 3), dtype=np.uint8)).sha256()
+    assert not (tmp_path / "scaled.png").exists()
+    path = tmp_path / "input.jpg"
+    path.write_bytes(b"image")
+    assert ImageArtifact(path=str(path)).to_file() == str(path)
+
+
+def test_render_stages_hand_off_audio_in_memory(tmp_path):
+    old_tts = set_tts_engine(ToneBarkEngine(seconds_per_char=0.05, rtf=0.0))
+    register_musetalk_engine(SyntheticMuseTalkEngine(frame_cost=0.0))
+    text_path = tmp_path / "input.txt"
+    text_path.write_text("你好，世界。", encoding="utf-8")
+    image_path = tmp_path / "input.jpg"
+    image_path.write_bytes(b"image")
+    item = make_item(str(tmp_path), str(text_path), str(image_path), 0, 'task')
+    job = Job('task', {'items': [item], 'musetalk_version': MUSETALK_VERSION, 'fps': 25, 'quality': 'full',
+                       'use_float16': MUSETALK_INFERENCE['use_float16'], 'use_engine': True})
+    try:
+        stage_tts(job)
+        stage_lipsync(job)
+    finally:
+        set_tts_engine(old_tts)
+    audio = job.artifacts[item['tts_path']]
+    # 替身引擎不调用 ffmpeg，TTS 音频始终没有写成文件
+    assert audio.duration > 0 and not (tmp_path / "tts.wav").exists()
+    assert (tmp_path / "musetalk_output.mp4").exists()
+    # preview 之后的完整画质重渲染复用内存中的音频
+    preview = Job('task', {'fps': 25, 'quality': 'preview'})
+    preview.artifacts = job.artifacts
+    assert upgrade_job(preview).artifacts[item['tts_path']] is audio
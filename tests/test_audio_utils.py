@@ -0,0 +1,39 @@
+import numpy as np
+from app.audio_utils import crossfade_concat, silence_weights, voiced_frames
+
+
+def test_crossfade_concat():
+    a = np.ones(1000, dtype=np.float32)
+    b = np.ones(500, dtype=np.float32)
+    out = crossfade_concat([a, b], 1000, crossfade_ms=100)
+    assert len(out) == 1400
+    # 两段幅度相同时，交叉淡化不应产生幅度跳变
+    assert np.allclose(out, 1.0)
+
+
+def test_crossfade_concat_empty():
+    assert len(crossfade_concat([], 24000)) == 0
+
+
+def speech_with_pause(sample_rate=16000, pause_s=1.0):
+    t = np.arange(sample_rate) / sample_rate
+    tone = (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    return np.concatenate([tone, np.zeros(int(sample_rate * pause_s), dtype=np.float32), tone])
+
+
+def test_voiced_frames_finds_pause():
+    voiced = voiced_frames(speech_with_pause(), 16000, 25, pad_ms=80)
+    assert len(voiced) == 75
+    # 停顿两侧各扩展 2 帧
+    assert voiced[:27].all() and not voiced[27:48].any() and voiced[48:].all()
+
+
+def test_short_pause_is_voiced():
+    voiced = voiced_frames(speech_with_pause(pause_s=0.1), 16000, 25, min_silence_ms=200)
+    assert voiced.all()
+
+
+def test_silence_weights_ramp():
+    voiced = np.array([1, 1, 1, 1, 0, 0, 1, 1, 1, 1], dtype=bool)
+    weights = silence_weights(voiced, transition_frames=3)
+    assert np.allclose(weights, [0, 0.25, 0.5, 0.75, 1, 1, 0.75, 0.5, 0.25, 0])
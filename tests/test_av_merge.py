@@ -1,5 +1,6 @@
 import os
-from app.av_merge import merge
+import struct
+from app.av_merge import finalize, is_faststart, merge
 
 
 def test_merge():
@@ -19,3 +20,22 @@ def test_merge():
     finally:
         os.remove(video_path)
         os.remove(audio_path)
+
+
+def box(kind, payload=b""):
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def test_finalize_renames_faststart_file(tmp_path):
+    slow = tmp_path / "slow.mp4"
+    slow.write_bytes(box(b"ftyp", b"isom") + box(b"mdat", b"\x00" * 16) + box(b"moov"))
+    fast = tmp_path / "fast.mp4"
+    fast.write_bytes(box(b"ftyp", b"isom") + box(b"moov") + box(b"mdat", b"\x00" * 16))
+    assert not is_faststart(str(slow))
+    assert is_faststart(str(fast))
+
+    inode = os.stat(fast).st_ino
+    final = tmp_path / "out" / "final.mp4"
+    finalize(str(fast), str(final))
+    # 已是 faststart 的文件只改名，不重写数据
+    assert os.stat(final).st_ino == inode and not fast.exists()
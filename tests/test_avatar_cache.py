@@ -0,0 +1,48 @@
+import numpy as np
+from app.avatar_cache import AvatarCache, avatar_image_path, register_avatar
+
+
+def _avatar():
+    return {
+        'coord_list': [(10, 20, 110, 140)],
+        'frame_list': [np.zeros((4, 4, 3), dtype=np.uint8)],
+        'latent_list': [np.ones((1, 8, 32, 32), dtype=np.float32)],
+    }
+
+
+def test_avatar_cache_memory_and_disk(tmp_path):
+    cache = AvatarCache(cache_dir=str(tmp_path), memory_entries=1, max_disk_bytes=10 ** 8)
+    key_a = cache.make_key("sha-a", 0, "v1.5")
+    key_b = cache.make_key("sha-a", -5, "v1.5")
+    assert key_a != key_b
+
+    calls = []
+    cache.get_or_create(key_a, lambda: calls.append('a') or _avatar())
+    cache.get_or_create(key_a, lambda: calls.append('a') or _avatar())
+    assert calls == ['a']
+    assert cache.stats()['memory_hits'] == 1
+
+    # 内存只保留一个条目，a 被挤出后从磁盘读取
+    cache.put(key_b, _avatar())
+    avatar = cache.get(key_a)
+    assert avatar['coord_list'] == [(10, 20, 110, 140)]
+    assert cache.stats()['disk_hits'] == 1
+
+    # 新进程从磁盘恢复
+    assert AvatarCache(cache_dir=str(tmp_path)).get(key_b) is not None
+
+
+def test_avatar_cache_disk_eviction(tmp_path):
+    cache = AvatarCache(cache_dir=str(tmp_path), memory_entries=4, max_disk_bytes=1)
+    cache.put("a", _avatar())
+    cache.put("b", _avatar())
+    assert cache.stats()['disk_entries'] == 1
+    assert not (tmp_path / "a.pkl").exists()
+
+
+def test_register_avatar(tmp_path):
+    avatar_id = register_avatar(b"fake image", registry_dir=str(tmp_path))
+    assert register_avatar(b"fake image", registry_dir=str(tmp_path)) == avatar_id
+    assert avatar_image_path(avatar_id, registry_dir=str(tmp_path)).endswith("image.jpg")
+    assert avatar_image_path("unknown", registry_dir=str(tmp_path)) is None
+    assert avatar_image_path("../etc", registry_dir=str(tmp_path)) is None
@@ -0,0 +1,39 @@
+import json
+from app.tts import get_tts_engine, set_tts_engine
+from scripts import benchmark
+
+
+def test_benchmark_runs_pipeline_with_fakes(tmp_path):
+    workload = tmp_path / "workload.jsonl"
+    workload.write_text("\n".join(json.dumps({"text": t}, ensure_ascii=False)
+                                  for t in ["你好，世界。", "今天天气很好。"]), encoding="utf-8")
+    output = tmp_path / "result.json"
+    old = get_tts_engine()
+    try:
+        report = benchmark.main(str(workload), ['pipeline'], [1, 2], output=str(output),
+                                seconds_per_char=0.05, tts_rtf=0.0, frame_cost=0.0)
+    finally:
+        set_tts_engine(old).shutdown(wait=False)
+
+    assert json.loads(output.read_text(encoding="utf-8"))['results'] == report['results']
+    for result in report['results']:
+        assert result['jobs'] == 2 and result['errors'] == 0
+        assert result['latency']['p50'] > 0
+        assert {'tts', 'lipsync', 'mux'} <= set(result['stages'])
+
+
+def test_cpu_slot_sweep_with_fakes(tmp_path):
+    from app.config import CPU_SLOTS, PIPELINE_STAGES
+    from scripts import bench_cpu_slots
+
+    workload = tmp_path / "workload.jsonl"
+    workload.write_text("\n".join(json.dumps({"text": t}, ensure_ascii=False)
+                                  for t in ["你好。", "再见。"]), encoding="utf-8")
+    image = tmp_path / "avatar.jpg"
+    image.write_bytes(b"synthetic")
+    lipsync_workers = PIPELINE_STAGES['lipsync']['workers']
+    report = bench_cpu_slots.main(str(workload), str(image), [1, 2], output=str(tmp_path / "slots.json"),
+                                  fakes=True, seconds_per_char=0.01, tts_rtf=0.0, frame_cost=0.0)
+    assert [r['slot_cores'] for r in report['results']] == [1, 2]
+    assert all(r['jobs'] == 2 and r['jobs_per_hour'] > 0 for r in report['results'])
+    assert not CPU_SLOTS['enabled'] and PIPELINE_STAGES['lipsync']['workers'] == lipsync_workers
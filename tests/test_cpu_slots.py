@@ -0,0 +1,127 @@
+import os
+import threading
+
+import pytest
+
+from app import cpu_slots
+from app.cpu_slots import CpuSlot, CpuSlotAllocator, cpu_cores, current_slot, pin_current_thread, slot_env
+from app.frame_sink import _encode_args
+from app.config import FRAME_SINK
+from app.scheduler import Stage, StageScheduler
+
+
+def make_sysfs(root, topology):
+    """topology: 逻辑 CPU -> (socket, core)"""
+    for cpu, (package, core) in topology.items():
+        path = os.path.join(root, f"cpu{cpu}", "topology")
+        os.makedirs(path)
+        with open(os.path.join(path, "physical_package_id"), "w") as f:
+            f.write(f"{package}\n")
+        with open(os.path.join(path, "core_id"), "w") as f:
+            f.write(f"{core}\n")
+    return str(root)
+
+
+def test_cpu_cores_groups_hyperthreads(tmp_path):
+    # 2 个 socket × 2 核 × 2 超线程，超线程编号与 Linux 常见布局一致（cpu0 与 cpu4 同核）
+    root = make_sysfs(tmp_path, {0: (0, 0), 1: (0, 1), 2: (1, 0), 3: (1, 1),
+                                 4: (0, 0), 5: (0, 1), 6: (1, 0), 7: (1, 1)})
+    assert cpu_cores(list(range(8)), root) == [[0, 4], [1, 5], [2, 6], [3, 7]]
+    # 读取不到拓扑时每个逻辑 CPU 视为一个核心
+    assert cpu_cores([0, 1], str(tmp_path / "missing")) == [[0], [1]]
+
+
+def test_allocator_slots(tmp_path):
+    topology = {cpu: (cpu // 4, cpu % 4) for cpu in range(8)}
+    root = make_sysfs(tmp_path, topology)
+    allocator = CpuSlotAllocator({'lipsync': 2, 'bark': 3}, cpus=list(range(8)), reserved_cores=1, sysfs_root=root)
+    assert allocator.allocate('mux') is None
+    first = allocator.allocate('lipsync')
+    assert first.cpus == [1, 2] and first.threads == 2 and not first.shared
+    # 剩余 1 个核心放不下，且跨 socket：从下一个 socket 开始
+    second = allocator.allocate('bark')
+    assert second.cpus == [4, 5, 6] and not second.shared
+    # 核心已分配完，从头共享
+    third = allocator.allocate('lipsync')
+    assert third.shared and third.cpus == [1, 2]
+    stats = allocator.stats()
+    assert stats['cores'] == 7 and stats['reserved_cores'] == 1 and stats['oversubscribed']
+
+
+def test_pinned_thread_limits_threads():
+    cpus = sorted(os.sched_getaffinity(0))[:1] if hasattr(os, 'sched_getaffinity') else [0]
+    seen = {}
+
+    def run():
+        pin_current_thread(CpuSlot('lipsync', cpus, 3))
+        seen['slot'] = current_slot()
+        seen['args'] = _encode_args(FRAME_SINK)
+        seen['env'] = slot_env()
+        if hasattr(os, 'sched_getaffinity'):
+            seen['affinity'] = sorted(os.sched_getaffinity(0))
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    assert seen['slot'].stage == 'lipsync'
+    assert seen['args'][seen['args'].index('-threads') + 1] == '3'
+    assert seen['env']['OMP_NUM_THREADS'] == '3'
+    assert seen.get('affinity', cpus) == cpus
+    # 其它线程不受影响
+    assert current_slot() is None and slot_env() is None
+    assert '-threads' not in _encode_args(FRAME_SINK)
+
+
+def test_scheduler_init_worker(monkeypatch):
+    started = []
+    scheduler = StageScheduler([Stage('a', lambda x: x, workers=2), Stage('b', lambda x: x)],
+                               init_worker=lambda name, index: started.append((name, index)))
+    try:
+        assert scheduler.submit(1).result(5) == 1
+    finally:
+        scheduler.shutdown()
+    assert sorted(started) == [('a', 0), ('a', 1), ('b', 0)]
+    # 未启用时 pin_worker 不绑定
+    monkeypatch.setitem(cpu_slots.CPU_SLOTS, 'enabled', False)
+    assert cpu_slots.pin_worker('lipsync') is None
+
+
+def test_batching_pins_inference_threads(tmp_path, monkeypatch):
+    from app import musetalk_batch
+    from app.config import MUSETALK_BATCH
+    from app.render import render_stage_config
+
+    monkeypatch.setitem(cpu_slots.CPU_SLOTS, 'enabled', True)
+    allocator = CpuSlotAllocator({'lipsync': 2, 'mux': 1}, cpus=list(range(8)), reserved_cores=0,
+                                 sysfs_root=str(tmp_path / "missing"))
+    monkeypatch.setattr(cpu_slots, '_allocator', allocator)
+    monkeypatch.setattr(cpu_slots, 'pin_current_thread', lambda slot: None)
+    assert cpu_slots.stage_threads('lipsync') == 2 and cpu_slots.stage_threads('tts') is None
+
+    # 启用凑批时口型阶段的工作线程只等待批次，不占用口型槽位
+    monkeypatch.setitem(MUSETALK_BATCH, 'enabled', True)
+    init_worker = cpu_slots.stage_pinner(render_stage_config({'lipsync': {'workers': 1}}))
+    assert init_worker('lipsync', 0) is None and init_worker('mux', 0).stage == 'mux'
+
+    # 凑批器的推理线程各自绑定口型槽位
+    monkeypatch.setattr(musetalk_batch, 'musetalk_sync_batch', lambda tasks, **kwargs: [None] * len(tasks))
+    batcher = musetalk_batch.MuseTalkBatcher(max_batch_size=1, max_wait=0.0)
+    try:
+        batcher.submit("a.jpg", "a.wav", "a.mp4", version="v1.5").result(timeout=5)
+    finally:
+        batcher.shutdown()
+    assert [slot.stage for slot in allocator.slots] == ['mux', 'lipsync']
+
+
+def test_backend_threads_follow_slot(monkeypatch):
+    torch = pytest.importorskip('torch')
+    from app.musetalk_backends import configure_threads
+
+    monkeypatch.setitem(cpu_slots.CPU_SLOTS, 'enabled', True)
+    monkeypatch.setattr(cpu_slots, '_allocator', CpuSlotAllocator({'lipsync': 1}, cpus=[0, 1], reserved_cores=0))
+    threads = torch.get_num_threads()
+    try:
+        # 加载线程没有绑定槽位时，按口型槽位的大小而不是全部 CPU 设置线程数
+        assert configure_threads(0, 1) == 1
+    finally:
+        torch.set_num_threads(threads)
@@ -0,0 +1,49 @@
+import os
+import stat
+import sys
+import numpy as np
+import pytest
+from app.frame_sink import PipeFrameSink, make_frame_sink
+
+# 假的 ffmpeg：读完标准输入，把收到的字节数写到最后一个参数（输出路径）
+FAKE_FFMPEG = f'''#!{sys.executable}
+import sys
+data = sys.stdin.buffer.read()
+with open(sys.argv[-1], "w") as f:
+    f.write(str(len(data)))
+sys.exit(1 if b"fail" in data[:4] else 0)
+'''
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    path = tmp_path / "ffmpeg"
+    path.write_text(FAKE_FFMPEG)
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def test_pipe_sink_streams_frames(tmp_path, fake_ffmpeg):
+    output = str(tmp_path / "out.mp4")
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    with make_frame_sink(output, 25, "speech.wav", mode="pipe", ffmpeg=fake_ffmpeg) as sink:
+        for _ in range(10):
+            sink.write(frame)
+    assert sink.frames == 10 and sink.temp_bytes == 0
+    assert open(output).read() == str(10 * frame.nbytes)
+    # 帧尺寸取自第一帧，音频在同一次调用中复用
+    cmd = sink.command(64, 48)
+    assert cmd[cmd.index('-s') + 1] == "64x48"
+    assert "speech.wav" in cmd and "+faststart" in cmd
+
+
+def test_pipe_sink_reports_encoder_failure(tmp_path, fake_ffmpeg):
+    sink = PipeFrameSink(str(tmp_path / "out.mp4"), 25, ffmpeg=fake_ffmpeg)
+    sink.write(np.frombuffer(b"fail" * 3, dtype=np.uint8).reshape(2, 2, 3))
+    with pytest.raises(RuntimeError):
+        sink.close()
+
+
+def test_unknown_sink_mode(tmp_path):
+    with pytest.raises(ValueError):
+        make_frame_sink(os.path.join(tmp_path, "out.mp4"), 25, mode="gif")
@@ -0,0 +1,108 @@
+import threading
+import pytest
+from app.job_cost import CostEstimator, detect_language, priority_key, refine_estimate
+from app.job_queue import DeadlineError, Job, JobQueue
+from app.job_store import SQLiteJobStore
+from app.scheduler import PriorityStageQueue
+
+
+def make_text_job(tmp_path, task_id, text):
+    text_path = tmp_path / f"{task_id}.txt"
+    text_path.write_text(text, encoding='utf-8')
+    return Job(task_id, {'items': [{'text_path': str(text_path)}]})
+
+
+def wait_for(predicate):
+    for _ in range(200):
+        if predicate():
+            return True
+        threading.Event().wait(0.01)
+    return False
+
+
+def test_estimate_and_refine():
+    assert detect_language("你好，世界") == 'zh'
+    assert detect_language("こんにちは") == 'ja'
+    assert detect_language("Hello world") == 'en'
+
+    estimator = CostEstimator(chars_per_second={'zh': 5.0, 'en': 10.0}, render_rtf=2.0, overhead=1.0, smoothing=0.5)
+    estimate = estimator.estimate(["你好世界你好世界你好"])
+    assert estimate['language'] == 'zh' and estimate['chars'] == 10
+    assert estimate['speech_seconds'] == pytest.approx(2.0)
+    assert estimate['render_seconds'] == pytest.approx(5.0)
+
+    # Bark 实际合成了 4 秒：任务估算改用实测时长，朗读速度向 10 / 4 = 2.5 字符/秒平滑
+    job = Job('zh', {})
+    job.set_info(estimate=estimate)
+    refined = refine_estimate(job, 4.0, estimator=estimator)
+    assert refined['measured'] and refined['render_seconds'] == pytest.approx(9.0)
+    assert job.info['estimate'] is refined
+    assert estimator.chars_per_second['zh'] == pytest.approx(3.75)
+    assert estimator.stats()['speech_samples'] == 1
+
+
+def test_priority_queue_aging():
+    q = PriorityStageQueue(0, lambda item: priority_key(item[1], item[2], aging=1.0))
+    q.put((('old_long', 100.0, 0.0), None))
+    q.put((('new_short', 5.0, 50.0), None))
+    q.put((('newest_long', 100.0, 60.0), None))
+    # 新提交的短任务排到长任务前面，但等待足够久的长任务仍先于更晚提交的长任务
+    assert [item[0] for item in q.pending()] == ['new_short', 'old_long', 'newest_long']
+    assert q.get()[0][0] == 'new_short'
+
+
+def test_job_queue_shortest_first(tmp_path):
+    release = threading.Event()
+    order = []
+
+    def handler(job):
+        if job.task_id == 'blocker':
+            release.wait(5)
+        order.append(job.task_id)
+
+    estimator = CostEstimator(chars_per_second={'en': 10.0}, render_rtf=1.0, overhead=0.0)
+    jobs = JobQueue([('work', handler)], max_depth=4, stage_config={}, estimator=estimator)
+    try:
+        blocker = jobs.submit(Job('blocker', {}))
+        assert wait_for(lambda: blocker.status == 'running')
+        long_job = jobs.submit(make_text_job(tmp_path, 'long', "word " * 200))
+        short_job = jobs.submit(make_text_job(tmp_path, 'short', "hi"))
+        # 短任务排在长任务之前，预计开始时间不计入长任务的耗时
+        assert short_job.info['estimated_start'] - short_job.created_at < 1
+        release.set()
+        assert wait_for(lambda: long_job.finished)
+        assert order == ['blocker', 'short', 'long']
+    finally:
+        release.set()
+        jobs.shutdown()
+
+
+def test_job_queue_deadline(tmp_path):
+    release = threading.Event()
+    estimator = CostEstimator(chars_per_second={'en': 10.0}, render_rtf=1.0, overhead=0.0)
+    jobs = JobQueue([('work', lambda job: release.wait(5))], max_depth=4, stage_config={}, estimator=estimator)
+    try:
+        # 前面排着一个约 100 秒的任务，新任务无法在 30 秒内完成
+        running = jobs.submit(make_text_job(tmp_path, 'running', "x" * 1000))
+        assert wait_for(lambda: running.status == 'running')
+        with pytest.raises(DeadlineError) as exc:
+            jobs.submit(make_text_job(tmp_path, 'late', "hi"), deadline=30)
+        assert exc.value.estimated_seconds > 30
+        assert jobs.get('late') is None
+        ok = jobs.submit(make_text_job(tmp_path, 'ok', "hi"), deadline=300)
+        assert ok.info['estimated_start'] > running.started_at + 90
+    finally:
+        release.set()
+        jobs.shutdown()
+
+
+def test_store_claims_shortest_first(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    store.enqueue('long', 'render', {}, info={'estimate': {'render_seconds': 300.0}})
+    store.enqueue('plain', 'render', {})
+    start = store.enqueue('short', 'render', {}, info={'estimate': {'render_seconds': 10.0}})
+    assert store.get('short')['info']['estimated_start'] == pytest.approx(start)
+    assert [store.claim('w')['task_id'] for _ in range(3)] == ['plain', 'short', 'long']
+    with pytest.raises(DeadlineError):
+        store.enqueue('late', 'render', {}, info={'estimate': {'render_seconds': 60.0}}, deadline=30)
+    assert store.get('late') is None
@@ -0,0 +1,93 @@
+import threading
+import pytest
+from app.job_queue import Job, JobQueue, QueueFullError
+
+
+def test_job_queue_runs_jobs():
+    def handler(job):
+        job.set_stage('work', 0.5)
+        if job.params['fail']:
+            raise RuntimeError("boom")
+        return job.params['value'] * 2
+
+    jobs = JobQueue([('work', handler)], max_depth=4, stage_config={'work': {'workers': 2}})
+    try:
+        ok = jobs.submit(Job('ok', {'fail': False, 'value': 21}))
+        bad = jobs.submit(Job('bad', {'fail': True, 'value': 0}))
+        for _ in range(100):
+            if ok.finished and bad.finished:
+                break
+            threading.Event().wait(0.01)
+        assert ok.status == 'done' and ok.result == 42 and ok.progress == 1.0
+        assert bad.status == 'failed' and bad.error == "boom"
+        assert [e['status'] for e in ok.events] == ['queued', 'running', 'running', 'done']
+        assert jobs.get('ok') is ok
+    finally:
+        jobs.shutdown()
+
+
+def test_job_queue_backpressure():
+    release = threading.Event()
+    jobs = JobQueue([('work', lambda job: release.wait(5))], max_depth=1, stage_config={})
+    try:
+        running = jobs.submit(Job('running', {}))
+        for _ in range(100):
+            if running.status == 'running':
+                break
+            threading.Event().wait(0.01)
+        jobs.submit(Job('queued', {}))
+        with pytest.raises(QueueFullError) as exc:
+            jobs.submit(Job('rejected', {}))
+        assert exc.value.retry_after > 0
+        assert jobs.get('rejected') is None
+        assert jobs.stats()['queued'] == 1
+    finally:
+        release.set()
+        jobs.shutdown()
+
+
+def test_job_queue_stages():
+    jobs = JobQueue([('a', lambda job: job.params.append('a')),
+                     ('b', lambda job: job.params.append('b') or len(job.params))],
+                    max_depth=4, stage_config={})
+    try:
+        job = jobs.submit(Job('staged', []))
+        for _ in range(100):
+            if job.finished:
+                break
+            threading.Event().wait(0.01)
+        assert job.status == 'done' and job.result == 2 and job.params == ['a', 'b']
+        assert jobs.stats()['stages']['b']['processed'] == 1
+    finally:
+        jobs.shutdown()
+
+
+def test_finished_jobs_release_artifacts():
+    def handler(job):
+        job.artifacts['audio'] = object()
+        if job.params.get('fail'):
+            raise RuntimeError("boom")
+
+    def followup(job):
+        if job.task_id != 'first':
+            return None
+        next_job = Job('next', {})
+        next_job.artifacts = dict(job.artifacts)
+        handed_over.append(next_job.artifacts['audio'])
+        return next_job
+
+    handed_over = []
+    jobs = JobQueue([('work', handler)], max_depth=4, stage_config={}, followup=followup)
+    try:
+        first = jobs.submit(Job('first', {}))
+        failed = jobs.submit(Job('failed', {'fail': True}))
+        for _ in range(100):
+            if first.finished and failed.finished and jobs.get('next') and jobs.get('next').finished:
+                break
+            threading.Event().wait(0.01)
+        assert first.status == 'done' and failed.status == 'failed'
+        # 后续任务拿到了中间结果，结束的任务不再持有
+        assert len(handed_over) == 1
+        assert first.artifacts == {} and failed.artifacts == {} and jobs.get('next').artifacts == {}
+    finally:
+        jobs.shutdown()
@@ -0,0 +1,55 @@
+import time
+import pytest
+from app.job_queue import QueueFullError
+from app.job_store import JobHandle, SQLiteJobStore
+
+
+def make_store(tmp_path, **kwargs):
+    return SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), **kwargs)
+
+
+def test_claim_complete(tmp_path):
+    store = make_store(tmp_path)
+    store.enqueue('batch', 'render', {'items': [1, 2]}, aliases=['a', 'b'])
+    assert store.claim('w1', kinds=['stream']) is None
+    record = store.claim('w1', kinds=['render'])
+    assert record['task_id'] == 'batch' and record['params'] == {'items': [1, 2]}
+    assert record['status'] == 'running' and record['attempts'] == 1
+    assert store.claim('w2') is None
+
+    assert store.update('batch', 'w1', stage='tts', progress=0.1, info={'segments': 3})
+    assert not store.update('batch', 'w2', progress=0.5)
+    assert store.complete('batch', 'w1', ['a.mp4', 'b.mp4'], [{'name': 'tts', 'wall_time': 1.0}])
+
+    record = store.get('a')
+    assert record['task_id'] == 'batch' and record['status'] == 'done'
+    assert record['result'] == ['a.mp4', 'b.mp4'] and record['info'] == {'segments': 3}
+    handle = JobHandle(store, 'b')
+    assert handle.finished and handle.spans[0]['name'] == 'tts'
+    assert store.stats()['done'] == 1
+
+
+def test_expired_lease_is_requeued(tmp_path):
+    store = make_store(tmp_path, lease_seconds=0.05, max_attempts=2)
+    store.enqueue('job', 'render', {})
+    assert store.claim('crashed')['attempts'] == 1
+    time.sleep(0.1)
+    record = store.claim('w2')
+    assert record['worker_id'] == 'w2' and record['attempts'] == 2
+    # 原节点的租约已被回收，结果不再写回
+    assert not store.heartbeat('job', 'crashed')
+    assert not store.complete('job', 'crashed', 'stale.mp4')
+
+    time.sleep(0.1)
+    assert store.claim('w3') is None
+    record = store.get('job')
+    assert record['status'] == 'failed' and "2" in record['error']
+
+
+def test_enqueue_backpressure(tmp_path):
+    store = make_store(tmp_path, max_queued=1)
+    store.enqueue('first', 'render', {})
+    with pytest.raises(QueueFullError) as exc:
+        store.enqueue('second', 'render', {})
+    assert exc.value.retry_after > 0
+    assert store.get('second') is None
@@ -0,0 +1,37 @@
+import pytest
+from app.metrics import Histogram, Registry, render_metrics, span
+
+
+def test_span_records_nested_steps():
+    trace = []
+    with span('stage', trace):
+        with span('step'):
+            pass
+    assert [s['name'] for s in trace] == ['step', 'stage']
+    assert [s['depth'] for s in trace] == [1, 0]
+    assert all(s['wall_time'] >= 0 and s['peak_rss_bytes'] > 0 for s in trace)
+    # 区间结束后不再记录到该 trace
+    with span('outside'):
+        pass
+    assert len(trace) == 2
+    assert 'avatar_span_seconds_count{span="stage"}' in render_metrics()
+
+
+def test_span_records_errors():
+    trace = []
+    with pytest.raises(ValueError):
+        with span('stage', trace):
+            raise ValueError("boom")
+    assert trace[0]['error'] == 'ValueError'
+
+
+def test_histogram_exposition():
+    registry = Registry()
+    hist = registry.register(Histogram('test_seconds', 'test', buckets=(1, 5)))
+    hist.observe(0.5, stage='tts')
+    hist.observe(3, stage='tts')
+    text = registry.render()
+    assert 'test_seconds_bucket{le="1",stage="tts"} 1' in text
+    assert 'test_seconds_bucket{le="5",stage="tts"} 2' in text
+    assert 'test_seconds_bucket{le="+Inf",stage="tts"} 2' in text
+    assert 'test_seconds_count{stage="tts"} 2' in text
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from app.model_store import ModelStore, process_memory, store_key
+from scripts import bench_model_memory
+
+
+def test_store_key(tmp_path):
+    tensors = [('weight', (4, 4), 'float32')]
+    key = store_key('unet', tensors)
+    assert key.startswith('unet_') and key == store_key('unet', tensors)
+    assert store_key('unet', [('weight', (4, 4), 'float16')]) != key
+    source = tmp_path / "unet.pth"
+    source.write_bytes(b'0' * 16)
+    with_source = store_key('unet', tensors, str(source))
+    assert with_source != key
+    source.write_bytes(b'0' * 32)
+    assert store_key('unet', tensors, str(source)) != with_source
+
+
+def test_process_memory():
+    memory = process_memory()
+    assert memory['rss'] > 0 and memory['uss'] > 0
+    assert memory['uss'] <= memory['pss'] <= memory['rss']
+
+
+def test_share_maps_weights(tmp_path):
+    torch = pytest.importorskip('torch')
+    store = ModelStore(str(tmp_path))
+    module = torch.nn.Linear(8, 8)
+    expected = module(torch.ones(1, 8))
+    store.share('linear', module)
+    assert torch.allclose(module(torch.ones(1, 8)), expected)
+    assert os.path.exists(store.stats()['models']['linear']['path'])
+    # 同名同结构的模块（另一个工作进程）直接映射已有的存储文件
+    other = store.share('linear', torch.nn.Linear(8, 8))
+    assert torch.allclose(other(torch.ones(1, 8)), expected)
+    assert sorted(os.listdir(tmp_path)) == sorted([os.path.basename(store.stats()['models']['linear']['path']),
+                                                   os.path.basename(store.skeleton_path('linear'))])
+
+
+class Wrapper:
+    """模拟 MuseTalk 的 VAE / UNet 包装类：模块作为属性，另有非持久 buffer"""
+
+    def __init__(self, torch):
+        self.model = torch.nn.Linear(8, 8)
+        self.model.register_buffer('scale', torch.full((8,), 2.0), persistent=False)
+        self.scaling_factor = 0.5
+
+    def __call__(self, x):
+        return self.model(x) * self.model.scale * self.scaling_factor
+
+
+def test_load_from_store(tmp_path):
+    torch = pytest.importorskip('torch')
+    source = tmp_path / "weights.pth"
+    source.write_bytes(b'0' * 16)
+    store = ModelStore(str(tmp_path / "store"))
+    assert store.load('wrapper', str(source)) is None
+    wrapper = Wrapper(torch)
+    wrapper.model.requires_grad_(False)
+    expected = wrapper(torch.ones(1, 8))
+    store.share('wrapper', wrapper, str(source))
+    assert torch.allclose(wrapper(torch.ones(1, 8)), expected)
+
+    # 后续工作进程不构造、不加载模型，直接由骨架和映射的参数得到同样的对象
+    other = ModelStore(str(tmp_path / "store")).load('wrapper', str(source))
+    assert isinstance(other, Wrapper) and other.scaling_factor == 0.5
+    assert torch.allclose(other(torch.ones(1, 8)), expected)
+    assert other.model.weight.device.type == 'cpu' and not other.model.weight.requires_grad
+    # 源权重文件更新后存储视为过期
+    source.write_bytes(b'0' * 32)
+    assert store.load('wrapper', str(source)) is None
+
+
+def test_shared_weights_memory():
+    report = bench_model_memory.main(worker_counts=[2], synthetic_mb=32, timeout=120)
+    uss = {result['mode']: result['uss_mb'] for result in report['results']}
+    assert uss['mmap'] < uss['copy'] - 8
+
+
+def test_bench_loads_real_engines(monkeypatch):
+    from app import musetalk_engine, tts
+    from app.config import MODEL_STORE, MUSETALK_BACKEND
+
+    class StubEngine:
+        """记录构造参数，load() 不加载模型"""
+
+        def __init__(self, *args, **kwargs):
+            self.args, self.kwargs, self.loaded = args, kwargs, False
+
+        def load(self):
+            self.loaded = True
+
+    monkeypatch.setattr(musetalk_engine, 'MuseTalkEngine', StubEngine)
+    monkeypatch.setattr(tts, 'TTSEngine', StubEngine)
+    monkeypatch.setitem(MODEL_STORE, 'enabled', False)
+    tts_engine, engine = bench_model_memory._load_models('mmap', None)
+    assert tts_engine.loaded and engine.loaded and MODEL_STORE['enabled']
+    # 推理后端按关键字传入，不能落到 device 参数上
+    assert len(engine.args) <= 3 and engine.kwargs['backend'] == MUSETALK_BACKEND['backend']
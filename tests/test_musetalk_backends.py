@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from app.musetalk_backends import _decoded_to_bgr, frame_psnr, make_backend
+from app.musetalk_engine import MuseTalkEngine, get_musetalk_engine
+
+
+def test_frame_psnr():
+    frame = np.full((8, 8, 3), 100, dtype=np.uint8)
+    assert frame_psnr(frame, frame) == float('inf')
+    noisy = frame.copy()
+    noisy[0, 0, 0] += 16
+    assert 40 < frame_psnr(frame, noisy) < 60
+    assert frame_psnr(frame, noisy) > frame_psnr(frame, frame + 16)
+
+
+def test_decoded_to_bgr():
+    image = np.zeros((1, 3, 2, 2), dtype=np.float32)
+    image[0, 0] = 1.0  # R 通道最大
+    out = _decoded_to_bgr(image)
+    assert out.shape == (1, 2, 2, 3) and out.dtype == np.uint8
+    assert out[0, 0, 0].tolist() == [128, 128, 255]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        make_backend("tensorrt", {})
+
+
+def test_cpu_backend_engine_ignores_float16():
+    engine = MuseTalkEngine("v1.5", "tests/no_musetalk", use_float16=True, device='cuda', backend='int8')
+    assert engine.use_float16 is False and engine.device == 'cpu'
+    torch_engine = get_musetalk_engine("v1.5", "tests/no_musetalk", use_float16=False, backend='torch')
+    int8_engine = get_musetalk_engine("v1.5", "tests/no_musetalk", use_float16=True, backend='int8')
+    assert int8_engine is not torch_engine and int8_engine.backend == 'int8'
+    assert get_musetalk_engine("v1.5", "tests/no_musetalk", use_float16=False, backend='int8') is int8_engine
@@ -0,0 +1,98 @@
+import threading
+
+import numpy as np
+
+from app import musetalk_batch
+from app.artifacts import AudioArtifact, ImageArtifact
+from app.config import MUSETALK_BATCH
+from app.job_queue import Job, JobQueue
+from app.musetalk_batch import MuseTalkBatcher
+from app.render import make_item, render_stage_config, stage_lipsync
+
+
+def test_batcher_coalesces_pending_tasks(tmp_path, fake_musetalk):
+    musetalk_dir, log_path = fake_musetalk
+    batcher = MuseTalkBatcher(max_batch_size=4, max_wait=0.5, musetalk_dir=musetalk_dir, use_engine=False)
+    try:
+        futures = []
+        for i in range(6):
+            task_dir = tmp_path / f"task{i}"
+            task_dir.mkdir()
+            (task_dir / "input.jpg").write_bytes(f"image-{i}|".encode())
+            (task_dir / "tts.wav").write_bytes(f"audio-{i}".encode())
+            # 最后一个任务帧率不同，必须单独成批
+            futures.append(batcher.submit(str(task_dir / "input.jpg"), str(task_dir / "tts.wav"),
+                                          str(task_dir / "out.mp4"), version="v1.5",
+                                          fps=30 if i == 5 else 25))
+        for i, future in enumerate(futures):
+            # 子进程方式没有渲染统计
+            assert future.result(timeout=10) is None
+            assert (tmp_path / f"task{i}" / "out.mp4").read_bytes() == f"image-{i}|audio-{i}".encode()
+
+        # 4 个满批 + 1 个等待超时的批 + 1 个不同帧率的批
+        assert open(log_path).read().count("start") == 3
+        assert batcher.stats()['batches'] == 3
+        assert batcher.stats()['tasks'] == 6
+    finally:
+        batcher.shutdown()
+
+
+def test_batcher_keeps_per_task_settings(monkeypatch):
+    calls = []
+    monkeypatch.setattr('app.musetalk_batch.musetalk_sync_batch',
+                        lambda tasks, **kwargs: calls.append((len(tasks), kwargs)) or [None] * len(tasks))
+    batcher = MuseTalkBatcher(max_batch_size=8, max_wait=0.2, use_engine=False)
+    preview = {'preset': 'ultrafast', 'crf': 30}
+    try:
+        futures = [
+            batcher.submit("a.jpg", "a.wav", "a.mp4", version="v1.5", fps=25),
+            batcher.submit("b.jpg", "b.wav", "b.mp4", version="v1.5", fps=25),
+            batcher.submit("c.jpg", "c.wav", "c.mp4", version="v1.5", fps=25, sink_options=preview),
+            batcher.submit("d.jpg", "d.wav", "d.mp4", version="v1.5", fps=25, backend='int8', use_engine=True),
+        ]
+        for future in futures:
+            future.result(timeout=10)
+    finally:
+        batcher.shutdown()
+    # 编码参数、推理后端或引擎方式不同的任务不合并，且各自的设置传给 musetalk_sync_batch
+    settings = {(kw['backend'], kw['use_engine'], n): kw['sink_options'] for n, kw in calls}
+    assert settings == {(None, False, 2): None, (None, False, 1): preview, ('int8', True, 1): None}
+
+
+def test_scheduler_batches_lipsync_jobs(tmp_path, monkeypatch):
+    sizes = []
+
+    def fake_batch(tasks, **kwargs):
+        sizes.append(len(tasks))
+        return [{'frames': 10, 'skipped_frames': 4} for _ in tasks]
+
+    monkeypatch.setattr('app.musetalk_batch.musetalk_sync_batch', fake_batch)
+    monkeypatch.setitem(MUSETALK_BATCH, 'enabled', True)
+    monkeypatch.setitem(MUSETALK_BATCH, 'max_batch_size', 4)
+    batcher = MuseTalkBatcher(max_batch_size=4, max_wait=0.5, use_engine=False)
+    monkeypatch.setattr(musetalk_batch, '_batcher', batcher)
+    # PIPELINE_STAGES 默认口型阶段只有 1 个工作线程，启用凑批时按 max_batch_size 扩充
+    config = render_stage_config({'lipsync': {'workers': 1, 'queue_size': 2}})
+    assert config['lipsync'] == {'workers': 4, 'queue_size': 2, 'pin': False}
+    jobs = JobQueue([('lipsync', stage_lipsync)], max_depth=8, stage_config=config)
+    try:
+        submitted = []
+        for i in range(4):
+            text_path = tmp_path / f"task{i}.txt"
+            text_path.write_text("hello", encoding='utf-8')
+            item = make_item(str(tmp_path / f"task{i}"), str(text_path), 'input.jpg', 0)
+            job = Job(f"task{i}", {'items': [item], 'musetalk_version': 'v1.5', 'use_float16': False, 'fps': 25})
+            job.artifacts = {item['tts_path']: AudioArtifact(samples=np.zeros(1600, dtype=np.float32), sample_rate=16000),
+                             item['image_path']: ImageArtifact(path='input.jpg')}
+            submitted.append(jobs.submit(job))
+        for _ in range(300):
+            if all(job.finished for job in submitted):
+                break
+            threading.Event().wait(0.01)
+        assert all(job.status == 'done' for job in submitted)
+    finally:
+        jobs.shutdown()
+        batcher.shutdown()
+    assert max(sizes) > 1
+    # 凑批路径同样记录常驻引擎的静音帧跳过比例
+    assert all(job.info['skipped_frame_ratio'] == 0.4 for job in submitted)
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from app.musetalk_engine import MuseTalkEngine, get_musetalk_engine, register_musetalk_engine
+
+
+def test_engine_registry():
+    engine = get_musetalk_engine("v1.5", "tests/no_musetalk", use_float16=False)
+    assert get_musetalk_engine("v1.5", "tests/no_musetalk", use_float16=False) is engine
+    assert get_musetalk_engine("v1.0", "tests/no_musetalk", use_float16=False) is not engine
+
+    replacement = MuseTalkEngine("v1.5", "tests/no_musetalk", use_float16=False)
+    assert register_musetalk_engine(replacement) is engine
+    assert get_musetalk_engine("v1.5", "tests/no_musetalk", use_float16=False) is replacement
+
+
+def test_engine_load_failure_is_remembered():
+    engine = MuseTalkEngine("v1.5", "tests/no_musetalk")
+    with pytest.raises(FileNotFoundError):
+        engine.load()
+    # 失败结果被记录，回退路径不会每次请求都重新尝试加载
+    with pytest.raises(FileNotFoundError):
+        engine.load()
+    assert engine.stats()['load_error'] is not None
+
+
+def test_no_loading_after_startup(tmp_path, monkeypatch):
+    import os
+    from app import musetalk_engine
+    monkeypatch.setattr(musetalk_engine, '_loading_closed', musetalk_engine.threading.Event())
+    cwd = os.getcwd()
+    musetalk_engine.close_engine_loading()
+    engine = MuseTalkEngine("v1.5", str(tmp_path))
+    # 请求线程开始工作后不再切换工作目录加载模型，调用方回退到子进程方式
+    with pytest.raises(RuntimeError):
+        engine.load()
+    assert os.getcwd() == cwd and not engine.loaded
+
+
+def test_preloaded_engine_configs(monkeypatch):
+    from app import musetalk_engine
+    from app.config import MUSETALK_DIR, MUSETALK_ENGINE
+    from scripts.bench_fakes import SyntheticMuseTalkEngine
+    monkeypatch.setattr(musetalk_engine, '_loading_closed', musetalk_engine.threading.Event())
+    monkeypatch.setattr(musetalk_engine, '_engines', {})
+    monkeypatch.setitem(MUSETALK_ENGINE, 'preload_engines', [
+        {'version': 'v1.5', 'use_float16': False, 'backend': 'torch'},
+        {'version': 'v1.0', 'use_float16': False, 'backend': 'torch'},
+    ])
+    for version in ('v1.5', 'v1.0'):
+        register_musetalk_engine(SyntheticMuseTalkEngine(version, MUSETALK_DIR, use_float16=False))
+    assert len(musetalk_engine.warmup_engines()) == 2
+    musetalk_engine.close_engine_loading()
+    # 启动时加载的每个组合都可用，未列出的组合明确不可用（而不是悄悄回退）
+    assert musetalk_engine.engine_available('v1.5', False, 'torch')
+    assert musetalk_engine.engine_available('v1.0', False, 'torch')
+    assert not musetalk_engine.engine_available('v1.0', True, 'torch')
+
+
+def test_unknown_version():
+    with pytest.raises(ValueError):
+        MuseTalkEngine("v2.0")
+
+
+class CountingEngine(MuseTalkEngine):
+    """不加载模型，推理结果为固定图像，记录推理过的帧"""
+
+    def __init__(self, backend=None, value=200):
+        super().__init__("v1.5", "tests/no_musetalk", backend=backend)
+        self.inferred = []
+        self.value = value
+
+    def _infer_frames(self, whisper_chunks, latent_list, frame_indices=None):
+        frame_indices = list(range(len(whisper_chunks))) if frame_indices is None else frame_indices
+        self.inferred.extend(frame_indices)
+        return [np.full((4, 4, 3), self.value, dtype=np.uint8) for _ in frame_indices]
+
+
+def test_silent_frames_skip_inference(tmp_path):
+    t = np.arange(16000) / 16000
+    tone = (0.5 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    audio_path = str(tmp_path / "speech.wav")
+    sf.write(audio_path, np.concatenate([tone, np.zeros(16000, dtype=np.float32), tone]), 16000)
+
+    engine = CountingEngine()
+    avatar = {'latent_list': [None]}
+    frames, skipped = engine._lip_frames(avatar, np.zeros((75, 1)), audio_path, 25)
+    assert len(frames) == 75 and skipped > 0
+    # 闭口帧只推理一次，之后缓存在形象数据中
+    assert len(engine.inferred) == 75 - skipped + 1
+    assert avatar['silent_frames']['torch'] is not None
+    engine._lip_frames(avatar, np.zeros((75, 1)), audio_path, 25)
+    assert len(engine.inferred) == 2 * (75 - skipped) + 1
+
+    # 形象缓存的键不含推理后端：其它后端共用同一形象时推理自己的闭口帧
+    int8 = CountingEngine(backend='int8', value=100)
+    frames, _ = int8._lip_frames(avatar, np.zeros((75, 1)), audio_path, 25)
+    assert len(int8.inferred) == 75 - skipped + 1
+    assert all((frame == 100).all() for frame in frames)
+    assert (avatar['silent_frames']['torch'] == 200).all()
@@ -0,0 +1,107 @@
+import os
+import threading
+import pytest
+from app import musetalk_sync as musetalk_module
+from app.config import MUSETALK_ENGINE
+from app.musetalk_sync import musetalk_sync, musetalk_sync_batch
+
+
+def max_overlap(log_path):
+    events = []
+    for line in open(log_path):
+        kind, t = line.split()
+        events.append((float(t), 1 if kind == "start" else -1))
+    running = peak = 0
+    for _, delta in sorted(events):
+        running += delta
+        peak = max(peak, running)
+    return peak
+
+
+def test_concurrent_renders_are_isolated(tmp_path, monkeypatch, fake_musetalk):
+    musetalk_dir, log_path = fake_musetalk
+    monkeypatch.setattr(musetalk_module, "_subprocess_slots", threading.BoundedSemaphore(3))
+    cwd = os.getcwd()
+
+    tasks = []
+    for i in range(8):
+        task_dir = tmp_path / f"task{i}"
+        task_dir.mkdir()
+        # 所有任务使用相同的文件名，共享路径时必然互相覆盖
+        (task_dir / "input.jpg").write_bytes(f"image-{i}|".encode())
+        (task_dir / "tts.wav").write_bytes(f"audio-{i}".encode())
+        tasks.append(task_dir)
+
+    errors = []
+
+    def run(task_dir):
+        try:
+            musetalk_sync(str(task_dir / "input.jpg"), str(task_dir / "tts.wav"),
+                          str(task_dir / "musetalk_output.mp4"), musetalk_dir=musetalk_dir,
+                          version="v1.5", use_engine=False)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(t,)) for t in tasks]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert os.getcwd() == cwd
+    for i, task_dir in enumerate(tasks):
+        assert (task_dir / "musetalk_output.mp4").read_bytes() == f"image-{i}|audio-{i}".encode()
+        # 成功后清理任务工作区
+        assert sorted(os.listdir(task_dir)) == ["input.jpg", "musetalk_output.mp4", "tts.wav"]
+    assert 1 < max_overlap(log_path) <= 3
+    # MuseTalk 目录中的共享配置与数据目录不再被写入
+    assert not os.path.exists(os.path.join(musetalk_dir, "data"))
+    assert os.path.getsize(os.path.join(musetalk_dir, "configs/inference/test.yaml")) == 0
+
+
+def test_batch_renders_in_one_invocation(tmp_path, fake_musetalk):
+    musetalk_dir, log_path = fake_musetalk
+    tasks = []
+    for i in range(3):
+        task_dir = tmp_path / f"task{i}"
+        task_dir.mkdir()
+        (task_dir / "input.jpg").write_bytes(f"image-{i}|".encode())
+        (task_dir / "tts.wav").write_bytes(f"audio-{i}".encode())
+        tasks.append({
+            'image_path': str(task_dir / "input.jpg"),
+            'audio_path': str(task_dir / "tts.wav"),
+            'output_path': str(task_dir / "musetalk_output.mp4"),
+            'bbox_shift': i,
+        })
+    musetalk_sync_batch(tasks, musetalk_dir=musetalk_dir, version="v1.5", use_engine=False)
+
+    assert open(log_path).read().count("start") == 1
+    # 输入以链接放入工作区，结果改名移出，成功后不留副本
+    assert sorted(os.listdir(tmp_path / "task0")) == ["input.jpg", "musetalk_output.mp4", "tts.wav"]
+    for i, task in enumerate(tasks):
+        assert open(task['output_path'], 'rb').read() == f"image-{i}|audio-{i}".encode()
+
+
+def test_failed_workspace_is_removed(tmp_path, monkeypatch, fake_musetalk):
+    musetalk_dir, _ = fake_musetalk
+    # 调用日志路径指向目录，假推理脚本写日志时失败退出
+    monkeypatch.setenv("FAKE_MUSETALK_LOG", str(tmp_path))
+    task_dir = tmp_path / "task"
+    task_dir.mkdir()
+    (task_dir / "input.jpg").write_bytes(b"image|")
+    (task_dir / "tts.wav").write_bytes(b"audio")
+
+    def render():
+        with pytest.raises(RuntimeError):
+            musetalk_sync(str(task_dir / "input.jpg"), str(task_dir / "tts.wav"),
+                          str(task_dir / "musetalk_output.mp4"), musetalk_dir=musetalk_dir,
+                          version="v1.5", use_engine=False)
+
+    render()
+    assert sorted(os.listdir(task_dir)) == ["input.jpg", "tts.wav"]
+    # 打开排查开关时保留失败调用的工作区
+    monkeypatch.setitem(MUSETALK_ENGINE, 'keep_failed_workspace', True)
+    render()
+    kept = [name for name in os.listdir(task_dir) if name.startswith("musetalk_")]
+    assert len(kept) == 1 and os.path.exists(task_dir / kept[0] / "inference.yaml")
@@ -0,0 +1,101 @@
+import json
+import threading
+
+from app.job_queue import Job, JobQueue
+from app.job_store import SQLiteJobStore
+from app.artifacts import ImageArtifact
+from app.quality import tier_fps, tier_image, tier_sink_options, upgrade_job
+from app.worker import Worker
+
+
+def test_quality_tiers():
+    assert tier_fps({'fps': 25, 'quality': 'preview'}) == 12
+    assert tier_fps({'fps': 10, 'quality': 'preview'}) == 10
+    assert tier_fps({'fps': 25, 'quality': 'full'}) == 25
+    assert tier_sink_options({'fps': 25, 'quality': 'preview'}) == {'preset': 'ultrafast', 'crf': 30}
+    assert tier_sink_options({'fps': 25}) == {}
+    # MuseTalk 的人脸裁剪固定为 256×256，缩小参考图不减少推理量，预览档位沿用原图
+    image = ImageArtifact(path='input.jpg')
+    assert tier_image({'image_path': 'input.jpg', 'video_path': 'out/video.mp4'},
+                      {'fps': 25, 'quality': 'preview'}, image) is image
+
+
+def test_upgrade_job():
+    full = Job('full', {'fps': 25, 'quality': 'full'})
+    assert upgrade_job(full) is None
+    preview = Job('task', {'fps': 25, 'quality': 'preview'})
+    preview.update(status='running')
+    preview.update(status='done')
+    upgrade = upgrade_job(preview)
+    assert upgrade.task_id == 'task'
+    assert upgrade.params == {'fps': 25, 'quality': 'full', 'reuse_tts': True}
+    assert upgrade.info['preview_ready'] and upgrade.info['preview_time'] >= 0
+    assert upgrade_job(Job('task', {'fps': 25, 'quality': 'preview', 'auto_upgrade': False})) is None
+
+
+def test_job_queue_upgrades_preview():
+    rendered = []
+    jobs = JobQueue([('work', lambda job: rendered.append(job.params['quality']))], max_depth=4,
+                    stage_config={}, followup=upgrade_job)
+    try:
+        jobs.submit(Job('task', {'fps': 25, 'quality': 'preview'}))
+        for _ in range(200):
+            job = jobs.get('task')
+            if job is not None and job.params['quality'] == 'full' and job.finished:
+                break
+            threading.Event().wait(0.01)
+        assert rendered == ['preview', 'full']
+        assert job.status == 'done' and job.info['preview_ready']
+    finally:
+        jobs.shutdown()
+
+
+def test_worker_upgrades_preview(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+    rendered = []
+    worker = Worker(store, handlers={'render': lambda job: rendered.append(job.params['quality'])},
+                    heartbeat_interval=60)
+    store.enqueue('task', 'render', {'fps': 25, 'quality': 'preview'})
+    worker.run_once()
+    record = store.get('task')
+    assert record['status'] == 'queued' and record['params']['quality'] == 'full'
+    assert record['info']['preview_ready']
+    worker.run_once()
+    assert rendered == ['preview', 'full']
+    assert store.get('task')['status'] == 'done'
+    assert worker.run_once() is None
+
+
+def test_main_many_upgrades_previews(tmp_path, monkeypatch):
+    import pipeline
+
+    class StubTTS:
+        def load(self):
+            pass
+
+        def stats(self):
+            return {}
+
+    rendered = []
+    lock = threading.Lock()
+
+    def mux(job):
+        with lock:
+            rendered.append((job.task_id, job.params['quality']))
+        return job.params['items'][0]['final_path']
+
+    monkeypatch.setattr(pipeline, 'get_tts_engine', lambda: StubTTS())
+    monkeypatch.setattr(pipeline, 'preload_musetalk', lambda params: None)
+    monkeypatch.setattr(pipeline, 'RENDER_STAGES', [('tts', lambda job: None), ('lipsync', lambda job: None),
+                                                    ('mux', mux)])
+    text_paths = []
+    for name in ('a', 'b'):
+        text_path = tmp_path / f"{name}.txt"
+        text_path.write_text("hello", encoding='utf-8')
+        text_paths.append(str(text_path))
+    pipeline.main_many(text_paths, 'input.jpg', str(tmp_path / "out"), None, quality='preview',
+                       report_path=str(tmp_path / "report.json"))
+    # 每个文本先出预览，再以完整画质重渲染
+    assert sorted(rendered) == [('a', 'full'), ('a', 'preview'), ('b', 'full'), ('b', 'preview')]
+    jobs = json.load(open(tmp_path / "report.json"))['jobs']
+    assert all(job['preview_time'] is not None and job['final_video'] for job in jobs)
@@ -0,0 +1,143 @@
+import os
+import threading
+
+from app.realtime import RealtimeSession
+from scripts.bench_fakes import SyntheticMuseTalkEngine, ToneBarkEngine
+
+
+def make_session(tmp_path, events):
+    image_path = str(tmp_path / "avatar.png")
+    open(image_path, "wb").close()
+    lock = threading.Lock()
+
+    def on_event(event):
+        with lock:
+            events.append(event)
+
+    session = RealtimeSession(image_path, str(tmp_path / "session"), on_event, fps=25, quality='full',
+                              tts_engine=ToneBarkEngine(seconds_per_char=0.02, rtf=0.0),
+                              musetalk_engine=SyntheticMuseTalkEngine(frame_cost=0.0))
+    session.open()
+    return session
+
+
+def test_session_streams_sentences_in_order(tmp_path):
+    events = []
+    session = make_session(tmp_path, events)
+    try:
+        assert session.feed("你好，") == 0
+        assert session.feed("世界。今天") == 1
+        assert session.feed("天气很好！还有") == 1
+        assert session.flush() == 1
+        session.wait()
+    finally:
+        stats = session.close()
+
+    assert [(e['type'], e['seq']) for e in events if e['type'] == 'video'] == [
+        ('video', 0), ('video', 1), ('video', 2)]
+    assert [e['text'] for e in events if e['type'] == 'audio'] == ["你好，世界。", "今天天气很好！", "还有"]
+    for seq in range(3):
+        kinds = [e['type'] for e in events if e['seq'] == seq]
+        assert kinds == ['audio', 'video']
+    video = [e for e in events if e['type'] == 'video'][0]
+    assert video['data'][4:8] == b'ftyp' and video['latency'] >= video['lipsync_time']
+    assert stats['chunks'] == 3 and stats['fps'] == 25 and stats['first_chunk_latency'] is not None
+    assert not os.path.exists(tmp_path / "session")
+
+
+def test_session_reports_errors_and_continues(tmp_path):
+    events = []
+    session = make_session(tmp_path, events)
+    original = session.musetalk_engine.render
+
+    def render(image_path, audio_path, output_path, **kwargs):
+        if output_path.endswith("chunk_00000.mp4"):
+            raise RuntimeError("boom")
+        return original(image_path, audio_path, output_path, **kwargs)
+
+    session.musetalk_engine.render = render
+    try:
+        session.feed("第一句。第二句。")
+        session.wait()
+    finally:
+        stats = session.close()
+    assert [(e['type'], e['seq']) for e in events if e['type'] != 'audio'] == [('error', 0), ('video', 1)]
+    assert stats['submitted'] == 2 and stats['chunks'] == 1
+
+
+def test_registered_avatar_prepared_for_session_tier(tmp_path, monkeypatch):
+    import cv2
+    import numpy as np
+    from app.artifacts import image_artifact
+    from app.config import QUALITY
+    from app.realtime import prepare_session_avatar
+
+    monkeypatch.setitem(QUALITY['tiers'], 'preview', {**QUALITY['tiers']['preview'], 'image_scale': 0.5})
+
+    class RecordingEngine(SyntheticMuseTalkEngine):
+        def get_avatar(self, image, bbox_shift):
+            keys.append(image_artifact(image).sha256())
+            return super().get_avatar(image, bbox_shift)
+
+    keys = []
+    registry_dir = tmp_path / "avatars" / "abc"
+    registry_dir.mkdir(parents=True)
+    image_path = str(registry_dir / "image.jpg")
+    cv2.imwrite(image_path, np.full((64, 48, 3), 128, dtype=np.uint8))
+    engine = RecordingEngine(frame_cost=0.0)
+    prepare_session_avatar(engine, image_path, 0, quality='preview')
+    session = RealtimeSession(image_path, str(tmp_path / "session"), lambda event: None, quality='preview',
+                              tts_engine=ToneBarkEngine(seconds_per_char=0.02, rtf=0.0), musetalk_engine=engine)
+    # 会话按同一档位缩小的形象与注册时预处理的缓存键相同，开启会话不再重新预处理
+    assert session.image.sha256() == keys[0]
+    assert keys[0] != image_artifact(image_path).sha256()
+
+
+def test_websocket_rejects_malformed_messages(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from api import fastapi_app
+    from app.avatar_cache import register_avatar
+    from app.config import AVATAR_CACHE
+
+    monkeypatch.setitem(AVATAR_CACHE, 'registry_dir', str(tmp_path / "avatars"))
+    monkeypatch.setattr(fastapi_app, 'OUTPUT_DIR', str(tmp_path / "output"))
+    monkeypatch.setattr(fastapi_app, 'RealtimeSession', lambda *args, **kwargs: RealtimeSession(
+        *args, **{**kwargs, 'tts_engine': ToneBarkEngine(seconds_per_char=0.02, rtf=0.0),
+                  'musetalk_engine': SyntheticMuseTalkEngine(frame_cost=0.0)}))
+    avatar_id = register_avatar(b"image")
+    with TestClient(fastapi_app.app).websocket_connect(f"/realtime/{avatar_id}?quality=full") as ws:
+        assert ws.receive_json()['type'] == 'ready'
+        # 非 JSON 文本、二进制帧和非对象 JSON 都只回复错误，会话继续可用
+        ws.send_text("not json")
+        assert ws.receive_json()['type'] == 'error'
+        ws.send_bytes(b"\x00\x01")
+        assert ws.receive_json()['type'] == 'error'
+        ws.send_json(["text"])
+        assert ws.receive_json()['type'] == 'error'
+        ws.send_json({'type': 'text', 'text': "你好。"})
+        for kind in ('audio', 'video'):
+            header = ws.receive_json()
+            assert header['type'] == kind and len(ws.receive_bytes()) == header['bytes']
+        ws.send_json({'type': 'close'})
+        assert ws.receive_json()['type'] == 'closed'
+
+
+def test_unloaded_engine_configs_are_reported(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    from api import fastapi_app
+    from app import musetalk_engine
+    from app.avatar_cache import register_avatar
+    from app.config import AVATAR_CACHE
+
+    monkeypatch.setitem(AVATAR_CACHE, 'registry_dir', str(tmp_path / "avatars"))
+    monkeypatch.setattr(musetalk_engine, '_loading_closed', threading.Event())
+    monkeypatch.setattr(musetalk_engine, '_engines', {})
+    musetalk_engine.close_engine_loading()
+    client = TestClient(fastapi_app.app)
+    # 启动时没有加载任何引擎：注册形象给出告警而不是悄悄跳过预处理，实时会话直接报错
+    response = client.post("/avatars", files={"image": ("a.jpg", b"image")}, data={"musetalk_version": "v1.0"})
+    assert response.json()['prepared'] is False and 'preload_engines' in response.json()['warning']
+    avatar_id = register_avatar(b"image")
+    with client.websocket_connect(f"/realtime/{avatar_id}?musetalk_version=v1.0") as ws:
+        message = ws.receive_json()
+        assert message['type'] == 'error' and 'preload_engines' in message['error']
@@ -0,0 +1,54 @@
+import os
+from app.job_queue import Job
+from app.result_cache import ResultCache, request_fingerprint
+
+
+def test_fingerprint_covers_render_inputs():
+    base = request_fingerprint("你好，世界", "abc", musetalk_version="v1.5", bbox_shift=0, fps=25)
+    assert request_fingerprint("你好，世界 ", "abc", musetalk_version="v1.5", bbox_shift=0, fps=25) == base
+    assert request_fingerprint("你好，世界", "abd", musetalk_version="v1.5", bbox_shift=0, fps=25) != base
+    assert request_fingerprint("你好，世界", "abc", musetalk_version="v1.5", bbox_shift=1, fps=25) != base
+
+
+def test_claim_coalesces_then_hits(tmp_path):
+    output_dir = str(tmp_path / "output")
+    cache = ResultCache(str(tmp_path / "index"), output_dir)
+    first = Job("task-1", {})
+    assert cache.claim("fp", first) is None
+    # 相同请求在任务完成前合并到同一任务
+    assert cache.claim("fp", Job("task-2", {})) == ("task-1", "coalesced")
+
+    os.makedirs(os.path.join(output_dir, "task-1"))
+    open(os.path.join(output_dir, "task-1", "final.mp4"), "wb").close()
+    first.update(status='done')
+    assert cache.claim("fp", Job("task-3", {})) == ("task-1", "hit")
+    # 映射保存在磁盘上，重启后仍然命中
+    assert ResultCache(str(tmp_path / "index"), output_dir).claim("fp", Job("task-4", {})) == ("task-1", "hit")
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['coalesced'], stats['misses']) == (1, 1, 1)
+    assert stats['hit_rate'] == 2 / 3
+
+
+def test_failed_or_released_jobs_are_not_reused(tmp_path):
+    cache = ResultCache(str(tmp_path / "index"), str(tmp_path / "output"))
+    failed = Job("failed", {})
+    cache.claim("fp", failed)
+    failed.update(status='failed', error="boom")
+    retry = Job("retry", {})
+    assert cache.claim("fp", retry) is None
+
+    cache.release("fp", retry)
+    assert cache.claim("fp", Job("again", {})) is None
+
+
+def test_finished_jobs_are_not_retained(tmp_path):
+    cache = ResultCache(str(tmp_path / "index"), str(tmp_path / "output"))
+    jobs = [Job(f"task-{i}", {}) for i in range(3)]
+    for i, job in enumerate(jobs):
+        cache.claim(f"fp-{i}", job)
+    jobs[0].update(status='done')
+    jobs[1].update(status='failed', error="boom")
+    # 任意一次查询都会清理已结束的任务，不再持有其 Job（及内存中的中间结果）
+    cache.claim("fp-new", Job("new", {}))
+    assert set(cache._inflight) == {"fp-2", "fp-new"}
@@ -0,0 +1,49 @@
+import threading
+import time
+from app.scheduler import Stage, StageScheduler
+
+
+def test_stages_overlap_across_items():
+    active = {'tts': 0, 'lipsync': 0}
+    overlap = []
+    lock = threading.Lock()
+
+    def work(name):
+        def fn(item):
+            with lock:
+                active[name] += 1
+                if active['tts'] and active['lipsync']:
+                    overlap.append(item)
+            time.sleep(0.05)
+            with lock:
+                active[name] -= 1
+            return item
+        return fn
+
+    scheduler = StageScheduler([Stage('tts', work('tts')), Stage('lipsync', work('lipsync'), queue_size=1)])
+    try:
+        futures = [scheduler.submit(i) for i in range(4)]
+        assert [f.result(timeout=5) for f in futures] == [0, 1, 2, 3]
+        # 条目 k 口型合成时，条目 k+1 的 TTS 同时进行
+        assert overlap
+        report = scheduler.report()
+        assert report['tts']['processed'] == 4
+        assert 0 < report['lipsync']['utilization'] <= 1
+    finally:
+        scheduler.shutdown()
+
+
+def test_stage_failure_skips_later_stages():
+    done = []
+    scheduler = StageScheduler([
+        Stage('first', lambda item: 1 / item),
+        Stage('second', lambda item: done.append(item)),
+    ])
+    try:
+        future = scheduler.submit(0)
+        assert isinstance(future.exception(timeout=5), ZeroDivisionError)
+        scheduler.submit(1).result(timeout=5)
+        assert done == [1]
+        assert scheduler.report()['first']['failed'] == 1
+    finally:
+        scheduler.shutdown()
@@ -0,0 +1,86 @@
+import os
+from app import streaming
+from app.job_queue import Job
+from app.streaming import HLSPlaylist, render_stream, split_stream_text
+from app.text_segment import text_cost
+from app.tts import set_tts_engine
+from tests.test_tts import ToneTTSEngine
+
+
+def test_playlist_grows_then_ends(tmp_path):
+    path = os.path.join(tmp_path, "index.m3u8")
+    playlist = HLSPlaylist(path, target_duration=10)
+    playlist.write()
+    with open(path) as f:
+        content = f.read()
+    assert "#EXT-X-PLAYLIST-TYPE:EVENT" in content and "#EXTINF" not in content
+
+    playlist.add_segment("seg_00000.ts", 2.5)
+    playlist.add_segment("seg_00001.ts", 3.25)
+    with open(path) as f:
+        content = f.read()
+    assert content.index("seg_00000.ts") < content.index("seg_00001.ts")
+    assert "#EXTINF:3.250," in content and "#EXT-X-ENDLIST" not in content
+    assert playlist.duration == 5.75
+
+    playlist.finish()
+    with open(path) as f:
+        assert f.read().rstrip().endswith("#EXT-X-ENDLIST")
+
+
+def test_first_segment_is_short():
+    text = "今天天气很好，我们一起去公园散步吧。公园里有很多花，红的黄的紫的都有。小朋友们在草地上奔跑。"
+    chunks = split_stream_text(text, first_max_cost=30, max_cost=90)
+    assert text_cost(chunks[0]) <= 30
+    assert "".join(chunks) == text
+    assert all(text_cost(c) <= 90 for c in chunks)
+
+
+def test_render_stream_publishes_in_order(tmp_path, monkeypatch):
+    def fake_lipsync(image_path, audio_path, output_path, **kwargs):
+        with open(output_path, "wb") as f:
+            f.write(b"video")
+
+    def fake_mux(video_path, output_path, ts_offset=0.0):
+        with open(output_path, "w") as f:
+            f.write(f"{ts_offset:.3f}")
+
+    def fake_concat(playlist_path, output_path):
+        with open(output_path, "w") as f:
+            f.write("final")
+
+    monkeypatch.setattr(streaming, "musetalk_sync", fake_lipsync)
+    monkeypatch.setattr(streaming, "mux_segment", fake_mux)
+    monkeypatch.setattr(streaming, "concat_playlist", fake_concat)
+    monkeypatch.setitem(streaming.STREAMING, "first_segment_max_cost", 30)
+    monkeypatch.setitem(streaming.STREAMING, "segment_max_cost", 30)
+    old = set_tts_engine(ToneTTSEngine(use_cache=False))
+    try:
+        text_path = os.path.join(tmp_path, "input.txt")
+        with open(text_path, "w", encoding="utf-8") as f:
+            f.write("第一句话。第二句话稍微长一点。第三句。")
+        job = Job("stream", {
+            'items': [{
+                'text_path': text_path,
+                'image_path': "input.jpg",
+                'bbox_shift': 0,
+                'final_path': os.path.join(tmp_path, "final.mp4"),
+            }],
+            'musetalk_version': "v1.5",
+            'use_float16': False,
+            'fps': 25,
+            'stream_dir': os.path.join(tmp_path, "stream"),
+        })
+        assert render_stream(job) == os.path.join(tmp_path, "final.mp4")
+    finally:
+        set_tts_engine(old).shutdown()
+
+    with open(os.path.join(tmp_path, "stream", "index.m3u8")) as f:
+        content = f.read()
+    names = [line for line in content.splitlines() if line.endswith(".ts")]
+    assert names == ["seg_00000.ts", "seg_00001.ts", "seg_00002.ts"]
+    assert content.rstrip().endswith("#EXT-X-ENDLIST")
+    # 每个分段的时间戳偏移等于之前分段的总时长
+    with open(os.path.join(tmp_path, "stream", "seg_00001.ts")) as f:
+        assert float(f.read()) > 0
+    assert job.info['published'] == 3 and job.info['time_to_first_segment'] >= 0
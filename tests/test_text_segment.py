@@ -0,0 +1,30 @@
+from app.text_segment import split_sentences, take_sentences, text_cost
+
+
+def test_split_chinese_and_english():
+    text = "你好，欢迎体验数字人！今天我们讲三件事。The price is 3.5 dollars. Second? 结束"
+    assert split_sentences(text, max_cost=30) == [
+        "你好，欢迎体验数字人！", "今天我们讲三件事。", "The price is 3.5 dollars.", "Second? 结束"]
+
+
+def test_split_merges_short_sentences():
+    text = "你好。再见。Hi there. Bye."
+    assert split_sentences(text, max_cost=100) == ["你好。再见。Hi there. Bye."]
+    assert split_sentences(text, max_cost=18) == ["你好。再见。", "Hi there. Bye."]
+
+
+def test_split_long_sentence():
+    text = "这是一个没有任何标点的非常长的句子" * 5
+    chunks = split_sentences(text, max_cost=30)
+    assert "".join(chunks) == text
+    assert all(text_cost(c) <= 30 for c in chunks)
+    assert split_sentences("第一部分，第二部分，第三部分。", max_cost=20) == [
+        "第一部分，", "第二部分，", "第三部分。"]
+
+
+def test_take_sentences_keeps_unfinished_text():
+    assert take_sentences("你好，世界。今天天", max_cost=60) == (["你好，世界。"], "今天天")
+    assert take_sentences("The price is 3.", max_cost=60) == ([], "The price is 3.")
+    assert take_sentences("The price is 3.5 dollars. ", max_cost=60) == (["The price is 3.5 dollars."], "")
+    chunks, rest = take_sentences("第一部分，第二部分，第三部分", max_cost=20)
+    assert chunks == ["第一部分，", "第二部分，"] and rest == "第三部分"
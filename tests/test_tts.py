@@ -1,15 +1,73 @@
 import os
-from app.tts import tts
+from app.tts import tts, TTSEngine
 
 
-def test_tts():
+def test_tts(tmp_path):
     test_text = "你好，世界！"
-    text_path = "tests/test_input.txt"
-    output_path = "tests/test_output.wav"
+    text_path = str(tmp_path / "test_input.txt")
+    output_path = str(tmp_path / "test_output.wav")
     with open(text_path, "w", encoding="utf-8") as f:
         f.write(test_text)
     tts(text_path, output_path)
     assert os.path.exists(output_path)
     assert os.path.getsize(output_path) > 1000  # 简单判断音频文件非空
-    os.remove(text_path)
-    os.remove(output_path)
+
+
+class ToneTTSEngine(TTSEngine):
+    """用正弦波代替 Bark，只验证引擎的加载与统计逻辑"""
+
+    load_calls = 0
+
+    def _load_models(self):
+        import numpy as np
+        ToneTTSEngine.load_calls += 1
+
+        def generate(text, history_prompt=None):
+            t = np.arange(len(text) * 2400) / 24000
+            return (0.1 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+        return generate, 24000
+
+
+def test_tts_engine_loads_once():
+    import asyncio
+    ToneTTSEngine.load_calls = 0
+    engine = ToneTTSEngine(max_workers=2, use_cache=False)
+    try:
+        engine.load()
+        futures = [engine.submit("你好，世界！") for _ in range(4)]
+        for future in futures:
+            assert len(future.result()) == 6 * 2400
+        audio = asyncio.run(engine.synthesize_async("hello"))
+        assert len(audio) == 5 * 2400
+        stats = engine.stats()
+        assert ToneTTSEngine.load_calls == 1
+        assert stats['synth_count'] == 5
+        assert stats['load_time'] is not None
+    finally:
+        engine.shutdown()
+
+
+def test_tts_engine_long_text():
+    engine = ToneTTSEngine(max_workers=3, use_cache=False)
+    try:
+        text = "第一句话。第二句话！Third sentence? 最后一句。"
+        audio = engine.synthesize_text(text, max_cost=20, crossfade_ms=10)
+        # 四段音频，三处各重叠 240 个采样点
+        assert engine.stats()['synth_count'] == 4
+        assert len(audio) == (5 + 5 + 15 + 5) * 2400 - 3 * 240
+    finally:
+        engine.shutdown()
+
+
+def test_tts_engine_uses_cache(tmp_path):
+    from app.tts_cache import TTSCache
+    cache = TTSCache(cache_dir=str(tmp_path), max_bytes=10 ** 8)
+    engine = ToneTTSEngine(max_workers=2, cache=cache)
+    try:
+        engine.synthesize_text("第一句话。第二句话！", max_cost=20)
+        # 修改其中一句，只有变化的句子需要重新合成
+        engine.synthesize_text("第一句话。第三句话！", max_cost=20)
+        assert engine.stats()['synth_count'] == 3
+        assert cache.stats()['hits'] == 1
+    finally:
+        engine.shutdown()
@@ -0,0 +1,30 @@
+import numpy as np
+from app.tts_cache import TTSCache
+
+
+def test_cache_key_normalizes_text():
+    assert TTSCache.make_key(" 你好，  世界！", "v", "bark") == TTSCache.make_key("你好, 世界!", "v", "bark")
+    assert TTSCache.make_key("你好", "v", "bark") != TTSCache.make_key("你好", "v", "bark-small")
+
+
+def test_cache_hit_miss_and_lru(tmp_path):
+    audio = np.zeros(1000, dtype=np.float32)
+    entry_size = 4000 + 128  # float32 数据 + npy 文件头
+    cache = TTSCache(cache_dir=str(tmp_path), max_bytes=entry_size * 2)
+
+    assert cache.get("a") is None
+    cache.put("a", audio)
+    cache.put("b", audio)
+    assert cache.get("a") is not None  # a 变为最近使用
+    cache.put("c", audio)  # 超出上限，淘汰最久未使用的 b
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 2
+    assert stats['evictions'] == 1
+    assert stats['entries'] == 2
+
+    # 重启后从磁盘恢复索引
+    assert TTSCache(cache_dir=str(tmp_path), max_bytes=entry_size * 2).stats()['entries'] == 2
@@ -0,0 +1,46 @@
+import numpy as np
+from app.wav2lip_engine import MEL_STEP_SIZE, Wav2LipEngine, mel_chunks
+
+
+def test_mel_chunks_match_inference_script():
+    mel = np.arange(80 * 100, dtype=np.float32).reshape(80, 100)
+    chunks = mel_chunks(mel, fps=25)
+    # 每帧前进 80 / 25 = 3.2 个 mel 帧，最后一个窗口与末尾对齐
+    assert all(c.shape == (80, MEL_STEP_SIZE) for c in chunks)
+    assert np.array_equal(chunks[1], mel[:, 3:3 + MEL_STEP_SIZE])
+    assert np.array_equal(chunks[5], mel[:, 16:16 + MEL_STEP_SIZE])
+    assert np.array_equal(chunks[-1], mel[:, -MEL_STEP_SIZE:])
+    assert len(chunks) == 28
+
+
+class EchoEngine(Wav2LipEngine):
+    """不加载模型，输出由输入人脸和 mel 窗口确定，记录每批的大小"""
+
+    def __init__(self, batch_size):
+        super().__init__("models/none.pth", "tests/no_wav2lip", batch_size=batch_size)
+        self.batches = []
+
+    def _infer(self, img_batch, mel_batch):
+        self.batches.append(len(mel_batch))
+        level = img_batch[:, :, :, 3:].mean(axis=(1, 2, 3)) + mel_batch.mean(axis=(1, 2, 3))
+        return np.broadcast_to(level[:, None, None, None], (len(mel_batch), 96, 96, 3))
+
+
+def test_batch_size_does_not_change_frames():
+    face = (np.arange(96 * 96 * 3) % 251).astype(np.uint8).reshape(96, 96, 3)
+    chunks = [np.full((80, MEL_STEP_SIZE), i, dtype=np.float32) for i in range(300)]
+    small, large = EchoEngine(batch_size=7), EchoEngine(batch_size=256)
+    frames_small = list(small._predictions(face, chunks))
+    frames_large = list(large._predictions(face, chunks))
+    assert large.batches == [256, 44] and len(small.batches) == 43
+    assert all(np.array_equal(a, b) for a, b in zip(frames_small, frames_large))
+    assert len(frames_large) == 300
+
+
+def test_face_input_masks_lower_half():
+    engine = EchoEngine(batch_size=4)
+    face = np.full((96, 96, 3), 255, dtype=np.uint8)
+    face_input = engine._face_input(face, 2)
+    assert face_input.shape == (2, 96, 96, 6)
+    assert (face_input[:, 48:, :, :3] == 0).all() and (face_input[:, :48, :, :3] == 1).all()
+    assert (face_input[..., 3:] == 1).all()
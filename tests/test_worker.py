@@ -0,0 +1,65 @@
+import threading
+import time
+from app.job_store import SQLiteJobStore
+from app.worker import Worker
+
+
+def test_worker_runs_jobs_from_store(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"))
+
+    def handler(job):
+        job.set_stage('work', 0.5)
+        job.set_info(node='test')
+        if job.params['fail']:
+            raise RuntimeError("boom")
+        return job.params['value'] * 2
+
+    store.enqueue('ok', 'render', {'fail': False, 'value': 21})
+    store.enqueue('bad', 'render', {'fail': True, 'value': 0})
+    worker = Worker(store, handlers={'render': handler}, worker_id='w1', poll_interval=0.01)
+    assert worker.run_once().task_id == 'ok'
+    assert worker.run_once().task_id == 'bad'
+    assert worker.run_once() is None
+
+    ok, bad = store.get('ok'), store.get('bad')
+    assert ok['status'] == 'done' and ok['result'] == 42 and ok['info'] == {'node': 'test'}
+    assert bad['status'] == 'failed' and bad['error'] == "boom"
+    assert worker.stats()['processed'] == 1 and worker.stats()['failed'] == 1
+
+
+def test_worker_heartbeat_keeps_lease(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.2)
+    release = threading.Event()
+    store.enqueue('slow', 'render', {})
+    worker = Worker(store, handlers={'render': lambda job: release.wait(5)}, worker_id='w1',
+                    heartbeat_interval=0.05, poll_interval=0.01).start()
+    try:
+        time.sleep(0.5)
+        # 心跳续约，租约过期时间已超过但任务不会被其它节点领取
+        assert store.claim('w2') is None
+        assert store.get('slow')['worker_id'] == 'w1'
+    finally:
+        release.set()
+        worker.stop()
+    assert store.get('slow')['status'] == 'done'
+
+
+def test_worker_stops_after_lease_lost(tmp_path, monkeypatch):
+    from app import render
+    store = SQLiteJobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=0.05)
+    stages = []
+
+    def first(job):
+        stages.append('first')
+        # 本节点卡住期间租约过期，任务被其它节点领取
+        time.sleep(0.1)
+        assert store.claim('w2')['worker_id'] == 'w2'
+        job.set_stage('first', 0.5)
+
+    monkeypatch.setattr(render, 'RENDER_STAGES', [('first', first), ('second', lambda job: stages.append('second'))])
+    store.enqueue('job', 'render', {})
+    worker = Worker(store, handlers={'render': render.render_job}, worker_id='w1', heartbeat_interval=10)
+    job = worker.run_once()
+    # 后续阶段不再执行，不会与新节点写同一输出目录
+    assert job.lost and stages == ['first']
+    assert store.get('job')['status'] == 'running' and store.get('job')['worker_id'] == 'w2'